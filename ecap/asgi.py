@@ -2,6 +2,7 @@
 ASGI config for ecap project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are served by Django and WebSocket connections by the chat application of ecap_app.websocket.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +14,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecap.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up by get_asgi_application, since it loads models.
+from ecap_app.websocket import websocket_application
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -94,6 +94,33 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    'forecasts': env.cache('FORECAST_CACHE_URL', default='locmemcache://forecasts?max_entries=5000'),
+}
+
+FORECAST_CACHE_ALIAS = 'forecasts'
+FORECAST_CACHE_TIMEOUT = env.int('FORECAST_CACHE_TIMEOUT', default=60 * 60)
+FORECAST_CACHE_LOCAL_ENTRIES = env.int('FORECAST_CACHE_LOCAL_ENTRIES', default=1024)
+
+# Full-text search: 'fts5' (SQLite FTS5 table), 'python' (in-memory inverted index) or 'auto'
+SEARCH_BACKEND = env('SEARCH_BACKEND', default='auto')
+
+# Chat pub/sub broker: 'memory' (single process) or 'cache' (relayed through CHAT_BROKER_CACHE_ALIAS,
+# which must then be a cache shared by all worker processes)
+CHAT_BROKER = env('CHAT_BROKER', default='memory')
+CHAT_BROKER_CACHE_ALIAS = 'default'
+CHAT_BROKER_POLL_INTERVAL = env.float('CHAT_BROKER_POLL_INTERVAL', default=0.2)
+
+# Report jobs running for longer than REPORT_JOB_LEASE seconds are considered abandoned by a dead worker
+# and queued again, or failed once they were claimed REPORT_JOB_MAX_ATTEMPTS times
+REPORT_JOB_LEASE = env.int('REPORT_JOB_LEASE', default=10 * 60)
+REPORT_JOB_MAX_ATTEMPTS = env.int('REPORT_JOB_MAX_ATTEMPTS', default=3)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import *
 
+admin.site.register(Category)
 admin.site.register(Expense)
 admin.site.register(Product)
 admin.site.register(Income)
@@ -9,4 +10,11 @@ admin.site.register(Report)
 admin.site.register(Message)
 admin.site.register(Chat)
 admin.site.register(Profile)
-admin.site.register(Friend)
\ No newline at end of file
+admin.site.register(Friend)
+admin.site.register(DailyLedger)
+admin.site.register(AmountStatistics)
+admin.site.register(Forecast)
+admin.site.register(RecurringRule)
+admin.site.register(ReportJob)
+admin.site.register(Ranking)
+admin.site.register(DataVersion)
\ No newline at end of file
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EcapAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ecap_app'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,138 @@
+import numpy as np
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+from .models import Forecast
+from .forecast_cache import get_data_version, get_data_versions
+from .forecasting import fit_linear_trends
+from .ledger import LEDGER_MODELS
+
+
+ForecastRow = Tuple[int, int, List[float], int]
+
+
+def get_user_row_counts(kind: str, user_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, int]]:
+    """
+    Count the expense or income rows of every user owning at least one.
+
+    :param kind: Either 'expense' or 'income'.
+    :param user_ids: IDs of the users to count, None for all users.
+    :return: List of (user ID, row count) tuples ordered by row count.
+    """
+    rows = LEDGER_MODELS[kind].objects.all()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=list(user_ids))
+    return list(rows.values("user_id").annotate(rows=Count("id")).order_by("rows", "user_id").values_list("user_id", "rows"))
+
+def plan_forecast_chunks(row_counts: List[Tuple[int, int]], chunk_size: int = 1000, max_cells: int = 5_000_000) -> Iterator[List[int]]:
+    """
+    Split users into chunks fitted together in one stacked system.
+
+    Each user becomes a row padded to the longest ledger in its chunk, so users are expected ordered
+    by row count and a chunk is closed early once its padded size would exceed `max_cells`.
+
+    :param row_counts: List of (user ID, row count) tuples ordered by row count.
+    :param chunk_size: Maximum number of users per chunk.
+    :param max_cells: Maximum number of cells of the padded arrays of a chunk.
+    :return: Iterator over lists of user IDs.
+    """
+    chunk = []
+    for user_id, rows in row_counts:
+        if chunk and (len(chunk) == chunk_size or (len(chunk) + 1) * rows > max_cells):
+            yield chunk
+            chunk = []
+        chunk.append(user_id)
+    if chunk:
+        yield chunk
+
+def load_stacked_ledger(kind: str, user_ids: List[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Load the expenses or incomes of several users in one query and stack them into padded arrays,
+    one row per user.
+
+    :param kind: Either 'expense' or 'income'.
+    :param user_ids: IDs of the users to load.
+    :return: Tuple of user IDs, date ordinals, amounts and validity mask arrays.
+    """
+    rows = LEDGER_MODELS[kind].objects.filter(user_id__in=user_ids).order_by("user_id").values_list("user_id", "date", "amount")
+    owners, days, amounts = zip(*rows) if rows else ((), (), ())
+    owners = np.fromiter(owners, dtype=np.int64, count=len(owners))
+    users, starts, counts = np.unique(owners, return_index=True, return_counts=True)
+    shape = (len(users), counts.max() if len(users) else 0)
+    stacked_rows = np.repeat(np.arange(len(users)), counts)
+    positions = np.arange(len(owners)) - np.repeat(starts, counts)
+    x, y, mask = np.zeros(shape), np.zeros(shape), np.zeros(shape, dtype=bool)
+    x[stacked_rows, positions] = np.fromiter((day.toordinal() for day in days), dtype=float, count=len(days))
+    y[stacked_rows, positions] = np.fromiter(amounts, dtype=float, count=len(amounts))
+    mask[stacked_rows, positions] = True
+    return users, x, y, mask
+
+def forecast_user_chunk(kind: str, user_ids: List[int], horizon: int, versions: Optional[Dict[int, int]] = None) -> List[ForecastRow]:
+    """
+    Fit the linear trends of several users in a single vectorized pass and project them
+    `horizon` days from each user's latest entry.
+
+    Users with a single entry get a flat zero projection, like extrapolate_user_trend.
+    The data versions of the users are read before their rows, so a forecast is never tagged
+    with a newer version than the data it was fitted on.
+
+    :param kind: Either 'expense' or 'income'.
+    :param user_ids: IDs of the users to forecast.
+    :param horizon: Number of predicted days.
+    :param versions: Data versions of the users, read before calling, looked up if None. Worker processes
+        get them from their parent, since looking them up creates the missing versions.
+    :return: List of (user ID, start date ordinal, projected amounts, data version) tuples.
+    """
+    if versions is None:
+        versions = get_data_versions(user_ids)
+    users, x, y, mask = load_stacked_ledger(kind, user_ids)
+    if not len(users):
+        return []
+    slope, intercept = fit_linear_trends(x, y, mask)
+    start = np.where(mask, x, -np.inf).max(axis=1)
+    projections = intercept[:, None] + slope[:, None] * (start[:, None] + np.arange(horizon))
+    projections[np.isnan(slope)] = 0.0
+    return [(int(user_id), int(day), amounts.tolist(), versions[int(user_id)]) for user_id, day, amounts in zip(users, start, projections)]
+
+def store_forecasts(kind: str, user_ids: List[int], forecasts: List[ForecastRow], batch_size: int = 1000) -> int:
+    """
+    Replace the stored linear forecasts of a chunk of users.
+
+    Forecasts of users whose data changed since they were fitted are skipped, and every stored forecast records
+    the data version it was fitted on, so get_stored_forecast ignores it once the user's data changes again.
+
+    :param kind: Either 'expense' or 'income'.
+    :param user_ids: IDs of all users of the chunk, including those without forecasts.
+    :param forecasts: Forecasts computed by forecast_user_chunk.
+    :param batch_size: Number of rows inserted per query.
+    :return: Number of forecasts written.
+    """
+    versions = get_data_versions(user_ids)
+    forecasts = [forecast for forecast in forecasts if versions[forecast[0]] == forecast[3]]
+    with transaction.atomic():
+        Forecast.objects.filter(user_id__in=user_ids, kind=kind, model="linear").delete()
+        Forecast.objects.bulk_create((
+            Forecast(user_id=user_id, kind=kind, model="linear", start_date=date.fromordinal(start), amounts=amounts, data_version=version)
+            for user_id, start, amounts, version in forecasts),
+            batch_size=batch_size
+        )
+    return len(forecasts)
+
+def get_stored_forecast(user: User, kind: str, horizon: int, model: str = "linear") -> Optional[Tuple[List[str], List[float]]]:
+    """
+    Read a forecast written by the precompute_forecasts command.
+
+    :param user: User object.
+    :param kind: Either 'expense' or 'income'.
+    :param horizon: Number of predicted days.
+    :param model: Name of the forecasting model.
+    :return: Tuple containing future dates and predicted amounts, None if no stored forecast covers the horizon
+        or if the user's data changed since it was fitted.
+    """
+    stored = Forecast.objects.filter(user=user, kind=kind, model=model, data_version=get_data_version(user.id)).values_list("start_date", "amounts").first()
+    if stored is None or len(stored[1]) < horizon:
+        return None
+    start_date, amounts = stored
+    return [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(horizon)], amounts[:horizon]
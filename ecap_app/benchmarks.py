@@ -0,0 +1,442 @@
+import random
+import time
+import numpy as np
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Callable, List, Tuple
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.test.utils import CaptureQueriesContext
+from .models import Expense, Friend, Income, Profile, SavingGoal
+from . import utils
+from .categories import get_category_ids
+from .comparison import get_friend_comparison
+from .forecasting import fit_linear_trend, predict_trend
+from .forecasters import FORECASTERS, get_daily_totals, get_month_positions
+from .imports import import_transactions, parse_csv
+from .search import InvertedIndex, get_search_backend, index_ledger_rows, search
+from .ledger import ALL_ROWS, get_user_ledger_totals, rebuild_ledger_rollups
+
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+CATEGORIES = ("Food", "Rent", "Transport", "Fun", "Health", "Utilities")
+
+
+class Rollback(Exception):
+    """
+    Raised to discard the rows seeded by a benchmark.
+    """
+
+
+def seed_ledger(user: User, model, rows: int, start_date: date = date(2015, 1, 1), seed: int = 0) -> None:
+    """
+    Insert random Expense or Income rows for a user with bulk_create.
+
+    :param user: Owner of the rows.
+    :param model: Expense or Income model class.
+    :param rows: Number of rows to insert.
+    :param start_date: Date of the oldest row.
+    :param seed: Seed of the random generator.
+    """
+    generator = random.Random(seed)
+    category_ids = get_category_ids(user.id, CATEGORIES)
+    model.objects.bulk_create((
+        model(
+            user=user,
+            date=start_date + timedelta(days=generator.randrange(3650)),
+            amount=Decimal(generator.randrange(100, 50000)).scaleb(-2),
+            category_id=category_ids[generator.choice(CATEGORIES)],
+            description=f"benchmark row {i}")
+        for i in range(rows)),
+        batch_size=1000
+    )
+
+def measure(fn: Callable, *args, **kwargs) -> Tuple[float, int]:
+    """
+    Run a function once and measure its latency and number of queries.
+
+    :param fn: Function to run.
+    :return: Tuple of (seconds, number of queries).
+    """
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    return elapsed, len(queries.captured_queries)
+
+def run_seeded(rows: int, fn: Callable[[User], List[dict]], rollups: bool = False) -> List[dict]:
+    """
+    Run a benchmark against a throwaway user owning `rows` expenses, rolling all writes back afterwards.
+
+    :param rows: Number of seeded expenses.
+    :param fn: Benchmark body receiving the seeded user.
+    :param rollups: Whether to build the ledger rollups of the seeded user before running the body.
+    :return: Result rows produced by the benchmark body.
+    """
+    results = []
+    try:
+        with transaction.atomic():
+            user = User.objects.create(username=f"benchmark-{rows}-{time.time_ns()}")
+            seed_ledger(user, Expense, rows)
+            if rollups:
+                rebuild_ledger_rollups([user.id])
+            results = fn(user)
+            raise Rollback
+    except Rollback:
+        pass
+    return results
+
+def legacy_expense_context(user: User) -> dict:
+    """
+    Build the expense page statistics the way get_expense_context did before ledger snapshots,
+    with one helper (and its own queries) per statistic.
+    """
+    aggregates = utils.get_user_expense_aggregates(user)
+    dates, amount = utils.extrapolate_user_expenses(user)
+    return {
+        "aggregates": aggregates,
+        "chart_data": utils.get_user_expenses_by_date(user).to_dict(),
+        "projected_chart_data": {"date": list(dates), "amount": list(amount)},
+        "categories": utils.get_user_expense_categories(user),
+        "total": utils.calculate_total_user_expenses(user),
+        "std": utils.get_user_expense_std(user),
+        "linear_regression_slope": utils.get_expense_slope(user),
+        "data": list(Expense.objects.filter(user=user).values("id", "date", "amount", "category", "description")),
+    }
+
+def benchmark_ledger_snapshot(sizes=DEFAULT_SIZES) -> List[dict]:
+    """
+    Compare query count and latency of the legacy per-statistic expense context against the single-pass ledger snapshot.
+
+    :param sizes: Numbers of expense rows to benchmark with.
+    :return: One result row per (size, implementation).
+    """
+    results = []
+    for rows in sizes:
+        results += run_seeded(rows, lambda user: [
+            {"benchmark": "ledger_snapshot", "rows": rows, "variant": name, "seconds": seconds, "queries": queries}
+            for name, (seconds, queries) in (
+                ("legacy", measure(legacy_expense_context, user)),
+                ("snapshot", measure(utils.get_user_expense_snapshot_data, user)),
+            )
+        ])
+    return results
+
+def group_by_category_name(user: User) -> list:
+    """
+    Total a user's expenses per category by grouping on the category strings, as before categories were dictionary encoded.
+    """
+    return list(Expense.objects.filter(user=user).order_by("category__name").values("category__name").annotate(total=Sum("amount")))
+
+def benchmark_categories(sizes=DEFAULT_SIZES) -> List[dict]:
+    """
+    Compare the per-category totals of a user's expenses grouped on the category strings
+    against the GROUP BY on the integer category IDs used by get_categories.
+
+    :param sizes: Numbers of expense rows to benchmark with.
+    :return: One result row per (size, implementation).
+    """
+    results = []
+    for rows in sizes:
+        results += run_seeded(rows, lambda user: [
+            {"benchmark": "categories", "rows": rows, "variant": name, "seconds": seconds, "queries": queries}
+            for name, (seconds, queries) in (
+                ("string_group_by", measure(group_by_category_name, user)),
+                ("id_group_by", measure(utils.get_categories, Expense.objects.filter(user=user))),
+            )
+        ])
+    return results
+
+def sklearn_expense_projection(user: User, days_to_predict: int = 10) -> tuple:
+    """
+    Project a user's expenses the way extrapolate_user_expenses did before the closed-form trend engine,
+    by fitting sklearn's LinearRegression on every expense row.
+    """
+    from sklearn.linear_model import LinearRegression
+    data = utils.preprocess_date_data(utils.get_user_expenses_by_date(user))
+    model = LinearRegression().fit(data["date_ordinal"].values.reshape(-1, 1), data["amount"].values)
+    start = data["date_ordinal"].iloc[-1]
+    return model.predict((start + np.arange(days_to_predict)).reshape(-1, 1))
+
+def closed_form_expense_projection(user: User, days_to_predict: int = 10) -> tuple:
+    """
+    Project a user's expenses by fitting the closed-form trend on every expense row.
+    """
+    data = utils.preprocess_date_data(utils.get_user_expenses_by_date(user))
+    trend = fit_linear_trend(data["date_ordinal"].values, data["amount"].values)
+    start = data["date_ordinal"].iloc[-1]
+    return predict_trend(trend, start + np.arange(days_to_predict))
+
+def benchmark_trend_fit(sizes=DEFAULT_SIZES) -> List[dict]:
+    """
+    Compare the latency of the sklearn trend fit, the closed-form fit over all rows and the
+    closed-form fit from stored sufficient statistics used by extrapolate_user_expenses.
+
+    :param sizes: Numbers of expense rows to benchmark with.
+    :return: One result row per (size, implementation).
+    """
+    variants = [
+        ("closed_form", closed_form_expense_projection),
+        ("sufficient_stats", utils.extrapolate_user_expenses),
+    ]
+    try:
+        import sklearn
+        variants.insert(0, ("sklearn", sklearn_expense_projection))
+    except ImportError:
+        pass
+    results = []
+    for rows in sizes:
+        results += run_seeded(rows, lambda user: [
+            {"benchmark": "trend_fit", "rows": rows, "variant": name, "seconds": seconds, "queries": queries}
+            for name, fn in variants
+            for seconds, queries in [measure(fn, user)]
+        ], rollups=True)
+    return results
+
+
+def synthetic_ledger(rows: int, start_date: date = date(2015, 1, 1), days: int = 3650, seed: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Generate a ledger of random entries, distributed like seed_ledger, on top of a monthly rent,
+    a monthly subscription and a salary paid on the last day of every month.
+
+    :param rows: Number of random entries.
+    :param start_date: Date of the oldest entry.
+    :param days: Number of days covered by the ledger.
+    :param seed: Seed of the random generator.
+    :return: Tuple of date ordinal, amount and category arrays.
+    """
+    generator = np.random.default_rng(seed)
+    calendar = start_date.toordinal() + np.arange(days)
+    _, day_of_month, month_length = get_month_positions(calendar)
+    recurring = [
+        (calendar[day_of_month == 1], 1200.0, "Rent"),
+        (calendar[day_of_month == 15], 15.99, "Fun"),
+        (calendar[day_of_month == month_length], 2500.0, "Salary"),
+    ]
+    ledger_days = np.concatenate([generator.integers(calendar[0], calendar[-1] + 1, rows)] + [due for due, _, _ in recurring])
+    amounts = np.concatenate([generator.integers(100, 50000, rows) / 100] + [np.full(len(due), amount) for due, amount, _ in recurring])
+    categories = np.concatenate([generator.choice(CATEGORIES, rows).astype(object)] + [np.full(len(due), category, dtype=object) for due, _, category in recurring])
+    return ledger_days, amounts, categories
+
+def benchmark_forecasters(sizes=DEFAULT_SIZES, holdout: int = 30) -> List[dict]:
+    """
+    Compare the fit time and accuracy of the forecasting models. Every model is fitted on a synthetic
+    ledger without its last `holdout` days and scored by the mean absolute error of the daily totals it predicts for them.
+
+    :param sizes: Numbers of random entries to benchmark with.
+    :param holdout: Number of predicted days.
+    :return: One result row per (size, model).
+    """
+    results = []
+    for rows in sizes:
+        days, amounts, categories = synthetic_ledger(rows)
+        cutoff = days.max() - holdout + 1
+        train = days < cutoff
+        calendar, totals = get_daily_totals(days, amounts)
+        actual = totals[calendar >= cutoff]
+        for name, forecaster in FORECASTERS.items():
+            start = time.perf_counter()
+            predicted = forecaster().fit(days[train], amounts[train], categories[train]).predict(cutoff + np.arange(holdout))
+            seconds = time.perf_counter() - start
+            results.append({
+                "benchmark": "forecasters", "rows": rows, "variant": name, "seconds": seconds, "queries": 0,
+                "mae": float(np.abs(predicted - actual).mean()),
+            })
+    return results
+
+def synthetic_statement(rows: int, start_date: date = date(2015, 1, 1), seed: int = 0) -> List[str]:
+    """
+    Generate the lines of a CSV bank statement with signed amounts, negative for expenses.
+
+    :param rows: Number of transactions.
+    :param start_date: Date of the oldest transaction.
+    :param seed: Seed of the random generator.
+    :return: Lines of the statement, starting with its header.
+    """
+    generator = random.Random(seed)
+    lines = ["date,amount,category,description\n"]
+    for i in range(rows):
+        day = start_date + timedelta(days=generator.randrange(3650))
+        amount = Decimal(generator.randrange(-50000, 50000) or 1).scaleb(-2)
+        lines.append(f"{day.isoformat()},{amount},{generator.choice(CATEGORIES)},statement row {i}\n")
+    return lines
+
+def benchmark_imports(sizes=DEFAULT_SIZES) -> List[dict]:
+    """
+    Measure the import of a CSV statement into an empty ledger, and its re-import where every row is a duplicate.
+
+    :param sizes: Numbers of statement rows to benchmark with.
+    :return: One result row per (size, variant).
+    """
+    results = []
+    for rows in sizes:
+        lines = synthetic_statement(rows)
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username=f"benchmark-import-{rows}-{time.time_ns()}")
+                for variant in ("new", "duplicate"):
+                    stats = {}
+                    seconds, queries = measure(lambda: stats.update(import_transactions(user, parse_csv(lines))))
+                    results.append({
+                        "benchmark": "imports", "rows": rows, "variant": variant, "seconds": seconds, "queries": queries,
+                        "rows_per_second": round(rows / seconds), "duplicates": stats["duplicates"],
+                    })
+                raise Rollback
+        except Rollback:
+            pass
+    return results
+
+COMPARISON_FRIENDS = (1, 500)
+
+
+def legacy_comparison_data(user: User) -> dict:
+    """
+    Gather the comparison metrics of one user the way gather_comparison_data did before the batched
+    comparison service, with separate queries per metric and a lazy profile fetch.
+    """
+    totals = get_user_ledger_totals(user)[ALL_ROWS]
+    return {
+        "username": user.username,
+        "total_income": totals["income"],
+        "total_expense": totals["expense"],
+        "total_balance": totals["balance"],
+        "monthly_income": utils.calculate_monthly_income(user),
+        "monthly_expense": utils.calculate_monthly_expense(user),
+        "saving_goal_progress": utils.calculate_saving_goal_progress(user),
+        "picture_url": user.profile.profile_picture.url if user.profile.profile_picture else "/static/img/default_user.jpg",
+    }
+
+def legacy_friend_comparison(user: User) -> dict:
+    """
+    Build the comparison page data the way the compare view did before the batched comparison service, one friend at a time.
+    """
+    relations = Friend.objects.filter(Q(user=user) | Q(friend=user), status="accepted")
+    friends = [relation.friend if relation.user == user else relation.user for relation in relations]
+    return {"user_data": legacy_comparison_data(user), "friends": [legacy_comparison_data(friend) for friend in friends]}
+
+def seed_friends(user: User, friends: int, rows: int) -> None:
+    """
+    Create accepted friends of a user. The user and every friend get a profile, a saving goal
+    and `rows` random expenses and incomes with their ledger rollups.
+
+    :param user: User whose friends are created.
+    :param friends: Number of friends.
+    :param rows: Number of expenses, and of incomes, per user.
+    """
+    others = User.objects.bulk_create([User(username=f"{user.username}-friend-{i}") for i in range(friends)])
+    members = [user, *others]
+    for i, member in enumerate(members):
+        seed_ledger(member, Expense, rows, seed=2 * i)
+        seed_ledger(member, Income, rows, seed=2 * i + 1)
+    Profile.objects.bulk_create([Profile(user=member, bio="") for member in members])
+    SavingGoal.objects.bulk_create([
+        SavingGoal(user=member, name="Holiday", target_amount=Decimal(1000), current_amount=Decimal(10 * i % 1000), target_date=date(2030, 1, 1))
+        for i, member in enumerate(members)
+    ])
+    Friend.objects.bulk_create([Friend(user=user if i % 2 else other, friend=other if i % 2 else user, status="accepted") for i, other in enumerate(others)])
+    rebuild_ledger_rollups([member.id for member in members])
+
+def benchmark_comparison(sizes=DEFAULT_SIZES, friend_counts=COMPARISON_FRIENDS) -> List[dict]:
+    """
+    Compare the comparison page data computed one friend at a time against the batched comparison service,
+    for users with few and many friends. The batched service needs the same number of queries for any number of friends.
+
+    :param sizes: Total numbers of expense rows, spread evenly over the user and their friends.
+    :param friend_counts: Numbers of friends to benchmark with.
+    :return: One result row per (size, number of friends, implementation).
+    """
+    results = []
+    for rows in sizes:
+        for friends in friend_counts:
+            try:
+                with transaction.atomic():
+                    user = User.objects.create(username=f"benchmark-comparison-{rows}-{friends}-{time.time_ns()}")
+                    seed_friends(user, friends, max(rows // (friends + 1), 1))
+                    for name, fn in (("legacy", legacy_friend_comparison), ("batched", get_friend_comparison)):
+                        seconds, queries = measure(fn, user)
+                        results.append({"benchmark": "comparison", "rows": rows, "variant": name, "seconds": seconds, "queries": queries, "friends": friends})
+                    raise Rollback
+            except Rollback:
+                pass
+    return results
+
+SEARCH_SYLLABLES = ("ka", "lo", "mi", "ne", "pu", "ra", "si", "to", "vu", "ze", "ba", "de", "fi", "go", "hu", "ja", "ke", "li", "mo", "nu")
+# A frequent word, a rare word, two words, a prefix and a word that never occurs.
+SEARCH_QUERIES = ("kaka", "zenu", "kaka lo", "mi", "qoqo")
+
+
+def seed_search_ledger(user: User, rows: int, seed: int = 0) -> None:
+    """
+    Insert Expense rows for a user whose descriptions are 3 to 6 words drawn from a Zipf-distributed vocabulary.
+
+    :param user: Owner of the rows.
+    :param rows: Number of rows to insert.
+    :param seed: Seed of the random generator.
+    """
+    generator = random.Random(seed)
+    vocabulary = [first + second for first in SEARCH_SYLLABLES for second in SEARCH_SYLLABLES]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    category_ids = get_category_ids(user.id, CATEGORIES)
+    for start in range(0, rows, 10000):
+        index_ledger_rows("expense", Expense.objects.bulk_create((
+            Expense(
+                user=user,
+                date=date(2015, 1, 1) + timedelta(days=generator.randrange(3650)),
+                amount=Decimal(generator.randrange(100, 50000)).scaleb(-2),
+                category_id=category_ids[generator.choice(CATEGORIES)],
+                description=" ".join(generator.choices(vocabulary, weights, k=generator.randint(3, 6))))
+            for _ in range(start, min(start + 10000, rows))),
+            batch_size=1000
+        ))
+
+def benchmark_search(sizes=DEFAULT_SIZES, python_max_rows: int = 200000) -> List[dict]:
+    """
+    Compare the first page of description searches through an icontains scan, the FTS5 table
+    and the in-memory inverted index. Latencies are averaged over SEARCH_QUERIES and reported per query.
+
+    The icontains scan returns the newest matches, as the transaction table would, the indexes return the best ranked ones.
+    Building the in-memory index is measured separately, and skipped above `python_max_rows` rows to bound memory use.
+
+    :param sizes: Numbers of expense rows to benchmark with.
+    :param python_max_rows: Largest size the in-memory index is benchmarked with.
+    :return: One result row per (size, variant).
+    """
+    results = []
+    for rows in sizes:
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username=f"benchmark-search-{rows}-{time.time_ns()}")
+                seed_search_ledger(user, rows)
+                variants = {"icontains": lambda query: list(
+                    Expense.objects.filter(user=user, description__icontains=query).order_by("-date").values("id", "description")[:20]
+                )}
+                if get_search_backend() == "fts5":
+                    variants["fts5"] = lambda query: search(user.id, query, limit=20)
+                if rows <= python_max_rows:
+                    index = InvertedIndex()
+                    seconds, queries = measure(lambda: [index.add(("expense", pk), text) for pk, text in Expense.objects.filter(user=user).values_list("id", "description")])
+                    results.append({"benchmark": "search", "rows": rows, "variant": "python_build", "seconds": seconds, "queries": queries})
+                    variants["python"] = lambda query: index.search(query)[:20]
+                for variant, run in variants.items():
+                    timings = [measure(run, query) for query in SEARCH_QUERIES]
+                    results.append({
+                        "benchmark": "search", "rows": rows, "variant": variant,
+                        "seconds": sum(seconds for seconds, _ in timings) / len(timings),
+                        "queries": sum(queries for _, queries in timings) // len(timings),
+                        **{query.replace(" ", "+"): seconds for query, (seconds, _) in zip(SEARCH_QUERIES, timings)},
+                    })
+                raise Rollback
+        except Rollback:
+            pass
+    return results
+
+BENCHMARKS = {
+    "ledger_snapshot": benchmark_ledger_snapshot,
+    "categories": benchmark_categories,
+    "trend_fit": benchmark_trend_fit,
+    "forecasters": benchmark_forecasters,
+    "imports": benchmark_imports,
+    "search": benchmark_search,
+    "comparison": benchmark_comparison,
+}
@@ -0,0 +1,86 @@
+import re
+from typing import Dict, Iterable, List
+from django.db import IntegrityError, transaction
+from .models import Category
+
+
+CATEGORY_MAX_LENGTH = 100
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_category_name(name: str) -> str:
+    """
+    Clean up a category name typed by a user or read from a statement: surrounding whitespace is removed
+    and inner runs of whitespace are collapsed to a single space.
+
+    :param name: Raw category name.
+    :return: Display name of the category, empty if the name is blank.
+    """
+    return WHITESPACE.sub(" ", name or "").strip()[:CATEGORY_MAX_LENGTH]
+
+def get_category_key(name: str) -> str:
+    """
+    Compute the dictionary key of a category name. Names differing only in case or whitespace,
+    such as 'Food', 'food ' and 'FOOD', share a key and therefore a category.
+
+    :param name: Raw category name.
+    :return: Case-folded normalized name.
+    """
+    return normalize_category_name(name).casefold()
+
+def get_category(user_id: int, name: str) -> Category:
+    """
+    Look up a user's category by name, creating it on first use with the normalized name as its display name.
+
+    :param user_id: ID of the owner.
+    :param name: Raw category name.
+    :return: Category object.
+    """
+    key = get_category_key(name)
+    try:
+        with transaction.atomic():
+            return Category.objects.get_or_create(user_id=user_id, key=key, defaults={"name": normalize_category_name(name)})[0]
+    except IntegrityError:
+        # The same category was created concurrently.
+        return Category.objects.get(user_id=user_id, key=key)
+
+def get_category_ids(user_id: int, names: Iterable[str]) -> Dict[str, int]:
+    """
+    Resolve many category names of a user at once, creating the missing categories with a single bulk insert.
+    Used by code writing Expense and Income rows in bulk.
+
+    :param user_id: ID of the owner.
+    :param names: Raw category names.
+    :return: Mapping of every given name to its category ID.
+    """
+    names = set(names)
+    keys = {name: get_category_key(name) for name in names}
+    ids = dict(Category.objects.filter(user_id=user_id, key__in=set(keys.values())).values_list("key", "id"))
+    missing = {key: name for name, key in keys.items() if key not in ids}
+    if missing:
+        Category.objects.bulk_create(
+            [Category(user_id=user_id, key=key, name=normalize_category_name(name)) for key, name in missing.items()], ignore_conflicts=True
+        )
+        ids.update(Category.objects.filter(user_id=user_id, key__in=list(missing)).values_list("key", "id"))
+    return {name: ids[key] for name, key in keys.items()}
+
+def get_category_names(category_ids: Iterable[int]) -> Dict[int, str]:
+    """
+    Map category IDs, as returned by queries grouping or reading rows on the category foreign key, to their display names.
+
+    :param category_ids: Category IDs.
+    :return: Mapping of category IDs to names.
+    """
+    return dict(Category.objects.filter(id__in=set(category_ids)).values_list("id", "name"))
+
+def resolve_category_names(rows: List[dict]) -> List[dict]:
+    """
+    Replace the category IDs of row dictionaries read with values() by the category names, using a single query.
+
+    :param rows: Row dictionaries with a 'category' key, modified in place.
+    :return: The same rows.
+    """
+    names = get_category_names(row["category"] for row in rows)
+    for row in rows:
+        row["category"] = names.get(row["category"])
+    return rows
@@ -0,0 +1,217 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+from django.conf import settings
+from django.core.cache import caches
+from .chat_history import encode_message_cursor
+
+
+CHAT_BROKER = getattr(settings, "CHAT_BROKER", "memory")
+CHAT_BROKER_CACHE_ALIAS = getattr(settings, "CHAT_BROKER_CACHE_ALIAS", "default")
+CHAT_BROKER_POLL_INTERVAL = getattr(settings, "CHAT_BROKER_POLL_INTERVAL", 0.2)
+CHAT_BROKER_MESSAGE_TIMEOUT = 60
+CHAT_BROKER_MISSING_POLLS = 10
+
+broker = None
+broker_lock = threading.Lock()
+
+
+class Subscription:
+    """
+    Queue of the messages published to a group, read by one connection in its event loop.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self.queue = asyncio.Queue()
+        self.loop = asyncio.get_running_loop()
+
+    def deliver(self, message: dict) -> None:
+        """
+        Queue a message, from any thread.
+
+        :param message: Published message.
+        """
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+
+    async def get(self) -> dict:
+        """
+        Wait for the next message.
+
+        :return: Published message.
+        """
+        return await self.queue.get()
+
+
+class MemoryBroker:
+    """
+    Publish/subscribe broker delivering messages to the subscriptions of this process only.
+    Enough for a single ASGI worker, whose request handlers and WebSocket connections share the process.
+    """
+
+    def __init__(self):
+        self.groups: Dict[str, set] = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, group: str) -> Subscription:
+        """
+        Subscribe to a group. Must be called from the event loop of the subscribing connection.
+
+        :param group: Group name.
+        :return: Subscription receiving the messages published to the group from now on.
+        """
+        subscription = Subscription(group)
+        with self.lock:
+            self.groups[group].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Stop delivering messages to a subscription.
+
+        :param subscription: Subscription returned by subscribe.
+        """
+        with self.lock:
+            subscribers = self.groups.get(subscription.group)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.groups[subscription.group]
+
+    def deliver(self, group: str, message: dict) -> None:
+        """
+        Deliver a message to the local subscriptions of a group.
+
+        :param group: Group name.
+        :param message: JSON serializable message.
+        """
+        with self.lock:
+            subscribers = list(self.groups.get(group, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    def publish(self, group: str, message: dict) -> None:
+        """
+        Publish a message to a group, from any thread.
+
+        :param group: Group name.
+        :param message: JSON serializable message.
+        """
+        self.deliver(group, message)
+
+
+class CacheBroker(MemoryBroker):
+    """
+    Broker relaying messages through a cache shared by several worker processes, standing in for a dedicated
+    message broker. Every published message is stored under a per-group sequence number, and each process
+    polls the sequence of the groups it has subscriptions for. The cache must be shared by the processes,
+    such as a file based, Memcached or Redis cache.
+    """
+
+    def __init__(self, alias: str = CHAT_BROKER_CACHE_ALIAS, poll_interval: float = CHAT_BROKER_POLL_INTERVAL):
+        super().__init__()
+        self.cache = caches[alias]
+        self.poll_interval = poll_interval
+        self.pollers: Dict[str, asyncio.Task] = {}
+
+    def get_sequence_key(self, group: str) -> str:
+        """
+        Build the cache key of the last sequence number of a group.
+        """
+        return f"chat-broker:{group}:sequence"
+
+    def get_message_key(self, group: str, sequence: int) -> str:
+        """
+        Build the cache key of a published message.
+        """
+        return f"chat-broker:{group}:{sequence}"
+
+    def subscribe(self, group: str) -> Subscription:
+        subscription = super().subscribe(group)
+        poller = self.pollers.get(group)
+        if poller is None or poller.done():
+            self.pollers[group] = asyncio.create_task(self.poll(group))
+        return subscription
+
+    def publish(self, group: str, message: dict) -> None:
+        key = self.get_sequence_key(group)
+        self.cache.add(key, 0, timeout=None)
+        sequence = self.cache.incr(key)
+        self.cache.set(self.get_message_key(group, sequence), message, timeout=CHAT_BROKER_MESSAGE_TIMEOUT)
+
+    async def poll(self, group: str) -> None:
+        """
+        Deliver the messages published to a group by any process to the local subscriptions, in publication order,
+        until the group has no local subscriptions left. A message whose sequence number was taken but which is not
+        stored yet is waited for during a few polls, then skipped.
+
+        :param group: Group name.
+        """
+        last = await self.cache.aget(self.get_sequence_key(group)) or 0
+        missing_polls = 0
+        while group in self.groups:
+            await asyncio.sleep(self.poll_interval)
+            current = await self.cache.aget(self.get_sequence_key(group)) or 0
+            if current <= last:
+                continue
+            keys = [self.get_message_key(group, sequence) for sequence in range(last + 1, current + 1)]
+            messages = await self.cache.aget_many(keys)
+            for key in keys:
+                if key not in messages and missing_polls < CHAT_BROKER_MISSING_POLLS:
+                    missing_polls += 1
+                    break
+                missing_polls = 0
+                last += 1
+                if key in messages:
+                    self.deliver(group, messages[key])
+        self.pollers.pop(group, None)
+
+
+BROKERS = {"memory": MemoryBroker, "cache": CacheBroker}
+
+
+def get_chat_broker() -> MemoryBroker:
+    """
+    Return the broker of this process, as configured by the CHAT_BROKER setting ('memory' or 'cache').
+    """
+    global broker
+    with broker_lock:
+        if broker is None:
+            broker = BROKERS[CHAT_BROKER]()
+    return broker
+
+def get_chat_group(chat_id: int) -> str:
+    """
+    Build the name of the group receiving the messages of a chat.
+
+    :param chat_id: ID of the chat.
+    :return: Group name.
+    """
+    return f"chat-{chat_id}"
+
+def serialize_message(message) -> dict:
+    """
+    Convert a chat message to the JSON payload pushed to WebSocket clients and returned by send_message.
+
+    :param message: Message object, ideally fetched with select_related("sender").
+    :return: Dictionary with 'id', 'chat_id', 'sender', 'content', 'timestamp' and 'cursor' keys,
+        the cursor being the message's position for get_older_messages and get_newer_messages.
+    """
+    return {
+        "id": message.id,
+        "chat_id": message.chat_id,
+        "sender": message.sender.username,
+        "content": message.content,
+        "timestamp": message.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        "cursor": encode_message_cursor(message.timestamp, message.id),
+    }
+
+def publish_chat_message(message, broker: Optional[MemoryBroker] = None) -> None:
+    """
+    Push a new chat message to the connections subscribed to its chat.
+
+    :param message: Message object.
+    :param broker: Broker, the broker of this process if None.
+    """
+    (broker or get_chat_broker()).publish(get_chat_group(message.chat_id), {"type": "message", **serialize_message(message)})
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from django.db.models import Q, QuerySet
+from .models import Chat
+from .pagination import paginate_by_keyset
+
+
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_FIELDS = ("id", "chat_id", "sender_id", "content", "timestamp")
+CURSOR_SEPARATOR = "~"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_message_cursor(timestamp: datetime, message_id: int) -> str:
+    """
+    Encode the keyset position of a message as a URL safe string such as '1718031600123456~42',
+    the timestamp in microseconds since the epoch followed by the message ID.
+
+    :param timestamp: Timestamp of the message.
+    :param message_id: ID of the message.
+    :return: Encoded cursor.
+    """
+    return f"{(timestamp - EPOCH) // MICROSECOND}{CURSOR_SEPARATOR}{message_id}"
+
+def decode_message_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_message_cursor.
+
+    :param cursor: Encoded cursor.
+    :return: Tuple of the timestamp and the ID of the message.
+    :raises ValueError: If the cursor is malformed.
+    """
+    micros, separator, message_id = cursor.partition(CURSOR_SEPARATOR)
+    if not separator or not micros.isdigit() or not message_id.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return EPOCH + int(micros) * MICROSECOND, int(message_id)
+
+def get_chat_usernames(chat: Chat) -> Dict[int, str]:
+    """
+    Map the IDs of a chat's two users to their usernames, so message rows do not need to join the user table.
+
+    :param chat: Chat object, ideally fetched with select_related("user1", "user2").
+    :return: Mapping of user ID to username.
+    """
+    return {chat.user1_id: chat.user1.username, chat.user2_id: chat.user2.username}
+
+def serialize_message_row(row: dict, usernames: Dict[int, str]) -> dict:
+    """
+    Convert a message row read with values(*MESSAGE_FIELDS) to the payload of serialize_message.
+
+    :param row: Message row.
+    :param usernames: Usernames of the chat's users, from get_chat_usernames.
+    :return: Dictionary with 'id', 'chat_id', 'sender', 'content', 'timestamp' and 'cursor' keys.
+    """
+    return {
+        "id": row["id"],
+        "chat_id": row["chat_id"],
+        "sender": usernames.get(row["sender_id"]),
+        "content": row["content"],
+        "timestamp": row["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
+        "cursor": encode_message_cursor(row["timestamp"], row["id"]),
+    }
+
+def get_older_messages(chat: Chat, cursor: Optional[str] = None, limit: int = MESSAGE_PAGE_SIZE) -> dict:
+    """
+    Fetch the page of a chat's messages preceding a cursor, or its latest page.
+
+    Pages are read with keyset pagination on (timestamp, id), which the (chat, timestamp, id) index serves
+    as a single range scan, so the cost of a page does not depend on the length of the chat's history.
+
+    :param chat: Chat object.
+    :param cursor: Cursor of the oldest message already loaded, None for the latest messages.
+    :param limit: Page size.
+    :return: Dictionary with the page's messages in chronological order under 'messages', and the cursor
+        to pass to load the page before it under 'next_cursor', None if there are no older messages.
+    :raises ValueError: If the cursor is malformed.
+    """
+    rows = chat.messages.values(*MESSAGE_FIELDS)
+    items, next_cursor = paginate_by_keyset(rows, "timestamp", decode_message_cursor(cursor) if cursor else None, limit, descending=True)
+    usernames = get_chat_usernames(chat)
+    return {
+        "messages": [serialize_message_row(row, usernames) for row in reversed(items)],
+        "next_cursor": None if next_cursor is None else encode_message_cursor(*next_cursor),
+    }
+
+def get_newer_messages(chat: Chat, cursor: Optional[str] = None, limit: int = MESSAGE_PAGE_SIZE) -> dict:
+    """
+    Fetch the messages of a chat following a cursor, for clients catching up on messages they missed,
+    such as after their WebSocket reconnected.
+
+    :param chat: Chat object.
+    :param cursor: Cursor of the newest message already loaded, None to start from the first message.
+    :param limit: Page size.
+    :return: Dictionary with the messages in chronological order under 'messages', the cursor of the newest
+        loaded message under 'next_cursor', and whether more messages follow it under 'has_more'.
+    :raises ValueError: If the cursor is malformed.
+    """
+    rows = chat.messages.values(*MESSAGE_FIELDS)
+    items, more = paginate_by_keyset(rows, "timestamp", decode_message_cursor(cursor) if cursor else None, limit, descending=False)
+    usernames = get_chat_usernames(chat)
+    messages = [serialize_message_row(row, usernames) for row in items]
+    return {
+        "messages": messages,
+        "next_cursor": messages[-1]["cursor"] if messages else cursor,
+        "has_more": more is not None,
+    }
+
+def get_user_chats(user) -> QuerySet:
+    """
+    Query the chats a user takes part in, with both users and their profiles joined, so listing the chats
+    and naming the senders of their messages needs no further queries.
+
+    :param user: User object.
+    :return: Chat queryset.
+    """
+    return Chat.objects.filter(Q(user1=user) | Q(user2=user)).select_related("user1__profile", "user2__profile")
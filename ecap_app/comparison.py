@@ -0,0 +1,73 @@
+from typing import Dict, Iterable, List, Optional
+from django.contrib.auth.models import User
+from .models import Profile
+from .friend_graph import get_friend_ids
+from .ledger import ALL_ROWS, get_ledger_totals
+from .user_metrics import get_monthly_averages, get_saving_goal_progress
+
+
+DEFAULT_PICTURE_URL = "/static/img/default_user.jpg"
+
+
+def get_accepted_friend_ids(user_id: int) -> List[int]:
+    """
+    List the IDs of a user's accepted friends, whichever side sent the request, from the cached friend graph.
+
+    :param user_id: ID of the user.
+    :return: Friend IDs.
+    """
+    return get_friend_ids(user_id)
+
+def get_picture_url(user: User) -> str:
+    """
+    Return the URL of a user's profile picture, or of the default picture.
+
+    :param user: User object, ideally fetched with select_related("profile").
+    :return: Picture URL.
+    """
+    try:
+        picture = user.profile.profile_picture
+    except Profile.DoesNotExist:
+        return DEFAULT_PICTURE_URL
+    return picture.url if picture else DEFAULT_PICTURE_URL
+
+def get_comparison_data(user_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    Gather the comparison metrics of several users at once. Every metric is computed for all users by one
+    query, so the number of queries does not depend on the number of users:
+    one for the users and their profiles, one for the totals, one for the monthly averages and one for the saving goals.
+
+    :param user_ids: IDs of the users.
+    :return: Mapping of user ID to a dictionary with 'username', 'total_income', 'total_expense', 'total_balance',
+        'monthly_income', 'monthly_expense', 'saving_goal_progress' and 'picture_url' keys. Unknown users are left out.
+    """
+    users = User.objects.filter(id__in=list(user_ids)).select_related("profile").in_bulk()
+    totals = get_ledger_totals(users)
+    monthly = get_monthly_averages(users)
+    progress = get_saving_goal_progress(users)
+    return {
+        user_id: {
+            "username": user.username,
+            "total_income": totals[user_id][ALL_ROWS]["income"],
+            "total_expense": totals[user_id][ALL_ROWS]["expense"],
+            "total_balance": totals[user_id][ALL_ROWS]["balance"],
+            "monthly_income": monthly[user_id]["income"],
+            "monthly_expense": monthly[user_id]["expense"],
+            "saving_goal_progress": progress[user_id],
+            "picture_url": get_picture_url(user),
+        }
+        for user_id, user in users.items()
+    }
+
+def get_friend_comparison(user: User, friend_ids: Optional[List[int]] = None) -> dict:
+    """
+    Gather the comparison metrics of a user and of all their accepted friends in a constant number of queries.
+
+    :param user: User object.
+    :param friend_ids: IDs of the user's accepted friends, looked up if None.
+    :return: Dictionary with the user's metrics under 'user_data' and the list of their friends' metrics under 'friends'.
+    """
+    if friend_ids is None:
+        friend_ids = get_accepted_friend_ids(user.id)
+    data = get_comparison_data([user.id, *friend_ids])
+    return {"user_data": data[user.id], "friends": [data[friend_id] for friend_id in friend_ids if friend_id in data]}
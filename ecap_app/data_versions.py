@@ -0,0 +1,49 @@
+import time
+from typing import Dict, Iterable, Optional
+from django.db.models import F
+from .models import DataVersion
+
+
+def get_version(user_id: int, name: str) -> int:
+    """
+    Return the current version of a set of a user's data, such as their ledger rows, creating it on first use.
+
+    Versions are stored in the database so that every process reads the same value, and start from the current
+    time in nanoseconds, so that values cached for a database that was reset are never read again.
+
+    :param user_id: ID of the user.
+    :param name: Name of the versioned data.
+    :return: Data version.
+    """
+    version, _ = DataVersion.objects.get_or_create(user_id=user_id, name=name, defaults={"version": time.time_ns()})
+    return version.version
+
+def get_versions(user_ids: Iterable[int], name: str) -> Dict[int, int]:
+    """
+    Return the current versions of a set of data of several users, creating the missing ones with a single query.
+
+    :param user_ids: IDs of the users.
+    :param name: Name of the versioned data.
+    :return: Mapping of user ID to data version.
+    """
+    user_ids = list(user_ids)
+    versions = dict(DataVersion.objects.filter(name=name, user_id__in=user_ids).values_list("user_id", "version"))
+    missing = [user_id for user_id in user_ids if user_id not in versions]
+    if missing:
+        DataVersion.objects.bulk_create([DataVersion(user_id=user_id, name=name, version=time.time_ns()) for user_id in missing], ignore_conflicts=True)
+        versions.update(DataVersion.objects.filter(name=name, user_id__in=missing).values_list("user_id", "version"))
+    return versions
+
+def bump_versions(name: str, user_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Increase the version of a set of data of several users with a single UPDATE.
+    Users without a version yet are skipped, as nothing can have been cached for them.
+
+    :param name: Name of the versioned data.
+    :param user_ids: IDs of the users, None for all users.
+    :return: Number of bumped versions.
+    """
+    versions = DataVersion.objects.filter(name=name)
+    if user_ids is not None:
+        versions = versions.filter(user_id__in=list(user_ids))
+    return versions.update(version=F("version") + 1)
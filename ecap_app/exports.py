@@ -0,0 +1,110 @@
+import csv
+from typing import IO, Iterable, Iterator, Optional, Sequence
+from django.db.models import QuerySet
+from .models import Expense, Income, Report
+
+
+EXPORT_DATASETS = {
+    "expense": (Expense, ("id", "date", "amount", "category", "description")),
+    "income": (Income, ("id", "date", "amount", "category", "description")),
+    "report": (Report, ("id", "start_date", "end_date", "total_incomes", "total_expenses", "total_balance")),
+}
+# Exported columns read through a relation, the category name is exported instead of its ID.
+EXPORT_LOOKUPS = {"category": "category__name"}
+EXPORT_FORMATS = ("csv", "parquet")
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """
+    File-like object returning what is written to it, letting csv.writer produce lines for a streaming response.
+    """
+    def write(self, value: str) -> str:
+        return value
+
+
+def get_export_columns(dataset: str, include_user: bool = False) -> Sequence[str]:
+    """
+    Return the exported columns of a dataset.
+
+    :param dataset: One of EXPORT_DATASETS.
+    :param include_user: Whether to prepend the owner's user ID, for exports spanning several users.
+    :return: Column names.
+    """
+    columns = EXPORT_DATASETS[dataset][1]
+    return ("user_id", *columns) if include_user else columns
+
+def iter_export_rows(dataset: str, user_ids: Optional[Iterable[int]] = None, include_user: bool = False, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Iterate over the rows of a dataset ordered by ID, fetching them from the database in chunks,
+    so memory use does not depend on the number of rows.
+
+    :param dataset: One of EXPORT_DATASETS.
+    :param user_ids: IDs of the users to export, None for all users.
+    :param include_user: Whether to prepend the owner's user ID to every row.
+    :param chunk_size: Number of rows fetched from the database at a time.
+    :return: Iterator over row tuples in the order of get_export_columns.
+    """
+    model = EXPORT_DATASETS[dataset][0]
+    rows: QuerySet = model.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=list(user_ids))
+    columns = [EXPORT_LOOKUPS.get(column, column) for column in get_export_columns(dataset, include_user)]
+    return rows.order_by("id").values_list(*columns).iterator(chunk_size=chunk_size)
+
+def iter_csv(columns: Sequence[str], rows: Iterable[tuple]) -> Iterator[str]:
+    """
+    Encode rows as CSV lines, starting with a header.
+
+    :param columns: Column names.
+    :param rows: Row tuples.
+    :return: Iterator over CSV lines.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+def write_parquet(columns: Sequence[str], rows: Iterable[tuple], destination: IO, chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+    """
+    Write rows to a Parquet file one row group per chunk, so at most one chunk is held in memory.
+    Requires pyarrow, which is an optional dependency.
+
+    :param columns: Column names.
+    :param rows: Row tuples.
+    :param destination: Binary file-like object or path.
+    :param chunk_size: Number of rows per row group.
+    :return: Number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer, count, chunk = None, 0, []
+
+    def flush():
+        nonlocal writer
+        data = {column: [row[i] for row in chunk] for i, column in enumerate(columns)}
+        table = pa.Table.from_pydict(data, schema=writer.schema if writer else None)
+        if writer is None:
+            writer = pq.ParquetWriter(destination, table.schema)
+        writer.write_table(table)
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            flush()
+            count, chunk = count + len(chunk), []
+    if chunk or writer is None:
+        flush()
+        count += len(chunk)
+    writer.close()
+    return count
+
+def is_parquet_available() -> bool:
+    """
+    Check whether the optional pyarrow dependency needed for Parquet exports is installed.
+    """
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    return True
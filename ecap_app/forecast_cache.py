@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .data_versions import bump_versions, get_version, get_versions
+from .models import Forecast
+
+
+FORECAST_CACHE_ALIAS = getattr(settings, "FORECAST_CACHE_ALIAS", "default")
+FORECAST_CACHE_TIMEOUT = getattr(settings, "FORECAST_CACHE_TIMEOUT", 60 * 60)
+FORECAST_CACHE_LOCAL_ENTRIES = getattr(settings, "FORECAST_CACHE_LOCAL_ENTRIES", 1024)
+LEDGER_VERSION = "ledger"
+STATS_KEYS = {"hits": "forecast-cache:hits", "misses": "forecast-cache:misses"}
+
+local_forecasts = OrderedDict()
+local_forecasts_lock = threading.Lock()
+
+
+def get_forecast_cache():
+    """
+    Return the Django cache backend storing forecasts.
+    """
+    return caches[FORECAST_CACHE_ALIAS]
+
+def get_data_version(user_id: int) -> int:
+    """
+    Return the current version of a user's Expense and Income data, read from the database.
+
+    :param user_id: ID of the user.
+    :return: Data version.
+    """
+    return get_version(user_id, LEDGER_VERSION)
+
+def get_data_versions(user_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Return the current versions of several users' Expense and Income data with a single query.
+
+    :param user_ids: IDs of the users.
+    :return: Mapping of user ID to data version.
+    """
+    return get_versions(user_ids, LEDGER_VERSION)
+
+def bump_data_versions(user_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Invalidate all cached forecasts and ledger values of users by increasing their data versions.
+
+    :param user_ids: IDs of the users whose Expense or Income rows changed, None for all users.
+    """
+    bump_versions(LEDGER_VERSION, user_ids)
+
+def invalidate_forecasts(user_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Invalidate the cached and the precomputed forecasts of users whose Expense or Income rows changed.
+
+    The data versions are bumped once the current transaction commits, so a rolled back write invalidates
+    nothing, and a concurrent reader can never see the new version while still seeing the old rows, which
+    would cache a stale forecast under the new version.
+
+    :param user_ids: IDs of the users, None for all users.
+    """
+    user_ids = None if user_ids is None else list(user_ids)
+
+    def invalidate():
+        forecasts = Forecast.objects.all() if user_ids is None else Forecast.objects.filter(user_id__in=user_ids)
+        forecasts.delete()
+        bump_data_versions(user_ids)
+
+    transaction.on_commit(invalidate)
+
+def get_forecast_cache_key(user_id: int, kind: str, horizon: int, version: int, model: str = "linear") -> str:
+    """
+    Build the cache key of a forecast.
+
+    :param user_id: ID of the user.
+    :param kind: Either 'expense' or 'income'.
+    :param horizon: Number of predicted days.
+    :param version: Data version the forecast was computed from.
+    :param model: Name of the forecasting model.
+    :return: Cache key.
+    """
+    return f"forecast:{user_id}:{kind}:{model}:{horizon}:{version}"
+
+def count_forecast_lookup(outcome: str) -> None:
+    """
+    Increase the shared hit or miss counter.
+
+    :param outcome: Either 'hits' or 'misses'.
+    """
+    cache = get_forecast_cache()
+    try:
+        cache.incr(STATS_KEYS[outcome])
+    except ValueError:
+        cache.add(STATS_KEYS[outcome], 0, timeout=None)
+        cache.incr(STATS_KEYS[outcome])
+
+def get_local_forecast(key: str):
+    """
+    Read a forecast from the in-process LRU layer, dropping it if its TTL expired.
+
+    :param key: Forecast cache key.
+    :return: Cached forecast, None if missing or expired.
+    """
+    with local_forecasts_lock:
+        entry = local_forecasts.get(key)
+        if entry is None:
+            return None
+        expires_at, forecast = entry
+        if expires_at < time.monotonic():
+            del local_forecasts[key]
+            return None
+        local_forecasts.move_to_end(key)
+        return forecast
+
+def set_local_forecast(key: str, forecast) -> None:
+    """
+    Store a forecast in the in-process LRU layer, evicting the least recently used entries beyond its capacity.
+
+    :param key: Forecast cache key.
+    :param forecast: Forecast to store.
+    """
+    with local_forecasts_lock:
+        local_forecasts[key] = (time.monotonic() + FORECAST_CACHE_TIMEOUT, forecast)
+        local_forecasts.move_to_end(key)
+        while len(local_forecasts) > FORECAST_CACHE_LOCAL_ENTRIES:
+            local_forecasts.popitem(last=False)
+
+def cached_forecast(user_id: int, kind: str, horizon: int, compute: Callable, model: str = "linear"):
+    """
+    Return the forecast of a user's expenses or incomes, computing it only if no forecast exists
+    for the current data version.
+
+    Forecasts are looked up in an in-process LRU layer first and in the configured Django cache
+    (local-memory or file based) second. Both layers expire entries after FORECAST_CACHE_TIMEOUT seconds;
+    entries of older data versions are never read again and age out through LRU culling and the TTL.
+
+    :param user_id: ID of the user.
+    :param kind: Either 'expense' or 'income'.
+    :param horizon: Number of predicted days.
+    :param compute: Function without arguments computing the forecast on a miss.
+    :param model: Name of the forecasting model.
+    :return: The forecast.
+    """
+    key = get_forecast_cache_key(user_id, kind, horizon, get_data_version(user_id), model)
+    forecast = get_local_forecast(key)
+    if forecast is None:
+        forecast = get_forecast_cache().get(key)
+        if forecast is not None:
+            set_local_forecast(key, forecast)
+    if forecast is not None:
+        count_forecast_lookup("hits")
+        return forecast
+    count_forecast_lookup("misses")
+    forecast = compute()
+    get_forecast_cache().set(key, forecast, timeout=FORECAST_CACHE_TIMEOUT)
+    set_local_forecast(key, forecast)
+    return forecast
+
+def cached_ledger_value(user_id: int, name: str, compute: Callable):
+    """
+    Return a value derived from a user's Expense and Income data, such as a category breakdown,
+    computing it only if it was not cached for the current data version.
+
+    Values share the two cache layers of forecasts and are invalidated with them once every write commits,
+    through the data version stored in the database.
+
+    :param user_id: ID of the user.
+    :param name: Name of the value, unique per user.
+    :param compute: Function without arguments computing the value on a miss.
+    :return: The value.
+    """
+    key = f"ledger-value:{user_id}:{name}:{get_data_version(user_id)}"
+    value = get_local_forecast(key)
+    if value is None:
+        value = get_forecast_cache().get(key)
+        if value is None:
+            value = compute()
+            get_forecast_cache().set(key, value, timeout=FORECAST_CACHE_TIMEOUT)
+        set_local_forecast(key, value)
+    return value
+
+def get_forecast_cache_stats() -> dict:
+    """
+    Return the forecast cache hit and miss counters shared by all processes using the cache,
+    and the size of this process' LRU layer.
+
+    :return: Dictionary with 'hits', 'misses', 'hit_rate' and 'local_entries' keys.
+    """
+    counters = get_forecast_cache().get_many(STATS_KEYS.values())
+    hits, misses = counters.get(STATS_KEYS["hits"], 0), counters.get(STATS_KEYS["misses"], 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0,
+        "local_entries": len(local_forecasts),
+    }
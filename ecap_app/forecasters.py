@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+from typing import Optional, Protocol
+from .forecasting import LinearTrend, fit_linear_trend, predict_trend
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class Forecaster(Protocol):
+    """
+    Interface of the models projecting a user's expenses or incomes into the future.
+    """
+    name: str
+
+    def fit(self, days: np.ndarray, amounts: np.ndarray, categories: np.ndarray) -> "Forecaster":
+        """
+        Fit the model to a ledger.
+
+        :param days: Array of entry date ordinals.
+        :param amounts: Array of entry amounts.
+        :param categories: Array of entry categories.
+        :return: The fitted model.
+        """
+
+    def predict(self, days: np.ndarray) -> np.ndarray:
+        """
+        Predict the amounts of the given days.
+
+        :param days: Array of date ordinals.
+        :return: Array of predicted amounts.
+        """
+
+
+def get_month_positions(days: np.ndarray):
+    """
+    Locate date ordinals within their months.
+
+    :param days: Array of date ordinals.
+    :return: Tuple of month index (months since 1970), day of month and number of days of the month arrays.
+    """
+    dates = (np.asarray(days, dtype=np.int64) - EPOCH_ORDINAL).astype("datetime64[D]")
+    months = dates.astype("datetime64[M]")
+    day_of_month = (dates - months.astype("datetime64[D]")).astype(np.int64) + 1
+    month_length = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64)
+    return months.astype(np.int64), day_of_month, month_length
+
+def get_daily_totals(days: np.ndarray, amounts: np.ndarray):
+    """
+    Sum a ledger per calendar day, including days without entries.
+
+    :param days: Array of entry date ordinals.
+    :param amounts: Array of entry amounts.
+    :return: Tuple of consecutive date ordinals and daily total arrays.
+    """
+    first = days.min()
+    totals = np.bincount(days - first, weights=amounts)
+    return first + np.arange(len(totals)), totals
+
+
+class LinearForecaster:
+    """
+    Straight line fitted over the date ordinals of all entries, the default model. The served, precomputed and
+    snapshot forecasts fit the same line from the trend statistics, so it predicts the amount of an entry rather than of a day.
+    """
+    name = "linear"
+
+    def __init__(self):
+        self.trend: Optional[LinearTrend] = None
+
+    def fit(self, days, amounts, categories):
+        self.trend = fit_linear_trend(days, amounts)
+        return self
+
+    def predict(self, days):
+        return predict_trend(self.trend, days)
+
+
+class DailyLinearForecaster(LinearForecaster):
+    """
+    Straight line fitted over the daily totals, including days without entries, predicting the same target as the other models.
+    """
+    name = "daily_linear"
+
+    def fit(self, days, amounts, categories):
+        if not len(days):
+            return self
+        self.trend = fit_linear_trend(*get_daily_totals(np.asarray(days, dtype=np.int64), np.asarray(amounts, dtype=float)))
+        return self
+
+
+class MonthlySeasonalForecaster:
+    """
+    Linear trend of the daily totals plus the average deviation from it on each day of the month,
+    capturing rent, salaries and other monthly patterns.
+    """
+    name = "seasonal"
+
+    def __init__(self):
+        self.trend: Optional[LinearTrend] = None
+        self.profile = np.zeros(32)
+
+    def fit(self, days, amounts, categories):
+        if not len(days):
+            return self
+        calendar, totals = get_daily_totals(np.asarray(days, dtype=np.int64), np.asarray(amounts, dtype=float))
+        self.trend = fit_linear_trend(calendar, totals)
+        residuals = totals - predict_trend(self.trend, calendar)
+        _, day_of_month, _ = get_month_positions(calendar)
+        self.profile = np.bincount(day_of_month, residuals, minlength=32) / np.maximum(np.bincount(day_of_month, minlength=32), 1)
+        return self
+
+    def predict(self, days):
+        _, day_of_month, _ = get_month_positions(days)
+        return predict_trend(self.trend, days) + self.profile[day_of_month]
+
+
+class RecurringForecaster:
+    """
+    Detects entries repeating every month with the same category and amount on about the same day,
+    projects them on their next due days and spreads the remaining entries evenly over the days.
+    """
+    name = "recurring"
+
+    def __init__(self, min_months: int = 3, max_day_spread: float = 3.0):
+        """
+        :param min_months: Minimum number of months an entry has to repeat in.
+        :param max_day_spread: Maximum standard deviation of the day of month of its occurrences.
+        """
+        self.min_months = min_months
+        self.max_day_spread = max_day_spread
+        self.rules = pd.DataFrame({"day": np.zeros(0), "amount": np.zeros(0), "last_day": np.zeros(0, dtype=np.int64)})
+        self.baseline = 0.0
+
+    def fit(self, days, amounts, categories):
+        if not len(days):
+            return self
+        days = np.asarray(days, dtype=np.int64)
+        months, day_of_month, _ = get_month_positions(days)
+        ledger = pd.DataFrame({
+            "day": days, "month": months, "day_of_month": day_of_month,
+            "amount": np.round(np.asarray(amounts, dtype=float), 2), "category": categories,
+        })
+        groups = ledger.groupby(["category", "amount"]).agg(
+            count=("day", "size"), months=("month", "nunique"), first_month=("month", "min"), last_month=("month", "max"),
+            day=("day_of_month", "median"), day_spread=("day_of_month", "std"), last_day=("day", "max"),
+        ).reset_index()
+        recurring = (
+            (groups["months"] >= self.min_months)
+            & (groups["count"] == groups["months"])
+            & (groups["last_month"] - groups["first_month"] + 1 <= groups["months"] + 1)
+            & (groups["day_spread"].fillna(0) <= self.max_day_spread)
+            & (groups["last_month"] >= months.max() - 1)
+        )
+        self.rules = groups.loc[recurring, ["day", "amount", "last_day"]].reset_index(drop=True)
+        is_recurring = ledger.merge(groups.loc[recurring, ["category", "amount"]], how="left", indicator=True)["_merge"].eq("both").to_numpy()
+        self.baseline = ledger["amount"].to_numpy()[~is_recurring].sum() / (days.max() - days.min() + 1)
+        return self
+
+    def predict(self, days):
+        days = np.asarray(days, dtype=np.int64)
+        _, day_of_month, month_length = get_month_positions(days)
+        due_day = np.minimum(np.round(self.rules["day"].to_numpy())[:, None], month_length)
+        due = (due_day == day_of_month) & (days > self.rules["last_day"].to_numpy()[:, None])
+        return self.baseline + (due * self.rules["amount"].to_numpy()[:, None]).sum(axis=0)
+
+
+FORECASTERS = {forecaster.name: forecaster for forecaster in (LinearForecaster, DailyLinearForecaster, MonthlySeasonalForecaster, RecurringForecaster)}
+DEFAULT_FORECASTER = LinearForecaster.name
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from typing import NamedTuple, Optional, Tuple
+from django.contrib.auth.models import User
+from .models import TrendStatistics
+
+
+TREND_ORIGIN = date(2000, 1, 1).toordinal()
+
+
+class LinearTrend(NamedTuple):
+    slope: float
+    intercept: float
+
+
+def fit_linear_trend(x: np.ndarray, y: np.ndarray) -> Optional[LinearTrend]:
+    """
+    Fit a least squares line to the given points in closed form.
+
+    Matches sklearn's LinearRegression: a single point gives no trend and constant x gives a flat line at the mean.
+
+    :param x: Array of x values (date ordinals).
+    :param y: Array of y values (amounts).
+    :return: Fitted LinearTrend, None if there are fewer than two points.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if len(x) < 2:
+        return None
+    x_mean, y_mean = x.mean(), y.mean()
+    x_centered = x - x_mean
+    sxx = np.dot(x_centered, x_centered)
+    slope = np.dot(x_centered, y - y_mean) / sxx if sxx else 0.0
+    return LinearTrend(float(slope), float(y_mean - slope * x_mean))
+
+def fit_linear_trends(x: np.ndarray, y: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit one least squares line per row of stacked, padded point arrays in a single vectorized pass.
+
+    :param x: 2D array of x values, one series per row.
+    :param y: 2D array of y values, one series per row.
+    :param mask: 2D boolean array marking the valid (non-padding) points.
+    :return: Tuple of slope and intercept arrays, NaN for rows with fewer than two points.
+    """
+    x, y, mask = np.asarray(x, dtype=float), np.asarray(y, dtype=float), np.asarray(mask, dtype=bool)
+    n = mask.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = np.where(mask, x, 0).sum(axis=1) / n
+        y_mean = np.where(mask, y, 0).sum(axis=1) / n
+        x_centered = np.where(mask, x - x_mean[:, None], 0)
+        y_centered = np.where(mask, y - y_mean[:, None], 0)
+        sxx = (x_centered * x_centered).sum(axis=1)
+        slope = np.where(sxx > 0, (x_centered * y_centered).sum(axis=1) / np.where(sxx > 0, sxx, 1), 0.0)
+    intercept = y_mean - slope * x_mean
+    slope[n < 2], intercept[n < 2] = np.nan, np.nan
+    return slope, intercept
+
+def trend_from_sums(n: float, sum_x: float, sum_y: float, sum_xy: float, sum_xx: float, origin: int = TREND_ORIGIN) -> Optional[LinearTrend]:
+    """
+    Fit a least squares line from its sufficient statistics.
+
+    :param n: Number of points.
+    :param sum_x: Sum of x values, measured from `origin`.
+    :param sum_y: Sum of y values.
+    :param sum_xy: Sum of x * y.
+    :param sum_xx: Sum of x * x.
+    :param origin: Ordinal the x values are measured from.
+    :return: Fitted LinearTrend over absolute date ordinals, None if there are fewer than two points.
+    """
+    if n < 2:
+        return None
+    sxx = sum_xx - sum_x * sum_x / n
+    slope = (sum_xy - sum_x * sum_y / n) / sxx if sxx > 1e-9 * max(sum_xx, 1) else 0.0
+    intercept = (sum_y - slope * sum_x) / n
+    return LinearTrend(float(slope), float(intercept - slope * origin))
+
+def predict_trend(trend: Optional[LinearTrend], x: np.ndarray) -> np.ndarray:
+    """
+    Evaluate a trend at the given x values.
+
+    :param trend: Fitted LinearTrend, None for no trend.
+    :param x: Array of x values (date ordinals).
+    :return: Array of predicted values, zeros if there is no trend.
+    """
+    x = np.asarray(x, dtype=float)
+    if trend is None:
+        return np.zeros(len(x))
+    return trend.intercept + trend.slope * x
+
+def get_user_trend(user: User, kind: str) -> Optional[LinearTrend]:
+    """
+    Read the linear trend of a user's expenses or incomes from the incrementally maintained sufficient statistics.
+
+    :param user: User object.
+    :param kind: Either 'expense' or 'income'.
+    :return: Fitted LinearTrend, None if the user has fewer than two rows.
+    """
+    sums = TrendStatistics.objects.filter(user=user, kind=kind).values_list("n", "sum_x", "sum_y", "sum_xy", "sum_xx").first()
+    if sums is None:
+        return None
+    return trend_from_sums(*sums)
+
+def train_model(data: pd.DataFrame) -> LinearTrend:
+    """
+    Fit a closed-form least squares line on the given data.
+
+    :param data: DataFrame containing date ordinals and amounts.
+    :return: Fitted LinearTrend, None if there are fewer than two data points.
+    """
+    return fit_linear_trend(data["date_ordinal"].values, data["amount"].values)
+
+def predict_future_data(model: LinearTrend, start_date: date, days_to_predict: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Predict future data points using the fitted trend.
+
+    :param model: Fitted LinearTrend.
+    :param start_date: Start date for predictions.
+    :param days_to_predict: Number of future days to predict.
+    :return: Tuple containing future dates and predicted values.
+    """
+    future_dates = [start_date + timedelta(days=i) for i in range(days_to_predict)]
+    future_dates_strings = [future_date.strftime('%Y-%m-%d') for future_date in future_dates]
+    future_dates_ordinal = np.array([future_date.toordinal() for future_date in future_dates])
+    if model:
+        return future_dates_strings, predict_trend(model, future_dates_ordinal)
+    return future_dates_strings, [0]*len(future_dates_strings)
+
+def get_model_slope(model: LinearTrend) -> float:
+    """
+    Get the slope of a fitted trend.
+
+    :param model: Fitted LinearTrend.
+    :return: Slope of the trend, 0 if the model is None.
+    """
+    if model: 
+        return model.slope
+    return 0
@@ -1,7 +1,11 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
-from .models import Profile, Expense, Income, SavingGoal
+from .models import Profile, Expense, Income, SavingGoal, RecurringRule
+from .categories import get_category, normalize_category_name
+from .imports import IMPORT_FORMATS
+from .pagination import MAX_PAGE_SIZE
+from .transactions import TRANSACTION_SORTS
 
 class SignUpForm(UserCreationForm):
     email = forms.EmailField(max_length=254, required=True, help_text="Required. Enter a valid email address.")
@@ -23,7 +27,27 @@ class SignUpForm(UserCreationForm):
         return user
     
 
-class ExpenseForm(forms.ModelForm):
+class CategoryModelForm(forms.ModelForm):
+    """
+    Base of the forms editing a model with a category. The category is typed as free text, normalized
+    and resolved to the matching category of the user, which is created on first use.
+    """
+    category = forms.CharField(max_length=100, widget=forms.TextInput(attrs={"class": "form-control"}))
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user_id = user.id if user is not None else self.instance.user_id
+        if self.instance.pk:
+            self.initial["category"] = self.instance.category.name
+
+    def clean_category(self):
+        name = normalize_category_name(self.cleaned_data["category"])
+        if not name:
+            raise forms.ValidationError("This field is required.")
+        return get_category(self.user_id, name)
+
+
+class ExpenseForm(CategoryModelForm):
     class Meta: 
         model = Expense
         fields = ["date", "amount", "category", "description"]
@@ -31,11 +55,10 @@ class ExpenseForm(forms.ModelForm):
             "date": forms.DateInput(attrs={"class": "form-control", "type": "date"}),
             "amount": forms.NumberInput(attrs={"class": "form-control"}),
             "description": forms.Textarea(attrs={"class": "form-control", "rows": 3}),
-            "category": forms.TextInput(attrs={"class": "form-control"}),
         }
     
 
-class IncomeForm(forms.ModelForm):
+class IncomeForm(CategoryModelForm):
     class Meta:
         model = Income
         fields = ["date", "amount", "category", "description"]
@@ -43,7 +66,20 @@ class IncomeForm(forms.ModelForm):
             "date": forms.DateInput(attrs={"class": "form-control", "type": "date"}),
             "amount": forms.NumberInput(attrs={"class": "form-control"}),
             "description": forms.Textarea(attrs={"class": "form-control", "rows": 3}),
-            "category": forms.TextInput(attrs={"class": "form-control"}),
+        }
+
+
+class RecurringRuleForm(CategoryModelForm):
+    class Meta:
+        model = RecurringRule
+        fields = ["kind", "amount", "category", "description", "cadence", "start_date", "end_date"]
+        widgets = {
+            "kind": forms.Select(attrs={"class": "form-control"}),
+            "amount": forms.NumberInput(attrs={"class": "form-control"}),
+            "description": forms.Textarea(attrs={"class": "form-control", "rows": 3}),
+            "cadence": forms.Select(attrs={"class": "form-control"}),
+            "start_date": forms.DateInput(attrs={"class": "form-control", "type": "date"}),
+            "end_date": forms.DateInput(attrs={"class": "form-control", "type": "date"}),
         }
 
 
@@ -68,4 +104,24 @@ class UserUpdateForm(UserChangeForm):
 class ProfileUpdateForm(forms.ModelForm):
     class Meta:
         model = Profile
-        fields = ["profile_picture", "bio"]
\ No newline at end of file
+        fields = ["profile_picture", "bio"]
+
+
+class StatementImportForm(forms.Form):
+    statement = forms.FileField()
+    format = forms.ChoiceField(choices=[(name, name.upper()) for name in IMPORT_FORMATS], initial="csv")
+    kind = forms.ChoiceField(choices=[("", "Detect from the amount sign"), ("expense", "Expense"), ("income", "Income")], required=False)
+    date_format = forms.CharField(max_length=32, required=False, help_text="strptime format of CSV dates, ISO dates if empty.")
+    decimal_separator = forms.ChoiceField(choices=[(".", "Decimal point"), (",", "Decimal comma")], initial=".", required=False)
+
+
+class TransactionQueryForm(forms.Form):
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    category = forms.CharField(max_length=100, required=False)
+    amount_min = forms.DecimalField(max_digits=10, decimal_places=2, required=False)
+    amount_max = forms.DecimalField(max_digits=10, decimal_places=2, required=False)
+    q = forms.CharField(max_length=100, required=False)
+    sort = forms.ChoiceField(choices=[(sort, sort) for sort in TRANSACTION_SORTS], required=False)
+    cursor = forms.CharField(max_length=64, required=False)
+    limit = forms.IntegerField(min_value=1, max_value=MAX_PAGE_SIZE, required=False)
@@ -0,0 +1,160 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models import Q
+from .models import Friend
+
+
+FRIEND_CACHE_ALIAS = getattr(settings, "FRIEND_CACHE_ALIAS", "default")
+FRIEND_CACHE_TIMEOUT = getattr(settings, "FRIEND_CACHE_TIMEOUT", 60 * 60)
+
+
+def get_friend_cache():
+    """
+    Return the Django cache backend storing the friend adjacencies.
+    """
+    return caches[FRIEND_CACHE_ALIAS]
+
+def get_adjacency_cache_key(user_id: int) -> str:
+    """
+    Build the cache key of a user's friend adjacency.
+
+    :param user_id: ID of the user.
+    :return: Cache key.
+    """
+    return f"friend-graph:{user_id}"
+
+def load_adjacencies(user_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    Read the accepted and pending friend relations of several users from the Friend table with a single query.
+
+    :param user_ids: IDs of the users.
+    :return: Mapping of user ID to its adjacency, see get_friend_adjacency.
+    """
+    adjacencies = {user_id: {"friends": [], "incoming": {}, "outgoing": []} for user_id in user_ids}
+    ids = list(adjacencies)
+    relations = Friend.objects.filter(Q(user_id__in=ids) | Q(friend_id__in=ids), status__in=("accepted", "pending")).order_by("id")
+    for relation_id, sender_id, receiver_id, status in relations.values_list("id", "user_id", "friend_id", "status"):
+        if status == "accepted":
+            for user_id, other_id in ((sender_id, receiver_id), (receiver_id, sender_id)):
+                if user_id in adjacencies:
+                    adjacencies[user_id]["friends"].append(other_id)
+        else:
+            if sender_id in adjacencies:
+                adjacencies[sender_id]["outgoing"].append(receiver_id)
+            if receiver_id in adjacencies:
+                adjacencies[receiver_id]["incoming"][relation_id] = sender_id
+    return adjacencies
+
+def get_friend_adjacencies(user_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    Return the friend adjacencies of several users, reading the cached ones with one cache lookup
+    and loading all missing ones with a single query.
+
+    :param user_ids: IDs of the users.
+    :return: Mapping of user ID to its adjacency, see get_friend_adjacency.
+    """
+    keys = {get_adjacency_cache_key(user_id): user_id for user_id in user_ids}
+    cache = get_friend_cache()
+    cached = cache.get_many(keys)
+    adjacencies = {keys[key]: adjacency for key, adjacency in cached.items()}
+    missing = [user_id for key, user_id in keys.items() if key not in cached]
+    if missing:
+        loaded = load_adjacencies(missing)
+        cache.set_many({get_adjacency_cache_key(user_id): adjacency for user_id, adjacency in loaded.items()}, timeout=FRIEND_CACHE_TIMEOUT)
+        adjacencies.update(loaded)
+    return adjacencies
+
+def get_friend_adjacency(user_id: int) -> dict:
+    """
+    Return a user's friend adjacency, from the cache when possible.
+
+    :param user_id: ID of the user.
+    :return: Dictionary with the IDs of the accepted friends under 'friends', in the order the friendships were requested,
+        the IDs of the users who sent a pending request to the user under 'incoming', keyed by request ID,
+        and the IDs of the users the user sent a pending request to under 'outgoing'.
+    """
+    return get_friend_adjacencies([user_id])[user_id]
+
+def invalidate_friend_graph(user_ids: Iterable[int]) -> None:
+    """
+    Drop the cached adjacencies of users whose friend relations changed.
+
+    :param user_ids: IDs of the users.
+    """
+    get_friend_cache().delete_many([get_adjacency_cache_key(user_id) for user_id in user_ids])
+
+def get_friend_ids(user_id: int) -> List[int]:
+    """
+    List the IDs of a user's accepted friends, whichever side sent the request.
+
+    :param user_id: ID of the user.
+    :return: Friend IDs.
+    """
+    return list(get_friend_adjacency(user_id)["friends"])
+
+def get_users(user_ids: Iterable[int]) -> List[User]:
+    """
+    Load users with their profiles using a single query.
+
+    :param user_ids: IDs of the users.
+    :return: User objects in the order of the IDs, unknown IDs are left out.
+    """
+    user_ids = list(user_ids)
+    users = User.objects.filter(id__in=user_ids).select_related("profile").in_bulk()
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
+def get_mutual_friend_ids(user_id: int, other_id: int) -> List[int]:
+    """
+    List the friends two users have in common.
+
+    :param user_id: ID of the first user.
+    :param other_id: ID of the second user.
+    :return: IDs of the mutual friends, in the first user's friend order.
+    """
+    adjacencies = get_friend_adjacencies([user_id, other_id])
+    others = set(adjacencies[other_id]["friends"])
+    return [friend_id for friend_id in adjacencies[user_id]["friends"] if friend_id in others]
+
+def suggest_friends(user_id: int, limit: int = 10) -> List[Tuple[int, int]]:
+    """
+    Suggest friends of friends a user is not related to yet, ranked by the number of mutual friends.
+    The friends' adjacencies are read from the cache, so the Friend table is only queried for uncached friends.
+
+    :param user_id: ID of the user.
+    :param limit: Maximum number of suggestions.
+    :return: List of (user ID, number of mutual friends) tuples, most mutual friends first.
+    """
+    adjacency = get_friend_adjacency(user_id)
+    excluded = {user_id, *adjacency["friends"], *adjacency["outgoing"], *adjacency["incoming"].values()}
+    mutual = Counter(
+        candidate_id
+        for friend_adjacency in get_friend_adjacencies(adjacency["friends"]).values()
+        for candidate_id in friend_adjacency["friends"]
+        if candidate_id not in excluded
+    )
+    return sorted(mutual.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+def get_incoming_requests(user_id: int) -> List[dict]:
+    """
+    List the pending friend requests received by a user, with their senders loaded in a single query.
+
+    :param user_id: ID of the user.
+    :return: List of dictionaries with the request ID under 'id' and the sending User object under 'user'.
+    """
+    incoming = get_friend_adjacency(user_id)["incoming"]
+    senders = {user.id: user for user in get_users(incoming.values())}
+    return [{"id": request_id, "user": senders[sender_id]} for request_id, sender_id in incoming.items() if sender_id in senders]
+
+def get_friend_suggestions(user_id: int, limit: int = 10) -> List[dict]:
+    """
+    Load the users suggested by suggest_friends.
+
+    :param user_id: ID of the user.
+    :param limit: Maximum number of suggestions.
+    :return: List of dictionaries with the suggested User object under 'user' and the number of mutual friends under 'mutual_friends'.
+    """
+    suggestions = dict(suggest_friends(user_id, limit))
+    return [{"user": user, "mutual_friends": suggestions[user.id]} for user in get_users(suggestions)]
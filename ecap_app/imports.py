@@ -0,0 +1,226 @@
+import csv
+import io
+import re
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import IO, Dict, Iterable, Iterator, NamedTuple, Optional
+from django.contrib.auth.models import User
+from django.db import transaction
+from .categories import get_category, normalize_category_name
+from .ledger import CENT, LEDGER_MODELS, rebuild_ledger_rollups
+from .search import index_ledger_rows
+
+
+IMPORT_FORMATS = ("csv", "ofx")
+DEFAULT_COLUMNS = {"date": "date", "amount": "amount", "category": "category", "description": "description", "kind": "kind"}
+DEFAULT_CATEGORY = "Imported"
+OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+
+class ImportedTransaction(NamedTuple):
+    kind: str
+    date: date
+    amount: Decimal
+    category: str
+    description: str
+
+
+class StatementError(ValueError):
+    """
+    Raised when a statement cannot be parsed.
+    """
+
+
+def parse_amount(value: str, decimal_separator: str = ".") -> Decimal:
+    """
+    Parse a statement amount such as '-1,234.50' or '12.5', or '-1.234,50' and '12,5' with a decimal comma.
+
+    :param value: Amount as written in the statement.
+    :param decimal_separator: Either '.' or ',', the other one being read as a thousands separator.
+    :return: Signed amount rounded to cents.
+    """
+    thousands_separator = "," if decimal_separator == "." else "."
+    try:
+        return Decimal(value.strip().replace(thousands_separator, "").replace(" ", "").replace(decimal_separator, ".")).quantize(CENT)
+    except InvalidOperation:
+        raise StatementError(f"Invalid amount: {value!r}")
+
+def parse_date(value: str, date_format: Optional[str] = None) -> date:
+    """
+    Parse a statement date, in ISO format unless another format is given.
+
+    :param value: Date as written in the statement.
+    :param date_format: strptime format, None for ISO dates.
+    :return: Parsed date.
+    """
+    try:
+        if date_format:
+            return datetime.strptime(value.strip(), date_format).date()
+        return date.fromisoformat(value.strip()[:10])
+    except ValueError:
+        raise StatementError(f"Invalid date: {value!r}")
+
+def build_transaction(raw_date: date, amount: Decimal, category: str, description: str, kind: Optional[str] = None) -> ImportedTransaction:
+    """
+    Build an imported transaction, deriving its kind from the sign of the amount when the statement does not state it.
+
+    :param raw_date: Date of the transaction.
+    :param amount: Signed amount, negative for expenses.
+    :param category: Category name, normalized, DEFAULT_CATEGORY if empty.
+    :param description: Description.
+    :param kind: Either 'expense' or 'income', None to use the sign of the amount.
+    :return: Transaction with a positive amount.
+    """
+    kind = kind or ("expense" if amount < 0 else "income")
+    if kind not in LEDGER_MODELS:
+        raise StatementError(f"Invalid kind: {kind!r}")
+    return ImportedTransaction(kind, raw_date, abs(amount), normalize_category_name(category) or DEFAULT_CATEGORY, (description or "").strip())
+
+def parse_csv(
+    lines: Iterable[str], columns: Optional[Dict[str, str]] = None, kind: Optional[str] = None, date_format: Optional[str] = None,
+    delimiter: str = ",", decimal_separator: Optional[str] = None
+) -> Iterator[ImportedTransaction]:
+    """
+    Parse a CSV statement line by line.
+
+    :param lines: Lines of the statement, starting with its header.
+    :param columns: Mapping of the date, amount, category, description and kind fields to statement column names.
+        Date and amount columns are required, the others are optional.
+    :param kind: Kind of all transactions, None to read it from the kind column or the sign of the amount.
+    :param date_format: strptime format of the dates, None for ISO dates.
+    :param delimiter: Column separator.
+    :param decimal_separator: Decimal separator of the amounts, either '.' or ',', None for ',' in statements
+        separated by ';', as written by spreadsheets in locales with a decimal comma, and '.' otherwise.
+    :return: Iterator over the parsed transactions.
+    """
+    columns = {**DEFAULT_COLUMNS, **(columns or {})}
+    if decimal_separator is None:
+        decimal_separator = "," if delimiter == ";" else "."
+    if decimal_separator not in (".", ","):
+        raise StatementError(f"Invalid decimal separator: {decimal_separator!r}")
+    reader = csv.DictReader(lines, delimiter=delimiter)
+    missing = [columns[field] for field in ("date", "amount") if columns[field] not in (reader.fieldnames or ())]
+    if missing:
+        raise StatementError(f"Missing columns: {', '.join(missing)}")
+    for line, row in enumerate(reader, start=2):
+        try:
+            yield build_transaction(
+                parse_date(row[columns["date"]], date_format),
+                parse_amount(row[columns["amount"]], decimal_separator),
+                row.get(columns["category"]) or "",
+                row.get(columns["description"]) or "",
+                kind or (row.get(columns["kind"]) or "").strip().lower() or None,
+            )
+        except StatementError as error:
+            raise StatementError(f"Line {line}: {error}")
+
+def parse_ofx(lines: Iterable[str], kind: Optional[str] = None, category: str = DEFAULT_CATEGORY) -> Iterator[ImportedTransaction]:
+    """
+    Parse the transactions of an OFX statement line by line. Both the SGML (OFX 1.x, unclosed tags)
+    and the XML (OFX 2.x) dialects are supported.
+
+    :param lines: Lines of the statement.
+    :param kind: Kind of all transactions, None to use the sign of the amount.
+    :param category: Category of all transactions.
+    :return: Iterator over the parsed transactions.
+    """
+    fields = None
+    for line in lines:
+        for tag, value in OFX_FIELD.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                fields = {}
+            elif fields is not None and value.strip():
+                fields[tag] = value.strip()
+        if fields is not None and "</STMTTRN>" in line.upper():
+            yield ofx_transaction(fields, kind, category)
+            fields = None
+
+def ofx_transaction(fields: Dict[str, str], kind: Optional[str], category: str) -> ImportedTransaction:
+    """
+    Build a transaction from the fields of an OFX STMTTRN block.
+
+    :param fields: Values of the block's tags.
+    :param kind: Kind of the transaction, None to use the sign of the amount.
+    :param category: Category of the transaction.
+    :return: Parsed transaction.
+    """
+    if "DTPOSTED" not in fields or "TRNAMT" not in fields:
+        raise StatementError(f"Transaction without date or amount: {fields}")
+    description = " ".join(value for value in (fields.get("NAME"), fields.get("MEMO")) if value)
+    return build_transaction(parse_date(fields["DTPOSTED"][:8], "%Y%m%d"), parse_amount(fields["TRNAMT"]), category, description, kind)
+
+def get_existing_keys(user: User) -> Counter:
+    """
+    Count the dedupe keys of a user's existing expenses and incomes.
+
+    :param user: User object.
+    :return: Multiset of (kind, date, amount, description) tuples.
+    """
+    keys = Counter()
+    for kind, model in LEDGER_MODELS.items():
+        rows = model.objects.filter(user=user).values_list("date", "amount", "description")
+        keys.update((kind, day, amount, description.strip()) for day, amount, description in rows.iterator(chunk_size=10000))
+    return keys
+
+def import_transactions(user: User, transactions: Iterable[ImportedTransaction], batch_size: int = 5000) -> dict:
+    """
+    Insert parsed transactions for a user with bulk_create, skipping those whose kind, date, amount and description
+    match an existing row. Existing rows are counted, so each of them absorbs one matching transaction only:
+    identical transactions within a statement, such as two coffees on the same day, are all imported,
+    and importing the same statement again imports nothing.
+
+    The whole import runs in one transaction. Categories are looked up, or created, once per distinct name.
+    Since bulk writes bypass the per-row signals, the new rows
+    are indexed for search batch by batch, and the rollups and cached forecasts of the user are rebuilt once at the end.
+
+    :param user: Owner of the imported rows.
+    :param transactions: Parsed transactions.
+    :param batch_size: Number of rows inserted per query.
+    :return: Dictionary with the number of imported expenses and incomes and of skipped duplicates.
+    """
+    existing = get_existing_keys(user)
+    batches = {kind: [] for kind in LEDGER_MODELS}
+    stats = {"expense": 0, "income": 0, "duplicates": 0}
+    category_ids = {}
+
+    def flush(kind):
+        index_ledger_rows(kind, LEDGER_MODELS[kind].objects.bulk_create(batches[kind], batch_size=batch_size))
+        stats[kind] += len(batches[kind])
+        batches[kind] = []
+
+    with transaction.atomic():
+        for item in transactions:
+            key = (item.kind, item.date, item.amount, item.description)
+            if existing[key]:
+                existing[key] -= 1
+                stats["duplicates"] += 1
+                continue
+            if item.category not in category_ids:
+                category_ids[item.category] = get_category(user.id, item.category).id
+            batches[item.kind].append(LEDGER_MODELS[item.kind](
+                user_id=user.id, date=item.date, amount=item.amount, category_id=category_ids[item.category], description=item.description
+            ))
+            if len(batches[item.kind]) >= batch_size:
+                flush(item.kind)
+        for kind in LEDGER_MODELS:
+            flush(kind)
+        if stats["expense"] or stats["income"]:
+            rebuild_ledger_rollups([user.id])
+    return stats
+
+def import_statement(user: User, statement: IO[bytes], statement_format: str = "csv", encoding: str = "utf-8", **options) -> dict:
+    """
+    Parse a binary statement file and import its transactions for a user.
+
+    :param user: Owner of the imported rows.
+    :param statement: Binary file-like object, such as an uploaded file.
+    :param statement_format: One of IMPORT_FORMATS.
+    :param encoding: Text encoding of the statement.
+    :param options: Keyword arguments of parse_csv or parse_ofx.
+    :return: Import statistics of import_transactions.
+    """
+    lines = io.TextIOWrapper(statement, encoding=encoding, newline="")
+    parser = parse_csv if statement_format == "csv" else parse_ofx
+    return import_transactions(user, parser(lines, **options))
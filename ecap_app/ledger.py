@@ -0,0 +1,516 @@
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Avg, Case, Count, DecimalField, F, FloatField, Max, Min, OuterRef, Q, StdDev, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Abs, Cast, Coalesce, Greatest, Least
+from .models import AmountStatistics, DailyLedger, Expense, Income, TrendStatistics
+from .categories import get_category_key, get_category_names
+from .forecasting import TREND_ORIGIN
+from .forecast_cache import cached_ledger_value, invalidate_forecasts
+from .rankings import mark_rankings_stale
+from .online_stats import accumulator_statistics, welford_add, welford_merge, welford_remove
+
+
+AMOUNT_FIELD = DecimalField(max_digits=50, decimal_places=2)
+CENT = Decimal("0.01")
+ALL_ROWS = "all"
+LEDGER_KINDS = {Expense: "expense", Income: "income"}
+LEDGER_MODELS = {kind: model for model, kind in LEDGER_KINDS.items()}
+SUM_OF_SQUARES = Sum(F("amount") * F("amount"), output_field=FloatField())
+
+
+def get_window_condition(start_date: Optional[date] = None, end_date: Optional[date] = None, field: str = "date") -> Q:
+    """
+    Build the date condition of a (possibly open) date window.
+
+    :param start_date: Inclusive start of the window, None for no lower bound.
+    :param end_date: Inclusive end of the window, None for no upper bound.
+    :param field: Name of the date field to filter on.
+    :return: Q object filtering rows by their date.
+    """
+    condition = Q()
+    if start_date is not None:
+        condition &= Q(**{f"{field}__gte": start_date})
+    if end_date is not None:
+        condition &= Q(**{f"{field}__lte": end_date})
+    return condition
+
+def sum_amount_subquery(model, condition: Q) -> Coalesce:
+    """
+    Build a correlated subquery summing the amounts of the outer user's rows matching a condition.
+
+    :param model: Expense or Income model class.
+    :param condition: Condition applied to the sum (conditional aggregation).
+    :return: Expression evaluating to the Decimal total, 0 if there are no matching rows.
+    """
+    total = Sum("amount", filter=condition) if condition else Sum("amount")
+    rows = model.objects.filter(user=OuterRef("pk")).order_by().values("user").annotate(total=total).values("total")
+    return Coalesce(Subquery(rows, output_field=AMOUNT_FIELD), Value(Decimal(0)), output_field=AMOUNT_FIELD)
+
+def build_totals(income: Decimal, expense: Decimal) -> dict:
+    """
+    Assemble the totals of one window, rounded to the precision of the amount fields.
+
+    :param income: Total income in the window.
+    :param expense: Total expense in the window.
+    :return: Dictionary with 'income', 'expense' and 'balance' keys.
+    """
+    income, expense = Decimal(income).quantize(CENT), Decimal(expense).quantize(CENT)
+    return {"income": income, "expense": expense, "balance": income - expense}
+
+def get_ledger_totals(user_ids: Iterable[int], **windows: Tuple[Optional[date], Optional[date]]) -> Dict[int, dict]:
+    """
+    Calculate total, windowed and balance amounts for several users in a single SQL query.
+
+    Every (model, window) pair becomes one conditional SUM subquery of the same SELECT,
+    so the rows are never loaded into Python and Decimal precision is kept.
+
+    :param user_ids: IDs of the users to aggregate.
+    :param windows: Named date windows as (start_date, end_date) tuples, None meaning unbounded.
+    :return: Mapping of user ID to {window name: {'income', 'expense', 'balance'}}. Totals over all
+             rows are stored under the 'all' window.
+    """
+    windows = {ALL_ROWS: (None, None), **windows}
+    annotations = {}
+    for name, (start_date, end_date) in windows.items():
+        condition = get_window_condition(start_date, end_date)
+        annotations[f"{name}_income"] = sum_amount_subquery(Income, condition)
+        annotations[f"{name}_expense"] = sum_amount_subquery(Expense, condition)
+    user_ids = list(user_ids)
+    totals = {user_id: {name: build_totals(Decimal(0), Decimal(0)) for name in windows} for user_id in user_ids}
+    rows = User.objects.filter(pk__in=user_ids).order_by().annotate(**annotations).values("pk", *annotations)
+    for row in rows:
+        totals[row["pk"]] = {name: build_totals(row[f"{name}_income"], row[f"{name}_expense"]) for name in windows}
+    return totals
+
+def get_user_ledger_totals(user: User, **windows: Tuple[Optional[date], Optional[date]]) -> dict:
+    """
+    Calculate total, windowed and balance amounts for a single user in a single SQL query.
+
+    :param user: User object.
+    :param windows: Named date windows as (start_date, end_date) tuples, None meaning unbounded.
+    :return: Dictionary of {window name: {'income', 'expense', 'balance'}}, including the 'all' window.
+    """
+    return get_ledger_totals([user.pk], **windows)[user.pk]
+
+def get_amount_aggregates(model, user_ids: Iterable[int], start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict[int, dict]:
+    """
+    Calculate amount statistics of Expense or Income rows for several users, optionally within a date window.
+
+    The statistics are computed by one grouped aggregate query. The dates of the minimal, maximal and
+    closest-to-average rows are then fetched by a second query made of ordered LIMIT 1 subqueries,
+    so neither query depends on the number of users or rows.
+
+    :param model: Expense or Income model class.
+    :param user_ids: IDs of the users to aggregate.
+    :param start_date: Inclusive start of the window, None for no lower bound.
+    :param end_date: Inclusive end of the window, None for no upper bound.
+    :return: Mapping of user ID to a dictionary with 'min', 'max' and 'avg' (amount, date) tuples, 'std' and 'count'.
+             Users without rows in the window are missing from the mapping.
+    """
+    user_ids = list(user_ids)
+    rows = model.objects.filter(get_window_condition(start_date, end_date), user_id__in=user_ids).order_by()
+    statistics = rows.values("user_id").annotate(
+        min=Min("amount"),
+        max=Max("amount"),
+        avg=Avg("amount"),
+        std=StdDev("amount"),
+        count=Count("id")
+    )
+    aggregates = {
+        row["user_id"]: {
+            "min": Decimal(row["min"]).quantize(CENT),
+            "max": Decimal(row["max"]).quantize(CENT),
+            "avg": Decimal(row["avg"]),
+            "std": float(row["std"] or 0),
+            "count": row["count"],
+        } for row in statistics
+    }
+    if not aggregates:
+        return {}
+    user_rows = model.objects.filter(get_window_condition(start_date, end_date), user=OuterRef("pk"))
+    dates = User.objects.filter(pk__in=aggregates).order_by().annotate(
+        min_date=Subquery(user_rows.order_by("amount", "id").values("date")[:1]),
+        max_date=Subquery(user_rows.order_by("-amount", "id").values("date")[:1]),
+        avg_date=Subquery(user_rows.annotate(distance=Abs(F("amount") - Window(Avg("amount")))).order_by("distance", "id").values("date")[:1]),
+    ).values("pk", "min_date", "max_date", "avg_date")
+    for row in dates:
+        user_aggregates = aggregates[row["pk"]]
+        for name in ("min", "max", "avg"):
+            user_aggregates[name] = (user_aggregates[name], row[f"{name}_date"])
+    return aggregates
+
+def get_user_amount_aggregates(model, user: User, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Optional[dict]:
+    """
+    Calculate amount statistics of a user's Expense or Income rows, optionally within a date window.
+
+    :param model: Expense or Income model class.
+    :param user: User object.
+    :param start_date: Inclusive start of the window, None for no lower bound.
+    :param end_date: Inclusive end of the window, None for no upper bound.
+    :return: Dictionary with 'min', 'max' and 'avg' (amount, date) tuples, 'std' and 'count',
+             None if the user has no rows in the window.
+    """
+    return get_amount_aggregates(model, [user.pk], start_date, end_date).get(user.pk)
+
+def welford_update_expressions(count: str, mean, m2: str, value: float, removed: bool = False) -> Tuple:
+    """
+    Build the SQL expressions of the Welford update adding a value to (or removing it from) an accumulator
+    stored in a row, so that the update is applied by a single UPDATE statement on the current values
+    instead of a read-modify-write. The expressions match welford_add and welford_remove.
+
+    :param count: Name of the count field.
+    :param mean: Expression of the current mean.
+    :param m2: Name of the field holding the sum of squared deviations from the mean.
+    :param value: Value to add or remove.
+    :param removed: Whether the value is removed instead of added.
+    :return: Tuple of the expressions of the updated count, mean and m2.
+    """
+    n = Cast(F(count), FloatField())
+    delta = Value(value, output_field=FloatField()) - mean
+    if not removed:
+        return F(count) + 1, mean + delta / (n + 1), F(m2) + delta * delta * n / (n + 1)
+    last = Q(**{f"{count}__lte": 1})
+    return (
+        F(count) - 1,
+        Case(When(last, then=Value(0.0)), default=(n * mean - value) / (n - 1), output_field=FloatField()),
+        Case(When(last, then=Value(0.0)), default=Greatest(F(m2) - n * delta * delta / (n - 1), Value(0.0)), output_field=FloatField()),
+    )
+
+def update_daily_ledger(user_id: int, day: date, category_id: int, kind: str, amount: Decimal, removed: bool = False) -> None:
+    """
+    Add a single Expense or Income row to (or remove it from) its (user, day, category) daily ledger bucket.
+
+    The sums, counts and Welford accumulators are changed with F() expressions, so concurrent writes to
+    the same bucket cannot lose updates. Buckets left without any expense or income rows are removed.
+    Must run inside a transaction.
+
+    :param user_id: ID of the row owner.
+    :param day: Date of the row.
+    :param category_id: ID of the category of the row.
+    :param kind: Either 'expense' or 'income'.
+    :param amount: Amount of the row.
+    :param removed: Whether the row is removed instead of added.
+    """
+    entry, _ = DailyLedger.objects.get_or_create(user_id=user_id, day=day, category_id=category_id)
+    count, total = f"{kind}_count", f"{kind}_sum"
+    mean = Case(When(**{count: 0}, then=Value(0.0)), default=Cast(F(total), FloatField()) / Cast(F(count), FloatField()), output_field=FloatField())
+    new_count, _, new_m2 = welford_update_expressions(count, mean, f"{kind}_m2", float(amount), removed)
+    entries = DailyLedger.objects.filter(pk=entry.pk)
+    entries.update(**{count: new_count, total: F(total) + (-amount if removed else amount), f"{kind}_m2": new_m2})
+    entries.filter(income_count=0, expense_count=0).delete()
+
+def update_amount_statistics(user_id: int, category_id: int, kind: str, amount: Decimal, removed: bool = False) -> None:
+    """
+    Add a single Expense or Income row to (or remove it from) the total and Welford accumulator of its (user, kind, category).
+
+    The count, total and Welford accumulator are changed with F() expressions, so concurrent writes cannot lose
+    updates. The row is only read back when a removed row was the current minimum or maximum, which is then
+    recomputed from the remaining rows. Must run inside a transaction.
+
+    :param user_id: ID of the row owner.
+    :param category_id: ID of the category of the row.
+    :param kind: Either 'expense' or 'income'.
+    :param amount: Amount of the row.
+    :param removed: Whether the row is removed instead of added.
+    """
+    statistics, _ = AmountStatistics.objects.get_or_create(user_id=user_id, kind=kind, category_id=category_id)
+    count, mean, m2 = welford_update_expressions("count", F("mean"), "m2", float(amount), removed)
+    rows = AmountStatistics.objects.filter(pk=statistics.pk)
+    if not removed:
+        rows.update(
+            count=count, mean=mean, m2=m2, total=F("total") + amount,
+            minimum=Coalesce(Least("minimum", Value(amount)), Value(amount)), maximum=Coalesce(Greatest("maximum", Value(amount)), Value(amount)),
+        )
+        return
+    rows.update(count=count, mean=mean, m2=m2, total=F("total") - amount)
+    if rows.filter(count=0).delete()[0]:
+        return
+    if rows.filter(Q(minimum=amount) | Q(maximum=amount)).exists():
+        extremes = LEDGER_MODELS[kind].objects.filter(user_id=user_id, category_id=category_id).aggregate(minimum=Min("amount"), maximum=Max("amount"))
+        rows.update(**extremes)
+
+def update_trend_statistics(user_id: int, day: date, kind: str, amount: Decimal, removed: bool = False) -> None:
+    """
+    Add a single Expense or Income row to (or remove it from) the trend sufficient statistics of its (user, kind).
+
+    The sums are changed with F() expressions, so concurrent writes cannot lose updates. Must run inside a transaction.
+
+    :param user_id: ID of the row owner.
+    :param day: Date of the row.
+    :param kind: Either 'expense' or 'income'.
+    :param amount: Amount of the row.
+    :param removed: Whether the row is removed instead of added.
+    """
+    statistics, _ = TrendStatistics.objects.get_or_create(user_id=user_id, kind=kind)
+    sign = -1 if removed else 1
+    x, y = day.toordinal() - TREND_ORIGIN, float(amount)
+    rows = TrendStatistics.objects.filter(pk=statistics.pk)
+    rows.update(
+        n=F("n") + sign, sum_x=F("sum_x") + sign * x, sum_y=F("sum_y") + sign * y,
+        sum_xy=F("sum_xy") + sign * x * y, sum_xx=F("sum_xx") + sign * x * x,
+    )
+    rows.filter(n=0).delete()
+
+def update_ledger_rollups(user_id: int, day: date, category_id: int, kind: str, amount, removed: bool = False) -> None:
+    """
+    Add a single Expense or Income row to (or remove it from) the daily ledger, the amount statistics
+    and the trend statistics.
+
+    :param user_id: ID of the row owner.
+    :param day: Date of the row.
+    :param category_id: ID of the category of the row.
+    :param kind: Either 'expense' or 'income'.
+    :param amount: Amount of the row.
+    :param removed: Whether the row is removed instead of added.
+    """
+    amount = Decimal(str(amount))
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    with transaction.atomic():
+        update_daily_ledger(user_id, day, category_id, kind, amount, removed)
+        update_amount_statistics(user_id, category_id, kind, amount, removed)
+        update_trend_statistics(user_id, day, kind, amount, removed)
+
+def get_m2(count: int, total, sum_of_squares: Optional[float]) -> float:
+    """
+    Compute the sum of squared deviations from the mean of values from their count, sum and sum of squares,
+    which unlike Variance are aggregated natively by every database, SQLite computing Variance in Python.
+
+    :param count: Number of values.
+    :param total: Sum of the values.
+    :param sum_of_squares: Sum of the squared values.
+    :return: Sum of squared deviations from the mean.
+    """
+    if count < 2:
+        return 0.0
+    return max(sum_of_squares - float(total) ** 2 / count, 0.0)
+
+def aggregate_daily_ledger(condition: Q) -> Dict[tuple, DailyLedger]:
+    """
+    Compute daily ledger buckets from the raw Expense and Income rows matching a condition.
+
+    :param condition: Condition applied to both Expense and Income rows.
+    :return: Mapping of (user ID, day, category ID) to unsaved DailyLedger instances.
+    """
+    entries = {}
+    for model, kind in LEDGER_KINDS.items():
+        rows = model.objects.filter(condition).order_by().values("user_id", "date", "category_id").annotate(total=Sum("amount"), count=Count("id"), squares=SUM_OF_SQUARES)
+        for row in rows.iterator():
+            key = (row["user_id"], row["date"], row["category_id"])
+            entry = entries.setdefault(key, DailyLedger(user_id=row["user_id"], day=row["date"], category_id=row["category_id"]))
+            setattr(entry, f"{kind}_sum", Decimal(row["total"]).quantize(CENT))
+            setattr(entry, f"{kind}_count", row["count"])
+            setattr(entry, f"{kind}_m2", get_m2(row["count"], row["total"], row["squares"]))
+    return entries
+
+def rebuild_daily_ledger(user_ids: Optional[Iterable[int]] = None, start_date: Optional[date] = None, end_date: Optional[date] = None, batch_size: int = 1000) -> int:
+    """
+    Recompute the daily ledger from scratch, optionally limited to some users and a date window.
+
+    :param user_ids: IDs of the users to rebuild, None for all users.
+    :param start_date: Inclusive start of the rebuilt window, None for no lower bound.
+    :param end_date: Inclusive end of the rebuilt window, None for no upper bound.
+    :param batch_size: Number of buckets inserted per query.
+    :return: Number of buckets written.
+    """
+    row_condition = get_window_condition(start_date, end_date)
+    ledger_condition = get_window_condition(start_date, end_date, field="day")
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        row_condition &= Q(user_id__in=user_ids)
+        ledger_condition &= Q(user_id__in=user_ids)
+    with transaction.atomic():
+        DailyLedger.objects.filter(ledger_condition).delete()
+        entries = aggregate_daily_ledger(row_condition)
+        DailyLedger.objects.bulk_create(entries.values(), batch_size=batch_size)
+    return len(entries)
+
+def rebuild_amount_statistics(user_ids: Optional[Iterable[int]] = None, batch_size: int = 1000) -> int:
+    """
+    Recompute the per-category amount statistics from scratch, optionally limited to some users.
+
+    :param user_ids: IDs of the users to rebuild, None for all users.
+    :param batch_size: Number of statistics rows inserted per query.
+    :return: Number of statistics rows written.
+    """
+    condition = Q() if user_ids is None else Q(user_id__in=list(user_ids))
+    statistics = []
+    with transaction.atomic():
+        AmountStatistics.objects.filter(condition).delete()
+        for model, kind in LEDGER_KINDS.items():
+            rows = model.objects.filter(condition).order_by().values("user_id", "category_id").annotate(
+                count=Count("id"), total=Sum("amount"), mean=Avg("amount"), squares=SUM_OF_SQUARES, minimum=Min("amount"), maximum=Max("amount")
+            )
+            statistics += [AmountStatistics(
+                user_id=row["user_id"], kind=kind, category_id=row["category_id"], count=row["count"], total=row["total"], mean=float(row["mean"]),
+                m2=get_m2(row["count"], row["total"], row["squares"]), minimum=row["minimum"], maximum=row["maximum"])
+                for row in rows.iterator()
+            ]
+        AmountStatistics.objects.bulk_create(statistics, batch_size=batch_size)
+    return len(statistics)
+
+def rebuild_trend_statistics(user_ids: Optional[Iterable[int]] = None, batch_size: int = 1000) -> int:
+    """
+    Recompute the trend sufficient statistics from the daily ledger, optionally limited to some users.
+
+    :param user_ids: IDs of the users to rebuild, None for all users.
+    :param batch_size: Number of statistics rows inserted per query.
+    :return: Number of statistics rows written.
+    """
+    condition = Q() if user_ids is None else Q(user_id__in=list(user_ids))
+    statistics = {}
+    with transaction.atomic():
+        TrendStatistics.objects.filter(condition).delete()
+        for kind in LEDGER_MODELS:
+            days = DailyLedger.objects.filter(condition, **{f"{kind}_count__gt": 0}).order_by().values("user_id", "day").annotate(
+                count=Sum(f"{kind}_count"), total=Sum(f"{kind}_sum")
+            )
+            for row in days.iterator():
+                x, y = row["day"].toordinal() - TREND_ORIGIN, float(row["total"])
+                entry = statistics.setdefault((row["user_id"], kind), TrendStatistics(user_id=row["user_id"], kind=kind))
+                entry.n += row["count"]
+                entry.sum_x += row["count"] * x
+                entry.sum_y += y
+                entry.sum_xy += x * y
+                entry.sum_xx += row["count"] * x * x
+        TrendStatistics.objects.bulk_create(statistics.values(), batch_size=batch_size)
+    return len(statistics)
+
+def rebuild_ledger_rollups(user_ids: Optional[Iterable[int]] = None, batch_size: int = 1000) -> Tuple[int, int, int]:
+    """
+    Recompute the daily ledger, the amount statistics and the trend statistics from scratch.
+
+    Used by the rebuild_daily_ledger command and by code writing rows in bulk, which bypasses
+    the per-row signal handlers. The cached and precomputed forecasts of the rebuilt users are invalidated
+    and their rankings marked stale.
+
+    :param user_ids: IDs of the users to rebuild, None for all users.
+    :param batch_size: Number of rows inserted per query.
+    :return: Number of daily ledger buckets, amount statistics rows and trend statistics rows written.
+    """
+    user_ids = None if user_ids is None else list(user_ids)
+    counts = (
+        rebuild_daily_ledger(user_ids, batch_size=batch_size),
+        rebuild_amount_statistics(user_ids, batch_size),
+        rebuild_trend_statistics(user_ids, batch_size),
+    )
+    invalidate_forecasts(user_ids)
+    mark_rankings_stale(user_ids)
+    return counts
+
+def get_user_amount_statistics(user: User, kind: str, category: Optional[str] = None) -> dict:
+    """
+    Read the all-time amount statistics of a user's expenses or incomes from the per-category accumulators.
+
+    :param user: User object.
+    :param kind: Either 'expense' or 'income'.
+    :param category: Restrict the statistics to a single category name, None for all categories.
+    :return: Dictionary with 'count', 'mean', 'variance', 'std', 'min' and 'max' keys.
+    """
+    rows = AmountStatistics.objects.filter(user=user, kind=kind)
+    if category is not None:
+        rows = rows.filter(category__key=get_category_key(category))
+    rows = list(rows.values_list("count", "mean", "m2", "minimum", "maximum"))
+    statistics = accumulator_statistics(*welford_merge(row[:3] for row in rows))
+    statistics["min"] = min((row[3] for row in rows), default=None)
+    statistics["max"] = max((row[4] for row in rows), default=None)
+    return statistics
+
+def build_category_breakdown(rows: Iterable[Tuple[str, Decimal]]) -> dict:
+    """
+    Turn per-category totals into the amounts and shares displayed by the doughnut charts.
+
+    :param rows: Iterable of (category, total) tuples.
+    :return: Dictionary with 'amount' and 'percentage' keys mapping categories to values.
+    """
+    totals = {category: Decimal(total).quantize(CENT) for category, total in rows}
+    grand_total = sum(totals.values())
+    return {
+        "amount": {category: float(total) for category, total in totals.items()},
+        "percentage": {category: float(total / grand_total) if grand_total else 0.0 for category, total in totals.items()},
+    }
+
+def get_category_breakdown(user_id: int, kind: str) -> dict:
+    """
+    Read the total and share of every category of a user's expenses or incomes from the per-category accumulators.
+
+    :param user_id: ID of the user.
+    :param kind: Either 'expense' or 'income'.
+    :return: Dictionary with 'amount' and 'percentage' keys mapping categories, in alphabetical order, to values.
+    """
+    return build_category_breakdown(
+        AmountStatistics.objects.filter(user_id=user_id, kind=kind).order_by("category__name").values_list("category__name", "total")
+    )
+
+def get_cached_category_breakdown(user_id: int, kind: str) -> dict:
+    """
+    Return the category breakdown of a user's expenses or incomes, cached until the user's data changes.
+    The doughnut chart endpoints and the expense and income pages share the cached value.
+
+    :param user_id: ID of the user.
+    :param kind: Either 'expense' or 'income'.
+    :return: Dictionary with 'amount' and 'percentage' keys mapping categories to values.
+    """
+    return cached_ledger_value(user_id, f"categories:{kind}", lambda: get_category_breakdown(user_id, kind))
+
+def get_window_amount_statistics(user: User, kind: str, start_date: Optional[date] = None, end_date: Optional[date] = None, category: Optional[str] = None) -> dict:
+    """
+    Calculate amount statistics of a user's expenses or incomes in an arbitrary date window by merging
+    the Welford accumulators of the daily ledger buckets within it.
+
+    :param user: User object.
+    :param kind: Either 'expense' or 'income'.
+    :param start_date: Inclusive start of the window, None for no lower bound.
+    :param end_date: Inclusive end of the window, None for no upper bound.
+    :param category: Restrict the statistics to a single category name, None for all categories.
+    :return: Dictionary with 'count', 'mean', 'variance' and 'std' keys.
+    """
+    buckets = DailyLedger.objects.filter(get_window_condition(start_date, end_date, field="day"), user=user, **{f"{kind}_count__gt": 0})
+    if category is not None:
+        buckets = buckets.filter(category__key=get_category_key(category))
+    buckets = buckets.values_list(f"{kind}_count", f"{kind}_sum", f"{kind}_m2")
+    return accumulator_statistics(*welford_merge((count, float(total) / count, m2) for count, total, m2 in buckets))
+
+def get_report_snapshot(user_id: int, start_date: date, end_date: date) -> dict:
+    """
+    Summarize a user's incomes and expenses within a date range from the daily ledger. Buckets are summed per
+    category ID and the category names are looked up once at the end. The IDs of the summarized rows are read
+    from the (user, date) indexes, so the report's line items stay the rows it was created from.
+
+    Amounts are stored as strings, so the snapshot is JSON serializable without losing Decimal precision.
+
+    :param user_id: ID of the user.
+    :param start_date: First day of the range.
+    :param end_date: Last day of the range.
+    :return: Dictionary keyed by 'income' and 'expense', each holding the 'total', the 'count' of entries,
+        the totals per 'categories' and per 'days', and the row IDs ordered by date under 'ids'.
+    """
+    buckets = DailyLedger.objects.filter(user_id=user_id, day__range=(start_date, end_date)).order_by("day", "category").values_list(
+        "day", "category_id", "income_sum", "expense_sum", "income_count", "expense_count"
+    )
+    sums = {kind: {"total": Decimal(0), "count": 0, "categories": {}, "days": {}} for kind in LEDGER_MODELS}
+    for day, category_id, income_sum, expense_sum, income_count, expense_count in buckets:
+        for kind, amount, count in (("income", income_sum, income_count), ("expense", expense_sum, expense_count)):
+            if not count:
+                continue
+            summary = sums[kind]
+            summary["total"] += amount
+            summary["count"] += count
+            summary["categories"][category_id] = summary["categories"].get(category_id, Decimal(0)) + amount
+            summary["days"][day.isoformat()] = summary["days"].get(day.isoformat(), Decimal(0)) + amount
+    names = get_category_names(category_id for summary in sums.values() for category_id in summary["categories"])
+    return {
+        kind: {
+            "total": str(summary["total"].quantize(CENT)),
+            "count": summary["count"],
+            "categories": {
+                name: str(amount.quantize(CENT)) for name, amount in sorted((names[category_id], amount) for category_id, amount in summary["categories"].items())
+            },
+            "days": {day: str(amount.quantize(CENT)) for day, amount in summary["days"].items()},
+            "ids": list(LEDGER_MODELS[kind].objects.filter(user_id=user_id, date__range=(start_date, end_date)).order_by("date", "id").values_list("id", flat=True)),
+        }
+        for kind, summary in sums.items()
+    }
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from ecap_app.benchmarks import BENCHMARKS, DEFAULT_SIZES
+
+
+COLUMNS = ("benchmark", "rows", "variant", "seconds", "queries")
+
+
+class Command(BaseCommand):
+    help = "Run performance benchmarks against throwaway data that is rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all). Available: {', '.join(BENCHMARKS)}.")
+        parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Dataset sizes to benchmark with.")
+
+    def handle(self, *args, **options):
+        names = options["names"] or list(BENCHMARKS)
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(unknown)}")
+        self.stdout.write(f"{'benchmark':<24}{'rows':>10}  {'variant':<16}{'seconds':>10}{'queries':>10}")
+        for name in names:
+            for result in BENCHMARKS[name](sizes=options["sizes"]):
+                self.stdout.write(
+                    f"{result['benchmark']:<24}{result['rows']:>10}  {result['variant']:<16}"
+                    f"{result['seconds']:>10.4f}{result['queries']:>10}"
+                    + "".join(f"  {key}={value:.4f}" if isinstance(value, float) else f"  {key}={value}" for key, value in result.items() if key not in COLUMNS)
+                )
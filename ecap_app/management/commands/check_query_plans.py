@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from ecap_app.query_plans import check_query_plans
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the queries issued by the ledger helpers against throwaway data and fail if any reads a ledger table with a full scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000, help="Number of seeded expenses and incomes.")
+        parser.add_argument("--plans", action="store_true", help="Print the plan of every query, not only of the failing ones.")
+
+    def handle(self, *args, **options):
+        try:
+            results = check_query_plans(rows=options["rows"])
+        except NotImplementedError as error:
+            raise CommandError(error)
+        failures = [result for result in results if result["full_scans"]]
+        for result in results:
+            if options["plans"] or result["full_scans"]:
+                self.stdout.write(f"{result['case']}: {result['sql']}")
+                for step in result["plan"]:
+                    self.stdout.write(f"    {step}")
+        if failures:
+            raise CommandError(f"{len(failures)} of {len(results)} queries scan a whole ledger table: {', '.join(sorted({result['case'] for result in failures}))}")
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} queries checked, no full scans of ledger tables."))
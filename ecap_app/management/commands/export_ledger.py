@@ -0,0 +1,35 @@
+import sys
+from contextlib import nullcontext
+from django.core.management.base import BaseCommand, CommandError
+from ecap_app.exports import EXPORT_DATASETS, EXPORT_FORMATS, get_export_columns, is_parquet_available, iter_csv, iter_export_rows, write_parquet
+
+
+class Command(BaseCommand):
+    help = "Export expenses, incomes or reports as CSV or Parquet, reading rows in chunks so memory use stays flat."
+    # System checks import the URLconf, whose views print to standard output and would corrupt CSV written there.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=list(EXPORT_DATASETS), help="Data to export.")
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="Output format (parquet requires pyarrow).")
+        parser.add_argument("--output", default=None, help="Output file (default: standard output, CSV only).")
+        parser.add_argument("--user", type=int, action="append", dest="user_ids", help="Only export this user ID (repeatable, default: all users).")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Number of rows read from the database at a time.")
+
+    def handle(self, *args, **options):
+        dataset, export_format, output = options["dataset"], options["format"], options["output"]
+        columns = get_export_columns(dataset, include_user=True)
+        rows = iter_export_rows(dataset, options["user_ids"], include_user=True, chunk_size=options["chunk_size"])
+        if export_format == "parquet":
+            if not is_parquet_available():
+                raise CommandError("Parquet export requires pyarrow.")
+            if output is None:
+                raise CommandError("Parquet export requires --output.")
+            count = write_parquet(columns, rows, output, chunk_size=options["chunk_size"])
+            self.stderr.write(self.style.SUCCESS(f"Exported {count} {dataset} rows to {output}."))
+            return
+        with (open(output, "w", newline="", encoding="utf-8") if output else nullcontext(sys.stdout)) as destination:
+            count = -1
+            for count, line in enumerate(iter_csv(columns, rows)):
+                destination.write(line)
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} {dataset} rows to {output or 'standard output'}."))
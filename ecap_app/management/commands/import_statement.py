@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from ecap_app.imports import IMPORT_FORMATS, StatementError, import_statement
+
+
+class Command(BaseCommand):
+    help = "Import expenses and incomes from a CSV or OFX bank statement, skipping transactions that already exist."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Statement file.")
+        parser.add_argument("--user", required=True, help="Username of the owner of the imported transactions.")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, default=None, help="Statement format (default: from the file extension).")
+        parser.add_argument("--kind", choices=("expense", "income"), default=None, help="Kind of all transactions (default: from the amount sign).")
+        parser.add_argument("--date-format", default=None, help="strptime format of CSV dates (default: ISO dates).")
+        parser.add_argument("--delimiter", default=",", help="Column separator of CSV statements.")
+        parser.add_argument("--decimal-separator", choices=(".", ","), default=None, help="Decimal separator of CSV amounts (default: ',' for ';' separated statements, '.' otherwise).")
+        parser.add_argument("--column", action="append", default=[], metavar="FIELD=NAME", help="Map a field to a CSV column name (repeatable).")
+        parser.add_argument("--encoding", default="utf-8", help="Text encoding of the statement.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['user']}")
+        statement_format = options["format"] or ("ofx" if options["path"].lower().endswith((".ofx", ".qfx")) else "csv")
+        parser_options = {"kind": options["kind"]}
+        if statement_format == "csv":
+            parser_options["date_format"] = options["date_format"]
+            parser_options["delimiter"] = options["delimiter"]
+            parser_options["decimal_separator"] = options["decimal_separator"]
+            parser_options["columns"] = dict(mapping.split("=", 1) for mapping in options["column"])
+        try:
+            with open(options["path"], "rb") as statement:
+                stats = import_statement(user, statement, statement_format, encoding=options["encoding"], **parser_options)
+        except (OSError, StatementError, UnicodeDecodeError) as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['expense']} expenses and {stats['income']} incomes, skipped {stats['duplicates']} duplicates."
+        ))
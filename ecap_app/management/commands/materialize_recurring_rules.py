@@ -0,0 +1,15 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from ecap_app.recurring import materialize_due_rules
+
+
+class Command(BaseCommand):
+    help = "Create the Expense and Income rows of all recurring rules due up to a date."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", type=date.fromisoformat, default=None, help="Last date to materialize in YYYY-MM-DD format (default: today).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of rules processed, and rows inserted, per query.")
+
+    def handle(self, *args, **options):
+        rules, rows = materialize_due_rules(until=options["date"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Recurring rules materialized: {rules} rules processed, {rows} rows created."))
@@ -0,0 +1,49 @@
+import time
+import django
+from concurrent.futures import ProcessPoolExecutor
+from django import db
+from django.core.management.base import BaseCommand
+from ecap_app.batch_forecasting import forecast_user_chunk, get_user_row_counts, plan_forecast_chunks, store_forecasts
+from ecap_app.forecast_cache import get_data_versions
+
+
+class Command(BaseCommand):
+    help = "Fit the linear trends of all users in vectorized batches and store their projections in the forecast table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=["expense", "income"], action="append", dest="kinds", help="Only forecast this kind of entries (repeatable, default: both).")
+        parser.add_argument("--user", type=int, action="append", dest="user_ids", help="Only forecast this user ID (repeatable).")
+        parser.add_argument("--horizon", type=int, default=30, help="Number of predicted days stored per user.")
+        parser.add_argument("--workers", type=int, default=1, help="Number of worker processes fitting chunks in parallel.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Maximum number of users fitted together in one stacked system.")
+        parser.add_argument("--max-cells", type=int, default=5_000_000, help="Maximum size of the padded arrays of a chunk.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of forecast rows inserted per query.")
+
+    def handle(self, *args, **options):
+        for kind in options["kinds"] or ["expense", "income"]:
+            row_counts = get_user_row_counts(kind, options["user_ids"])
+            chunks = list(plan_forecast_chunks(row_counts, options["chunk_size"], options["max_cells"]))
+            self.stdout.write(f"{kind}: forecasting {len(row_counts)} users in {len(chunks)} chunks with {options['workers']} worker(s).")
+            start = time.perf_counter()
+            users = forecasts = 0
+            for chunk, results in zip(chunks, self.forecast_chunks(kind, chunks, options["horizon"], options["workers"])):
+                forecasts += store_forecasts(kind, chunk, results, options["batch_size"])
+                users += len(chunk)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{kind}: {users}/{len(row_counts)} users ({users / elapsed if elapsed else 0:.0f} users/s)")
+            self.stdout.write(self.style.SUCCESS(f"{kind}: {forecasts} forecasts written in {time.perf_counter() - start:.2f}s."))
+
+    def forecast_chunks(self, kind, chunks, horizon, workers):
+        """
+        Fit the chunks in order, in this process or in a pool of worker processes.
+        The data versions, which are created on first use, are resolved here before the chunks are dispatched,
+        and results are written by this process only, so workers only read and never contend for database locks.
+        """
+        if workers <= 1:
+            return (forecast_user_chunk(kind, chunk, horizon) for chunk in chunks)
+        versions = [get_data_versions(chunk) for chunk in chunks]
+        db.connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+        results = pool.map(forecast_user_chunk, [kind] * len(chunks), chunks, [horizon] * len(chunks), versions)
+        pool.shutdown(wait=False)
+        return results
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from ecap_app.ledger import rebuild_ledger_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user daily ledger, amount statistics and trend statistics rollups from the Expense and Income tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids", help="Only rebuild the rollups of this user ID (repeatable).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of ledger rows inserted per query.")
+
+    def handle(self, *args, **options):
+        ledger_rows, statistics_rows, trend_rows = rebuild_ledger_rollups(user_ids=options["user_ids"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Daily ledger rebuilt: {ledger_rows} rows written."))
+        self.stdout.write(self.style.SUCCESS(f"Amount statistics rebuilt: {statistics_rows} rows written."))
+        self.stdout.write(self.style.SUCCESS(f"Trend statistics rebuilt: {trend_rows} rows written."))
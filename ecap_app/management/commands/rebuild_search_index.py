@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from ecap_app.search import get_search_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of expense and income descriptions and chat messages."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = rebuild_search_index()
+        if backend == "fts5":
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} documents in the FTS5 table."))
+        else:
+            self.stdout.write(self.style.SUCCESS("FTS5 is not available; in-memory indexes will be rebuilt on the next search of every user."))
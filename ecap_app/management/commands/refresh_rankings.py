@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from ecap_app.rankings import mark_rankings_stale, refresh_rankings
+
+
+class Command(BaseCommand):
+    help = "Recompute the stale rankings of users on savings rate, monthly balance and saving goal progress, then update the global positions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids", help="Only recompute this user ID (repeatable, default: users with stale rankings).")
+        parser.add_argument("--all", action="store_true", help="Recompute the rankings of all users.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of users recomputed, and of rankings written, per query.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options["all"]:
+            mark_rankings_stale(batch_size=options["batch_size"])
+        users, positions = refresh_rankings(options["user_ids"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed the rankings of {users} users, {positions} positions moved, in {time.perf_counter() - start:.2f}s."))
@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from ecap_app.report_jobs import run_pending_report_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued report generation jobs, polling the queue for new ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty instead of polling.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait before polling an empty queue again.")
+        parser.add_argument("--max-jobs", type=int, default=None, help="Exit after running this many jobs.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while options["max_jobs"] is None or total < options["max_jobs"]:
+            count = run_pending_report_jobs(None if options["max_jobs"] is None else options["max_jobs"] - total)
+            total += count
+            if count:
+                self.stdout.write(f"Ran {count} report job(s), {total} in total.")
+            elif options["once"]:
+                break
+            else:
+                time.sleep(options["poll_interval"])
+        self.stdout.write(self.style.SUCCESS(f"Report worker finished: {total} job(s) run."))
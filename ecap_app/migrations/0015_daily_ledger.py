@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_daily_ledger(apps, schema_editor):
+    DailyLedger = apps.get_model("ecap_app", "DailyLedger")
+    entries = {}
+    for model_name, kind in (("Expense", "expense"), ("Income", "income")):
+        rows = apps.get_model("ecap_app", model_name).objects.order_by().values("user_id", "date", "category").annotate(
+            total=models.Sum("amount"), count=models.Count("id")
+        )
+        for row in rows.iterator():
+            key = (row["user_id"], row["date"], row["category"])
+            entry = entries.setdefault(key, DailyLedger(user_id=row["user_id"], day=row["date"], category=row["category"]))
+            setattr(entry, f"{kind}_sum", row["total"])
+            setattr(entry, f"{kind}_count", row["count"])
+    DailyLedger.objects.bulk_create(entries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0014_alter_profile_profile_picture'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(max_length=100)),
+                ('income_sum', models.DecimalField(decimal_places=2, default=0, max_digits=50)),
+                ('expense_sum', models.DecimalField(decimal_places=2, default=0, max_digits=50)),
+                ('income_count', models.PositiveIntegerField(default=0)),
+                ('expense_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'category'), name='unique_daily_ledger')],
+            },
+        ),
+        migrations.RunPython(populate_daily_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_amount_statistics(apps, schema_editor):
+    DailyLedger = apps.get_model("ecap_app", "DailyLedger")
+    AmountStatistics = apps.get_model("ecap_app", "AmountStatistics")
+    ledger_entries, statistics = {}, []
+    for model_name, kind in (("Expense", "expense"), ("Income", "income")):
+        model = apps.get_model("ecap_app", model_name)
+        rows = model.objects.order_by().values("user_id", "date", "category").annotate(
+            total=models.Sum("amount"), count=models.Count("id"), variance=models.Variance("amount")
+        )
+        for row in rows.iterator():
+            key = (row["user_id"], row["date"], row["category"])
+            entry = ledger_entries.setdefault(key, DailyLedger(user_id=row["user_id"], day=row["date"], category=row["category"]))
+            setattr(entry, f"{kind}_sum", row["total"])
+            setattr(entry, f"{kind}_count", row["count"])
+            setattr(entry, f"{kind}_m2", float(row["variance"] or 0) * row["count"])
+        rows = model.objects.order_by().values("user_id", "category").annotate(
+            count=models.Count("id"), mean=models.Avg("amount"), variance=models.Variance("amount"),
+            minimum=models.Min("amount"), maximum=models.Max("amount")
+        )
+        for row in rows.iterator():
+            statistics.append(AmountStatistics(
+                user_id=row["user_id"], kind=kind, category=row["category"], count=row["count"], mean=float(row["mean"]),
+                m2=float(row["variance"] or 0) * row["count"], minimum=row["minimum"], maximum=row["maximum"]
+            ))
+    DailyLedger.objects.all().delete()
+    DailyLedger.objects.bulk_create(ledger_entries.values(), batch_size=1000)
+    AmountStatistics.objects.bulk_create(statistics, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0015_daily_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyledger',
+            name='expense_m2',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyledger',
+            name='income_m2',
+            field=models.FloatField(default=0),
+        ),
+        migrations.CreateModel(
+            name='AmountStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('expense', 'Expense'), ('income', 'Income')], max_length=10)),
+                ('category', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('m2', models.FloatField(default=0)),
+                ('minimum', models.DecimalField(decimal_places=2, max_digits=50, null=True)),
+                ('maximum', models.DecimalField(decimal_places=2, max_digits=50, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='amount_statistics', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'kind', 'category'), name='unique_amount_statistics')],
+            },
+        ),
+        migrations.RunPython(populate_amount_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:47
+
+import django.db.models.deletion
+from django.conf import settings
+from datetime import date
+from django.db import migrations, models
+
+
+def populate_trend_statistics(apps, schema_editor):
+    TrendStatistics = apps.get_model("ecap_app", "TrendStatistics")
+    origin = date(2000, 1, 1).toordinal()
+    statistics = {}
+    for model_name, kind in (("Expense", "expense"), ("Income", "income")):
+        rows = apps.get_model("ecap_app", model_name).objects.order_by().values("user_id", "date").annotate(
+            total=models.Sum("amount"), count=models.Count("id")
+        )
+        for row in rows.iterator():
+            x = row["date"].toordinal() - origin
+            entry = statistics.setdefault((row["user_id"], kind), TrendStatistics(user_id=row["user_id"], kind=kind))
+            entry.n += row["count"]
+            entry.sum_x += row["count"] * x
+            entry.sum_y += float(row["total"])
+            entry.sum_xy += x * float(row["total"])
+            entry.sum_xx += row["count"] * x * x
+    TrendStatistics.objects.bulk_create(statistics.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0016_amount_statistics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('expense', 'Expense'), ('income', 'Income')], max_length=10)),
+                ('n', models.PositiveIntegerField(default=0)),
+                ('sum_x', models.FloatField(default=0)),
+                ('sum_y', models.FloatField(default=0)),
+                ('sum_xy', models.FloatField(default=0)),
+                ('sum_xx', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trend_statistics', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'kind'), name='unique_trend_statistics')],
+            },
+        ),
+        migrations.RunPython(populate_trend_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:57
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def summarize_rows(rows):
+    summary = {"total": Decimal(0), "count": 0, "categories": {}, "days": {}, "ids": []}
+    for row_id, day, category, amount in sorted(rows, key=lambda row: (row[1], row[0])):
+        summary["ids"].append(row_id)
+        summary["total"] += amount
+        summary["count"] += 1
+        summary["categories"][category] = summary["categories"].get(category, Decimal(0)) + amount
+        summary["days"][day.isoformat()] = summary["days"].get(day.isoformat(), Decimal(0)) + amount
+    return {
+        "total": str(summary["total"].quantize(Decimal("0.01"))),
+        "count": summary["count"],
+        "categories": {category: str(amount.quantize(Decimal("0.01"))) for category, amount in sorted(summary["categories"].items())},
+        "days": {day: str(amount.quantize(Decimal("0.01"))) for day, amount in sorted(summary["days"].items())},
+        "ids": summary["ids"],
+    }
+
+def snapshot_linked_rows(apps, schema_editor):
+    Report = apps.get_model("ecap_app", "Report")
+    for report in Report.objects.prefetch_related("expenses", "incomes").iterator(chunk_size=100):
+        report.snapshot = {
+            "income": summarize_rows([(income.id, income.date, income.category, income.amount) for income in report.incomes.all()]),
+            "expense": summarize_rows([(expense.id, expense.date, expense.category, expense.amount) for expense in report.expenses.all()]),
+        }
+        report.save(update_fields=["snapshot"])
+
+def link_snapshot_rows(apps, schema_editor):
+    Report = apps.get_model("ecap_app", "Report")
+    Expense = apps.get_model("ecap_app", "Expense")
+    Income = apps.get_model("ecap_app", "Income")
+    for report in Report.objects.iterator(chunk_size=100):
+        for field, model, kind in (("expenses", Expense, "expense"), ("incomes", Income, "income")):
+            ids = report.snapshot.get(kind, {}).get("ids")
+            if ids is None:
+                rows = model.objects.filter(user_id=report.user_id, date__range=(report.start_date, report.end_date))
+            else:
+                rows = model.objects.filter(id__in=ids)
+            getattr(report, field).set(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0020_ledger_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='snapshot',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(snapshot_linked_rows, link_snapshot_rows),
+        migrations.RemoveField(
+            model_name='report',
+            name='expenses',
+        ),
+        migrations.RemoveField(
+            model_name='report',
+            name='incomes',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:20
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_search_index(apps, schema_editor):
+    # The FTS5 table only exists on SQLite builds with the FTS5 extension, search falls back to an in-memory index elsewhere.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    try:
+        schema_editor.execute("CREATE VIRTUAL TABLE ecap_search USING fts5(body, owners, kind, tokenize = 'unicode61')")
+    except OperationalError:
+        return
+    schema_editor.execute("INSERT INTO ecap_search(rowid, body, owners, kind) SELECT id * 4 + 1, description, 'u' || user_id, 'expense' FROM ecap_app_expense")
+    schema_editor.execute("INSERT INTO ecap_search(rowid, body, owners, kind) SELECT id * 4 + 2, description, 'u' || user_id, 'income' FROM ecap_app_income")
+    schema_editor.execute(
+        "INSERT INTO ecap_search(rowid, body, owners, kind) SELECT m.id * 4 + 3, m.content, 'u' || c.user1_id || ' u' || c.user2_id, 'message' "
+        "FROM ecap_app_message m JOIN ecap_app_chat c ON c.id = m.chat_id"
+    )
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS ecap_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0022_report_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
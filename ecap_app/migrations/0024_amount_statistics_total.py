@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_totals(apps, schema_editor):
+    AmountStatistics = apps.get_model("ecap_app", "AmountStatistics")
+    statistics = {(row.user_id, row.kind, row.category): row for row in AmountStatistics.objects.all()}
+    for kind, model_name in (("expense", "Expense"), ("income", "Income")):
+        rows = apps.get_model("ecap_app", model_name).objects.order_by().values("user_id", "category").annotate(total=Sum("amount"))
+        for row in rows.iterator():
+            if (row["user_id"], kind, row["category"]) in statistics:
+                statistics[row["user_id"], kind, row["category"]].total = row["total"]
+    AmountStatistics.objects.bulk_update(statistics.values(), ["total"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0023_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='amountstatistics',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=50),
+        ),
+        migrations.RunPython(populate_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,256 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+import re
+import django.db.models.deletion
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import migrations, models
+from ecap_app.ledger import SUM_OF_SQUARES, get_m2
+
+
+CATEGORY_MODELS = ("Expense", "Income", "RecurringRule")
+ROLLUP_MODELS = ("DailyLedger", "AmountStatistics")
+WHITESPACE = re.compile(r"\s+")
+
+
+def populate_categories(apps, schema_editor):
+    """
+    Build the category dictionary of every user from the distinct category strings and point the rows at it.
+    Strings differing only in case or whitespace share a category named after their most frequent spelling.
+    The rollups are recomputed, as buckets of merged strings collapse into one.
+    """
+    Category = apps.get_model("ecap_app", "Category")
+    spellings = defaultdict(Counter)
+    raw_names = defaultdict(set)
+    for model_name in CATEGORY_MODELS:
+        rows = apps.get_model("ecap_app", model_name).objects.order_by().values("user_id", "category_name").annotate(count=models.Count("id"))
+        for row in rows.iterator():
+            name = WHITESPACE.sub(" ", row["category_name"]).strip()[:100]
+            spellings[row["user_id"], name.casefold()][name] += row["count"]
+            raw_names[model_name].add((row["user_id"], row["category_name"]))
+    Category.objects.bulk_create([
+        Category(user_id=user_id, key=key, name=counter.most_common(1)[0][0]) for (user_id, key), counter in spellings.items()
+    ], batch_size=1000)
+    ids = {(category.user_id, category.key): category.id for category in Category.objects.all()}
+    for model_name in CATEGORY_MODELS:
+        model = apps.get_model("ecap_app", model_name)
+        for user_id, raw_name in raw_names[model_name]:
+            key = WHITESPACE.sub(" ", raw_name).strip()[:100].casefold()
+            model.objects.filter(user_id=user_id, category_name=raw_name).update(category_id=ids[user_id, key])
+    rebuild_rollups(apps)
+
+def rebuild_rollups(apps):
+    """
+    Recompute the daily ledger and amount statistics per category, with the sums of squares
+    the ledger's rebuild helpers use instead of the Variance aggregate, which SQLite computes in Python.
+    """
+    DailyLedger = apps.get_model("ecap_app", "DailyLedger")
+    AmountStatistics = apps.get_model("ecap_app", "AmountStatistics")
+    ledger_entries, statistics = {}, []
+    for model_name, kind in (("Expense", "expense"), ("Income", "income")):
+        model = apps.get_model("ecap_app", model_name)
+        rows = model.objects.order_by().values("user_id", "date", "category_id").annotate(
+            total=models.Sum("amount"), count=models.Count("id"), squares=SUM_OF_SQUARES
+        )
+        for row in rows.iterator():
+            key = (row["user_id"], row["date"], row["category_id"])
+            entry = ledger_entries.setdefault(key, DailyLedger(user_id=row["user_id"], day=row["date"], category_id=row["category_id"], category_name=""))
+            setattr(entry, f"{kind}_sum", row["total"])
+            setattr(entry, f"{kind}_count", row["count"])
+            setattr(entry, f"{kind}_m2", get_m2(row["count"], row["total"], row["squares"]))
+        rows = model.objects.order_by().values("user_id", "category_id").annotate(
+            count=models.Count("id"), total=models.Sum("amount"), mean=models.Avg("amount"), squares=SUM_OF_SQUARES,
+            minimum=models.Min("amount"), maximum=models.Max("amount")
+        )
+        for row in rows.iterator():
+            statistics.append(AmountStatistics(
+                user_id=row["user_id"], kind=kind, category_id=row["category_id"], category_name="", count=row["count"], total=row["total"],
+                mean=float(row["mean"]), m2=get_m2(row["count"], row["total"], row["squares"]),
+                minimum=row["minimum"], maximum=row["maximum"]
+            ))
+    DailyLedger.objects.all().delete()
+    AmountStatistics.objects.all().delete()
+    DailyLedger.objects.bulk_create(ledger_entries.values(), batch_size=1000)
+    AmountStatistics.objects.bulk_create(statistics, batch_size=1000)
+
+def restore_category_names(apps, schema_editor):
+    Category = apps.get_model("ecap_app", "Category")
+    for category_id, name in Category.objects.values_list("id", "name").iterator():
+        for model_name in CATEGORY_MODELS + ROLLUP_MODELS:
+            apps.get_model("ecap_app", model_name).objects.filter(category_id=category_id).update(category_name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0024_amount_statistics_total'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=100)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='categories', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='unique_category')],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expense_user_category_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='income',
+            name='income_user_category_idx',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailyledger',
+            name='unique_daily_ledger',
+        ),
+        migrations.RemoveConstraint(
+            model_name='amountstatistics',
+            name='unique_amount_statistics',
+        ),
+        migrations.RenameField(
+            model_name='expense',
+            old_name='category',
+            new_name='category_name',
+        ),
+        migrations.RenameField(
+            model_name='income',
+            old_name='category',
+            new_name='category_name',
+        ),
+        migrations.RenameField(
+            model_name='recurringrule',
+            old_name='category',
+            new_name='category_name',
+        ),
+        migrations.RenameField(
+            model_name='dailyledger',
+            old_name='category',
+            new_name='category_name',
+        ),
+        migrations.RenameField(
+            model_name='amountstatistics',
+            old_name='category',
+            new_name='category_name',
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecap_app.category'),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecap_app.category'),
+        ),
+        migrations.AddField(
+            model_name='recurringrule',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecap_app.category'),
+        ),
+        migrations.AddField(
+            model_name='dailyledger',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecap_app.category'),
+        ),
+        migrations.AddField(
+            model_name='amountstatistics',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecap_app.category'),
+        ),
+        migrations.RunPython(populate_categories, restore_category_names),
+        migrations.AlterField(
+            model_name='expense',
+            name='category_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='income',
+            name='category_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='recurringrule',
+            name='category_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='dailyledger',
+            name='category_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='amountstatistics',
+            name='category_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RemoveField(
+            model_name='expense',
+            name='category_name',
+        ),
+        migrations.RemoveField(
+            model_name='income',
+            name='category_name',
+        ),
+        migrations.RemoveField(
+            model_name='recurringrule',
+            name='category_name',
+        ),
+        migrations.RemoveField(
+            model_name='dailyledger',
+            name='category_name',
+        ),
+        migrations.RemoveField(
+            model_name='amountstatistics',
+            name='category_name',
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='expenses', to='ecap_app.category'),
+        ),
+        migrations.AlterField(
+            model_name='income',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='incomes', to='ecap_app.category'),
+        ),
+        migrations.AlterField(
+            model_name='recurringrule',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='recurring_rules', to='ecap_app.category'),
+        ),
+        migrations.AlterField(
+            model_name='dailyledger',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecap_app.category'),
+        ),
+        migrations.AlterField(
+            model_name='amountstatistics',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecap_app.category'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['user', 'category'], name='expense_user_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['user', 'category'], name='income_user_category_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyledger',
+            constraint=models.UniqueConstraint(fields=('user', 'day', 'category'), name='unique_daily_ledger'),
+        ),
+        migrations.AddConstraint(
+            model_name='amountstatistics',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'category'), name='unique_amount_statistics'),
+        ),
+    ]
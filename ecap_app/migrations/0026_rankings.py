@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_stale_rankings(apps, schema_editor):
+    Ranking = apps.get_model("ecap_app", "Ranking")
+    user_ids = apps.get_model(*settings.AUTH_USER_MODEL.split(".")).objects.values_list("id", flat=True)
+    Ranking.objects.bulk_create(
+        (Ranking(user_id=user_id, metric=metric, stale=True) for user_id in user_ids.iterator() for metric in ("savings_rate", "monthly_balance", "goal_progress")),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0025_category'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ranking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('savings_rate', 'Savings rate'), ('monthly_balance', 'Monthly balance'), ('goal_progress', 'Goal progress')], max_length=20)),
+                ('score', models.FloatField(null=True)),
+                ('top_percent', models.FloatField(null=True)),
+                ('stale', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['metric', 'score'], name='ranking_metric_score_idx'), models.Index(condition=models.Q(('stale', True)), fields=['user'], name='ranking_stale_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'metric'), name='unique_ranking')],
+            },
+        ),
+        migrations.RunPython(create_stale_rankings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0027_message_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='bio',
+            field=models.TextField(default=''),
+            preserve_default=False,
+        ),
+    ]
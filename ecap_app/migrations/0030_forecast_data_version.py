@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0029_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forecast',
+            name='data_version',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def add_snapshot_ids(apps, schema_editor):
+    Report = apps.get_model("ecap_app", "Report")
+    Expense = apps.get_model("ecap_app", "Expense")
+    Income = apps.get_model("ecap_app", "Income")
+    for report in Report.objects.iterator(chunk_size=100):
+        if all("ids" in report.snapshot.get(kind, {}) for kind in ("expense", "income")):
+            continue
+        for model, kind in ((Expense, "expense"), (Income, "income")):
+            rows = model.objects.filter(user_id=report.user_id, date__range=(report.start_date, report.end_date)).order_by("date", "id")
+            report.snapshot.setdefault(kind, {})["ids"] = list(rows.values_list("id", flat=True))
+        report.save(update_fields=["snapshot"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecap_app', '0030_forecast_data_version'),
+    ]
+
+    # The IDs are kept when migrating backwards, 0021 relinks reports to their rows from them.
+    operations = [
+        migrations.RunPython(add_snapshot_ids, migrations.RunPython.noop),
+    ]
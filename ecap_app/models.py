@@ -1,5 +1,6 @@
 import uuid
 import os
+from decimal import Decimal
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.db import models
@@ -12,12 +13,32 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.name}: {self.price}"
 
+class Category(models.Model):
+    user = models.ForeignKey(User, related_name="categories", on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_category"),
+        ]
+
+    def __str__(self):
+        return self.name
+
 class Expense(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=1)
     date = models.DateField()
     amount = models.DecimalField(max_digits=50, decimal_places=2)
     description = models.TextField(blank=True)
-    category = models.CharField(max_length=100)
+    category = models.ForeignKey(Category, related_name="expenses", on_delete=models.RESTRICT)
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "date"], name="expense_user_date_idx"),
+            models.Index(fields=["user", "category"], name="expense_user_category_idx"),
+            models.Index(fields=["user", "amount"], name="expense_user_amount_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user}: {self.amount}"
     
@@ -25,11 +46,143 @@ class Income(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=1)
     date = models.DateField()
     amount = models.DecimalField(max_digits=50, decimal_places=2)
-    category = models.CharField(max_length=100)
+    category = models.ForeignKey(Category, related_name="incomes", on_delete=models.RESTRICT)
     description = models.TextField(blank=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "date"], name="income_user_date_idx"),
+            models.Index(fields=["user", "category"], name="income_user_category_idx"),
+            models.Index(fields=["user", "amount"], name="income_user_amount_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user}: {self.category} - {self.amount} ({self.date}) (descrp: {self.description})"
 
+class DailyLedger(models.Model):
+    user = models.ForeignKey(User, related_name="daily_ledger", on_delete=models.CASCADE)
+    day = models.DateField()
+    category = models.ForeignKey(Category, related_name="+", on_delete=models.CASCADE)
+    income_sum = models.DecimalField(max_digits=50, decimal_places=2, default=0)
+    expense_sum = models.DecimalField(max_digits=50, decimal_places=2, default=0)
+    income_count = models.PositiveIntegerField(default=0)
+    expense_count = models.PositiveIntegerField(default=0)
+    income_m2 = models.FloatField(default=0)
+    expense_m2 = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "day", "category"], name="unique_daily_ledger"),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.day} {self.category} (+{self.income_sum} / -{self.expense_sum})"
+
+class AmountStatistics(models.Model):
+    user = models.ForeignKey(User, related_name="amount_statistics", on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=[("expense", "Expense"), ("income", "Income")])
+    category = models.ForeignKey(Category, related_name="+", on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=50, decimal_places=2, default=0)
+    mean = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)
+    minimum = models.DecimalField(max_digits=50, decimal_places=2, null=True)
+    maximum = models.DecimalField(max_digits=50, decimal_places=2, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "kind", "category"], name="unique_amount_statistics"),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.kind} {self.category} (n={self.count}, mean={self.mean})"
+
+class TrendStatistics(models.Model):
+    user = models.ForeignKey(User, related_name="trend_statistics", on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=[("expense", "Expense"), ("income", "Income")])
+    n = models.PositiveIntegerField(default=0)
+    sum_x = models.FloatField(default=0)
+    sum_y = models.FloatField(default=0)
+    sum_xy = models.FloatField(default=0)
+    sum_xx = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "kind"], name="unique_trend_statistics"),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.kind} trend (n={self.n})"
+
+class Ranking(models.Model):
+    METRICS = [("savings_rate", "Savings rate"), ("monthly_balance", "Monthly balance"), ("goal_progress", "Goal progress")]
+
+    user = models.ForeignKey(User, related_name="rankings", on_delete=models.CASCADE)
+    metric = models.CharField(max_length=20, choices=METRICS)
+    score = models.FloatField(null=True)
+    top_percent = models.FloatField(null=True)
+    stale = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "metric"], name="unique_ranking"),
+        ]
+        indexes = [
+            models.Index(fields=["metric", "score"], name="ranking_metric_score_idx"),
+            models.Index(fields=["user"], condition=models.Q(stale=True), name="ranking_stale_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.metric} {self.score} (top {self.top_percent}%)"
+
+class Forecast(models.Model):
+    user = models.ForeignKey(User, related_name="forecasts", on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=[("expense", "Expense"), ("income", "Income")])
+    model = models.CharField(max_length=20, default="linear")
+    start_date = models.DateField()
+    amounts = models.JSONField(default=list)
+    data_version = models.BigIntegerField(null=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "kind", "model"], name="unique_forecast"),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.kind} {self.model} forecast from {self.start_date} ({len(self.amounts)} days)"
+
+class DataVersion(models.Model):
+    user = models.ForeignKey(User, related_name="data_versions", on_delete=models.CASCADE)
+    name = models.CharField(max_length=20)
+    version = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "name"], name="unique_data_version"),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.name} data version {self.version}"
+
+class RecurringRule(models.Model):
+    CADENCES = [("weekly", "Weekly"), ("monthly", "Monthly"), ("yearly", "Yearly")]
+
+    user = models.ForeignKey(User, related_name="recurring_rules", on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=[("expense", "Expense"), ("income", "Income")])
+    amount = models.DecimalField(max_digits=50, decimal_places=2)
+    category = models.ForeignKey(Category, related_name="recurring_rules", on_delete=models.RESTRICT)
+    description = models.TextField(blank=True)
+    cadence = models.CharField(max_length=10, choices=CADENCES, default="monthly")
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    next_run = models.DateField(db_index=True)
+    occurrences = models.PositiveIntegerField(default=0)
+    active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.user}: {self.cadence} {self.kind} {self.amount} ({self.category}) next on {self.next_run}"
+
 class SavingGoal(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=1)
     name = models.CharField(max_length=100)
@@ -51,26 +204,49 @@ class Report(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=1)
     start_date = models.DateField()
     end_date = models.DateField()
-    expenses = models.ManyToManyField(Expense, blank=True)
-    incomes = models.ManyToManyField(Income, blank=True)
     total_expenses = models.DecimalField(max_digits=50, decimal_places=2, default=0)
     total_incomes = models.DecimalField(max_digits=50, decimal_places=2, default=0)
     total_balance = models.DecimalField(max_digits=50, decimal_places=2, default=0)
+    snapshot = models.JSONField(default=dict)
     
     def __str__(self):
         return f"Report for {self.user.username} from {self.start_date} to {self.end_date}"
     
     def calculate_totals(self):
-        self.total_expenses = self.expenses.annotate(total_cost=models.F("amount")).aggregate(total=models.Sum("total_cost"))["total"] or 0
-        self.total_incomes = self.incomes.aggregate(total=models.Sum("amount"))["total"] or 0
+        self.total_expenses = Decimal(self.snapshot["expense"]["total"])
+        self.total_incomes = Decimal(self.snapshot["income"]["total"])
         self.total_balance = self.total_incomes - self.total_expenses
-        
-    def populate_expenses_and_incomes(self):
-        self.expenses.set(Expense.objects.filter(user=self.user, date__range=[self.start_date, self.end_date]))
-        self.incomes.set(Income.objects.filter(user=self.user, date__range=[self.start_date, self.end_date]))
-        self.calculate_totals()
 
     
+class ReportJob(models.Model):
+    STATUSES = [("pending", "Pending"), ("running", "Running"), ("done", "Done"), ("failed", "Failed")]
+
+    user = models.ForeignKey(User, related_name="report_jobs", on_delete=models.CASCADE)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUSES, default="pending")
+    report = models.ForeignKey(Report, related_name="jobs", null=True, blank=True, on_delete=models.SET_NULL)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "start_date", "end_date"],
+                condition=models.Q(status__in=["pending", "running"]),
+                name="unique_in_flight_report_job",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["status", "id"], name="report_job_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"Report job {self.id} for {self.user} from {self.start_date} to {self.end_date} ({self.status})"
+
 class Chat(models.Model):
     user1 = models.ForeignKey(User, related_name="conversations_started", on_delete=models.CASCADE)
     user2 = models.ForeignKey(User, related_name="conversations_joined", on_delete=models.CASCADE)
@@ -96,6 +272,11 @@ class Message(models.Model):
     sender = models.ForeignKey(User, related_name="sent_messages", on_delete=models.CASCADE)
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["chat", "timestamp", "id"], name="message_chat_timestamp_idx"),
+        ]
     
     def __str__(self):
         return f"Message from {self.sender} in chat {self.chat.id} at {self.timestamp}"
@@ -0,0 +1,69 @@
+import math
+from typing import Iterable, Tuple
+
+
+Accumulator = Tuple[int, float, float]
+EMPTY_ACCUMULATOR = (0, 0.0, 0.0)
+
+
+def welford_add(count: int, mean: float, m2: float, value: float) -> Accumulator:
+    """
+    Add a value to a Welford accumulator.
+
+    :param count: Number of accumulated values.
+    :param mean: Mean of the accumulated values.
+    :param m2: Sum of squared deviations from the mean.
+    :param value: Value to add.
+    :return: Updated (count, mean, m2) accumulator.
+    """
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return count, mean, m2
+
+def welford_remove(count: int, mean: float, m2: float, value: float) -> Accumulator:
+    """
+    Remove a previously added value from a Welford accumulator.
+
+    :param count: Number of accumulated values.
+    :param mean: Mean of the accumulated values.
+    :param m2: Sum of squared deviations from the mean.
+    :param value: Value to remove.
+    :return: Updated (count, mean, m2) accumulator.
+    """
+    if count <= 1:
+        return EMPTY_ACCUMULATOR
+    previous_mean = (count * mean - value) / (count - 1)
+    m2 -= (value - previous_mean) * (value - mean)
+    return count - 1, previous_mean, max(m2, 0.0)
+
+def welford_merge(accumulators: Iterable[Accumulator]) -> Accumulator:
+    """
+    Merge several Welford accumulators using Chan's parallel algorithm.
+
+    :param accumulators: Iterable of (count, mean, m2) accumulators.
+    :return: Accumulator equivalent to having added all values to a single one.
+    """
+    count, mean, m2 = EMPTY_ACCUMULATOR
+    for other_count, other_mean, other_m2 in accumulators:
+        if not other_count:
+            continue
+        total = count + other_count
+        delta = other_mean - mean
+        mean += delta * other_count / total
+        m2 += other_m2 + delta * delta * count * other_count / total
+        count = total
+    return count, mean, m2
+
+def accumulator_statistics(count: int, mean: float, m2: float) -> dict:
+    """
+    Derive the population statistics of a Welford accumulator.
+
+    :param count: Number of accumulated values.
+    :param mean: Mean of the accumulated values.
+    :param m2: Sum of squared deviations from the mean.
+    :return: Dictionary with 'count', 'mean', 'variance' and 'std' keys.
+    """
+    variance = m2 / count if count else 0.0
+    return {"count": count, "mean": mean, "variance": variance, "std": math.sqrt(variance)}
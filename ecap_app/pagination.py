@@ -0,0 +1,85 @@
+from typing import Any, List, Optional, Tuple
+from django.db.models import QuerySet
+from django.http import HttpRequest
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def get_page_params(request: HttpRequest, default_limit: int = DEFAULT_PAGE_SIZE, max_limit: int = MAX_PAGE_SIZE) -> Tuple[Optional[int], int]:
+    """
+    Read the keyset pagination parameters of a request.
+
+    :param request: HTTP request with optional 'cursor' and 'limit' query parameters.
+    :param default_limit: Page size used when no limit is given.
+    :param max_limit: Largest accepted page size.
+    :return: Tuple of the cursor (None for the first page) and the page size.
+    :raises ValueError: If the cursor or limit is not a positive integer.
+    """
+    cursor = request.GET.get("cursor")
+    cursor = int(cursor) if cursor else None
+    if cursor is not None and cursor < 1:
+        raise ValueError("cursor and limit must be positive integers")
+    return cursor, get_page_limit(request, default_limit, max_limit)
+
+def get_page_limit(request: HttpRequest, default_limit: int = DEFAULT_PAGE_SIZE, max_limit: int = MAX_PAGE_SIZE) -> int:
+    """
+    Read the page size of a request paginated with an opaque cursor.
+
+    :param request: HTTP request with an optional 'limit' query parameter.
+    :param default_limit: Page size used when no limit is given.
+    :param max_limit: Largest accepted page size.
+    :return: Page size.
+    :raises ValueError: If the limit is not a positive integer.
+    """
+    limit = int(request.GET.get("limit", default_limit))
+    if limit < 1:
+        raise ValueError("cursor and limit must be positive integers")
+    return min(limit, max_limit)
+
+def paginate_by_id(queryset: QuerySet, cursor: Optional[int], limit: int, descending: bool = True) -> Tuple[List, Optional[int]]:
+    """
+    Fetch one page of a queryset using the primary key as the keyset, so every page costs
+    a single index range scan regardless of how deep it is.
+
+    :param queryset: Queryset to paginate.
+    :param cursor: Primary key of the last item of the previous page, None for the first page.
+    :param limit: Page size.
+    :param descending: Whether to list the newest items first.
+    :return: Tuple of the page items and the cursor of the next page, None on the last page.
+    """
+    if cursor is not None:
+        queryset = queryset.filter(pk__lt=cursor) if descending else queryset.filter(pk__gt=cursor)
+    items = list(queryset.order_by("-pk" if descending else "pk")[:limit + 1])
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    return items, last["id"] if isinstance(last, dict) else last.pk
+
+def paginate_by_keyset(queryset: QuerySet, field: str, cursor: Optional[Tuple[Any, int]], limit: int, descending: bool = True) -> Tuple[List, Optional[Tuple[Any, int]]]:
+    """
+    Fetch one page of a queryset ordered by a field, using the field and the primary key as the keyset.
+    With an index on the field, every page costs a single index range scan regardless of how deep it is.
+
+    :param queryset: Queryset to paginate.
+    :param field: Name of the ordering field.
+    :param cursor: Field value and primary key of the last item of the previous page, None for the first page.
+    :param limit: Page size.
+    :param descending: Whether to order from the largest value.
+    :return: Tuple of the page items and the cursor of the next page, None on the last page.
+    """
+    if cursor is not None:
+        value, pk = cursor
+        if descending:
+            queryset = queryset.filter(**{f"{field}__lte": value}).exclude(**{field: value, "pk__gte": pk})
+        else:
+            queryset = queryset.filter(**{f"{field}__gte": value}).exclude(**{field: value, "pk__lte": pk})
+    ordering = (f"-{field}", "-pk") if descending else (field, "pk")
+    items = list(queryset.order_by(*ordering)[:limit + 1])
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    return items, (last[field], last["id"]) if isinstance(last, dict) else (getattr(last, field), last.pk)
@@ -0,0 +1,120 @@
+import re
+from datetime import date
+from typing import Callable, Dict, List
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from .models import Expense, Income
+from . import utils
+from .benchmarks import Rollback, seed_ledger
+from .comparison import get_friend_comparison
+from .ledger import rebuild_ledger_rollups
+from .rankings import get_user_rankings
+
+
+LEDGER_TABLES = ("ecap_app_expense", "ecap_app_income", "ecap_app_dailyledger", "ecap_app_amountstatistics", "ecap_app_trendstatistics")
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+TABLE_ALIAS = re.compile(r'"(\w+)" (U\d+)\b')
+
+QUERY_PLAN_CASES: Dict[str, Callable[[User], object]] = {
+    "calculate_total_user_balance": utils.calculate_total_user_balance,
+    "calculate_user_balance_from_date": lambda user: utils.calculate_user_balance_from_date(user, "2020-01-01"),
+    "calculate_user_balance_to_date": lambda user: utils.calculate_user_balance_to_date(user, "2020-01-01"),
+    "get_user_expense_aggregates": utils.get_user_expense_aggregates,
+    "get_user_income_aggregates_window": lambda user: utils.get_user_income_aggregates(user, date(2018, 1, 1), date(2019, 12, 31)),
+    "get_user_expense_std": utils.get_user_expense_std,
+    "get_user_expense_categories": utils.get_user_expense_categories,
+    "get_user_income_categories": utils.get_user_income_categories,
+    "get_user_expenses_by_date": utils.get_user_expenses_by_date,
+    "get_user_daily_amounts": lambda user: utils.get_user_daily_amounts(user, "income"),
+    "extrapolate_user_expenses": utils.extrapolate_user_expenses,
+    "extrapolate_user_income_seasonal": lambda user: utils.extrapolate_user_income(user, 10, "seasonal"),
+    "get_monthly_expense_report": utils.get_monthly_expense_report,
+    "calculate_user_balance_over_time": utils.calculate_user_balance_over_time,
+    "calculate_monthly_balance": utils.calculate_monthly_balance,
+    "get_expense_slope": utils.get_expense_slope,
+    "get_user_expense_snapshot_data": utils.get_user_expense_snapshot_data,
+    "create_report_for_user": lambda user: utils.create_report_for_user(user, date(2018, 1, 1), date(2018, 12, 31)),
+    "get_friend_comparison": get_friend_comparison,
+    "get_user_rankings": get_user_rankings,
+}
+
+
+def explain(sql: str) -> List[str]:
+    """
+    Ask SQLite for the plan of a query.
+
+    :param sql: Query with its parameters inlined, as captured by CaptureQueriesContext.
+    :return: List of plan step descriptions.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cursor.fetchall()]
+
+def find_full_scans(sql: str, plan: List[str], tables=LEDGER_TABLES) -> List[str]:
+    """
+    Find the steps of a query plan reading a whole ledger table without an index.
+
+    Subqueries name their tables by Django's aliases (U0, U1, ...), which are resolved from the SQL.
+
+    :param sql: Explained query.
+    :param plan: List of plan step descriptions.
+    :param tables: Names of the tables that must only be accessed through an index.
+    :return: List of offending steps.
+    """
+    aliases = {alias: table for table, alias in TABLE_ALIAS.findall(sql)}
+    return [step for step in plan if (match := FULL_SCAN.match(step)) and aliases.get(match.group(1), match.group(1)) in tables]
+
+def seed_query_plan_user(rows: int = 1000) -> User:
+    """
+    Create a user with seeded expenses, incomes and rollups to run the query-plan cases against.
+
+    :param rows: Number of seeded expenses and incomes.
+    :return: Seeded user.
+    """
+    user = User.objects.create(username=f"query-plans-{rows}")
+    seed_ledger(user, Expense, rows)
+    seed_ledger(user, Income, rows, seed=1)
+    rebuild_ledger_rollups([user.id])
+    return user
+
+def explain_case(name: str, case: Callable[[User], object], user: User) -> List[dict]:
+    """
+    Run a query-plan case and EXPLAIN every SELECT it issued.
+
+    :param name: Name of the case.
+    :param case: Function receiving the seeded user.
+    :param user: Seeded user.
+    :return: One result row per captured query, with the case name, SQL, plan and offending steps.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        case(user)
+    results = []
+    for query in queries.captured_queries:
+        if not query["sql"].lstrip().upper().startswith(("SELECT", "WITH")):
+            continue
+        plan = explain(query["sql"])
+        results.append({"case": name, "sql": query["sql"], "plan": plan, "full_scans": find_full_scans(query["sql"], plan)})
+    return results
+
+def check_query_plans(cases: Dict[str, Callable[[User], object]] = QUERY_PLAN_CASES, rows: int = 1000) -> List[dict]:
+    """
+    Run every query-plan case against a throwaway user, EXPLAIN each query it issued and report full scans
+    of the ledger tables. All writes are rolled back afterwards. The same checks run as part of the test suite.
+
+    :param cases: Mapping of case names to functions receiving the seeded user.
+    :param rows: Number of seeded expenses and incomes.
+    :return: One result row per captured query, with the case name, SQL, plan and offending steps.
+    """
+    if connection.vendor != "sqlite":
+        raise NotImplementedError("Query plans can only be checked on SQLite.")
+    results = []
+    try:
+        with transaction.atomic():
+            user = seed_query_plan_user(rows)
+            for name, case in cases.items():
+                results.extend(explain_case(name, case, user))
+            raise Rollback
+    except Rollback:
+        pass
+    return results
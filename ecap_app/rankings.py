@@ -0,0 +1,158 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q, Sum
+from .models import AmountStatistics, Ranking
+from .friend_graph import get_friend_ids
+from .user_metrics import get_monthly_averages, get_saving_goal_progress
+
+
+RANKING_METRICS = tuple(metric for metric, _ in Ranking.METRICS)
+METRIC_LABELS = dict(Ranking.METRICS)
+
+
+def mark_rankings_stale(user_ids: Optional[Iterable[int]] = None, batch_size: int = 1000) -> None:
+    """
+    Flag the rankings of users whose ledger or saving goals changed, so that the next refresh_rankings recomputes them.
+    Users who are not ranked yet get stale placeholder rankings. Every mark also moves updated_at, which tells
+    a refresh running concurrently that the rankings were marked again after it read them.
+
+    :param user_ids: IDs of the users, None for all users.
+    :param batch_size: Number of rankings written per query.
+    """
+    if user_ids is None:
+        user_ids = User.objects.values_list("id", flat=True).iterator()
+    Ranking.objects.bulk_create(
+        [Ranking(user_id=user_id, metric=metric, stale=True) for user_id in user_ids for metric in RANKING_METRICS],
+        batch_size=batch_size, update_conflicts=True, unique_fields=["user", "metric"], update_fields=["stale", "updated_at"],
+    )
+
+def compute_ranking_scores(user_ids: List[int]) -> Dict[int, Dict[str, Optional[float]]]:
+    """
+    Compute the ranked metrics of several users from the ledger rollups and saving goals, with one GROUP BY query per metric:
+
+    - 'savings_rate': share of the all-time income that was not spent, in percent, from the per-category totals;
+    - 'monthly_balance': average monthly income minus average monthly expense, from the daily ledger;
+    - 'goal_progress': average progress of the saving goals, in percent.
+
+    :param user_ids: IDs of the users.
+    :return: Mapping of user ID to the score of every metric, None where a metric does not apply to the user.
+    """
+    totals = {
+        (row["user_id"], row["kind"]): row["total"]
+        for row in AmountStatistics.objects.filter(user_id__in=user_ids).order_by().values("user_id", "kind").annotate(total=Sum("total"))
+    }
+    monthly = get_monthly_averages(user_ids)
+    progress = get_saving_goal_progress(user_ids, default=None)
+    scores = {}
+    for user_id in user_ids:
+        income, expense = Decimal(totals.get((user_id, "income"), 0)), Decimal(totals.get((user_id, "expense"), 0))
+        has_rows = (user_id, "income") in totals or (user_id, "expense") in totals
+        scores[user_id] = {
+            "savings_rate": float(100 * (income - expense) / income) if income > 0 else None,
+            "monthly_balance": float(monthly[user_id]["income"] - monthly[user_id]["expense"]) if has_rows else None,
+            "goal_progress": progress[user_id],
+        }
+    return scores
+
+def rank_metric(metric: str, batch_size: int = 1000) -> int:
+    """
+    Recompute the global 'top percent' position of every user on a metric by walking the (metric, score) index
+    from the best score. Users sharing a score share a position, and only changed positions are written.
+    Users without a score, such as users without saving goals, lose their position.
+
+    :param metric: One of RANKING_METRICS.
+    :param batch_size: Number of rankings updated per query.
+    :return: Number of updated rankings.
+    """
+    cleared = Ranking.objects.filter(metric=metric, score__isnull=True, top_percent__isnull=False).update(top_percent=None)
+    rows = Ranking.objects.filter(metric=metric, score__isnull=False).order_by("-score")
+    total = rows.count()
+    changed, rank, previous = [], 0, None
+    for position, (ranking_id, score, top_percent) in enumerate(rows.values_list("id", "score", "top_percent").iterator(chunk_size=10000), start=1):
+        if score != previous:
+            rank, previous = position, score
+        percent = round(100 * rank / total, 2)
+        if percent != top_percent:
+            changed.append(Ranking(id=ranking_id, top_percent=percent))
+    Ranking.objects.bulk_update(changed, ["top_percent"], batch_size=batch_size)
+    return cleared + len(changed)
+
+def clear_stale_rankings(marked: List[Tuple[int, datetime]]) -> int:
+    """
+    Clear the stale flag of rankings that were not marked stale again since they were read.
+
+    :param marked: List of (ranking ID, updated_at) tuples of stale rankings, read before their scores were computed.
+    :return: Number of cleared rankings.
+    """
+    if not marked:
+        return 0
+    condition = Q()
+    for ranking_id, updated_at in marked:
+        condition |= Q(id=ranking_id, updated_at=updated_at)
+    return Ranking.objects.filter(condition, stale=True).update(stale=False)
+
+def refresh_rankings(user_ids: Optional[Iterable[int]] = None, batch_size: int = 1000) -> Tuple[int, int]:
+    """
+    Recompute the scores of stale rankings, or of the given users, in batches, then update the global positions.
+
+    Only the users whose data changed since the last refresh are recomputed, so a periodic refresh reads
+    the rollups of the active users only. Positions are rewritten only where they moved. A ranking marked stale
+    again while its scores were computed keeps its flag, so the change is picked up by the next refresh.
+
+    :param user_ids: IDs of the users to recompute, None for the users with stale rankings.
+    :param batch_size: Number of users recomputed, and of rankings written, per query.
+    :return: Number of recomputed users and number of updated positions.
+    """
+    if user_ids is None:
+        user_ids = Ranking.objects.filter(stale=True).order_by("user_id").values_list("user_id", flat=True).distinct()
+    user_ids = list(user_ids)
+    with transaction.atomic():
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            marked = list(Ranking.objects.filter(user_id__in=batch, stale=True).values_list("id", "updated_at"))
+            scores = compute_ranking_scores(batch)
+            clear_stale_rankings(marked)
+            Ranking.objects.bulk_create(
+                [
+                    Ranking(user_id=user_id, metric=metric, score=score, stale=False)
+                    for user_id, metrics in scores.items() for metric, score in metrics.items()
+                ],
+                batch_size=batch_size, update_conflicts=True, unique_fields=["user", "metric"],
+                update_fields=["score", "updated_at"],
+            )
+        positions = sum(rank_metric(metric, batch_size) for metric in RANKING_METRICS) if user_ids else 0
+    return len(user_ids), positions
+
+def get_user_rankings(user: User, friend_ids: Optional[List[int]] = None) -> Dict[str, dict]:
+    """
+    Read a user's stored rankings and place them among their friends.
+
+    The global position is read from the precomputed ranking, the position among friends is derived
+    from the stored scores of the friends, so neither needs any totals to be computed.
+
+    :param user: User object.
+    :param friend_ids: IDs of the user's accepted friends, looked up if None.
+    :return: Mapping of every metric to a dictionary with its 'label', the user's 'score', the global 'top_percent',
+        and the 'friends_rank' out of 'friends_total' ranked users including the user. Values are None while the user is not ranked.
+    """
+    if friend_ids is None:
+        friend_ids = get_friend_ids(user.id)
+    own = {metric: (score, top_percent) for metric, score, top_percent in Ranking.objects.filter(user=user).values_list("metric", "score", "top_percent")}
+    friend_scores = {metric: [] for metric in RANKING_METRICS}
+    for metric, score in Ranking.objects.filter(user_id__in=friend_ids, score__isnull=False).values_list("metric", "score"):
+        friend_scores[metric].append(score)
+    rankings = {}
+    for metric in RANKING_METRICS:
+        score, top_percent = own.get(metric, (None, None))
+        ranked = score is not None
+        rankings[metric] = {
+            "label": METRIC_LABELS[metric],
+            "score": score,
+            "top_percent": top_percent,
+            "friends_rank": 1 + sum(other > score for other in friend_scores[metric]) if ranked else None,
+            "friends_total": 1 + len(friend_scores[metric]) if ranked else None,
+        }
+    return rankings
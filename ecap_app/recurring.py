@@ -0,0 +1,123 @@
+import calendar
+import pandas as pd
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import List, Optional, Tuple
+from django.contrib.auth.models import User
+from django.db import transaction
+from .models import Category, RecurringRule
+from .ledger import LEDGER_MODELS, rebuild_ledger_rollups
+from .search import index_ledger_rows
+
+
+CADENCE_GAPS = {"weekly": (6, 8), "monthly": (27, 32), "yearly": (360, 370)}
+
+
+def get_occurrence(start_date: date, cadence: str, index: int) -> date:
+    """
+    Calculate the date of the n-th occurrence of a recurring rule.
+
+    Monthly and yearly occurrences keep the day of the start date, clipped to the length of shorter months,
+    so a rule starting on the 31st falls on the last day of every month.
+
+    :param start_date: Date of the first occurrence.
+    :param cadence: One of 'weekly', 'monthly' or 'yearly'.
+    :param index: Number of the occurrence, 0 for the first one.
+    :return: Date of the occurrence.
+    """
+    if cadence == "weekly":
+        return start_date + timedelta(weeks=index)
+    months = start_date.year * 12 + start_date.month - 1 + index * (12 if cadence == "yearly" else 1)
+    year, month = divmod(months, 12)
+    return date(year, month + 1, min(start_date.day, calendar.monthrange(year, month + 1)[1]))
+
+def materialize_rule(rule: RecurringRule, until: date) -> list:
+    """
+    Create the unsaved Expense or Income rows of all occurrences of a rule due up to a date and advance the rule past them.
+
+    :param rule: Recurring rule, modified in place.
+    :param until: Last date to materialize.
+    :return: List of unsaved Expense or Income objects.
+    """
+    model = LEDGER_MODELS[rule.kind]
+    rows = []
+    while rule.active and rule.next_run <= until:
+        if rule.end_date and rule.next_run > rule.end_date:
+            rule.active = False
+            break
+        rows.append(model(user_id=rule.user_id, date=rule.next_run, amount=rule.amount, category_id=rule.category_id, description=rule.description))
+        rule.occurrences += 1
+        rule.next_run = get_occurrence(rule.start_date, rule.cadence, rule.occurrences)
+    return rows
+
+def materialize_due_rules(until: Optional[date] = None, batch_size: int = 1000) -> Tuple[int, int]:
+    """
+    Materialize the Expense and Income rows of all active recurring rules due up to a date.
+
+    Rules are processed in batches. The rows of a batch are inserted with bulk_create and the rules advanced
+    with bulk_update in one transaction, so an interrupted run never materializes an occurrence twice.
+    Since bulk writes bypass the ledger signals, the created rows are indexed for search and the rollups
+    of the batch's users rebuilt in the same transaction, so the rollups never miss committed rows.
+
+    :param until: Last date to materialize, today if None.
+    :param batch_size: Number of rules processed, and rows inserted, per query.
+    :return: Number of processed rules and number of created rows.
+    """
+    until = until or date.today()
+    due_rules = RecurringRule.objects.filter(active=True, next_run__lte=until).order_by("id")
+    rules_count = rows_count = 0
+    last_id = 0
+    while True:
+        rules = list(due_rules.filter(id__gt=last_id)[:batch_size])
+        if not rules:
+            break
+        with transaction.atomic():
+            rows = [row for rule in rules for row in materialize_rule(rule, until)]
+            for kind, model in LEDGER_MODELS.items():
+                index_ledger_rows(kind, model.objects.bulk_create([row for row in rows if isinstance(row, model)], batch_size=batch_size))
+            RecurringRule.objects.bulk_update(rules, ["next_run", "occurrences", "active"], batch_size=batch_size)
+            if rows:
+                rebuild_ledger_rollups({row.user_id for row in rows})
+        rules_count, rows_count, last_id = rules_count + len(rules), rows_count + len(rows), rules[-1].id
+    return rules_count, rows_count
+
+def detect_recurring_rules(user: User, kind: str, min_occurrences: int = 3) -> List[RecurringRule]:
+    """
+    Propose recurring rules from a user's history by grouping their entries on category and amount
+    and keeping the groups repeating at a regular weekly, monthly or yearly interval.
+
+    Groups already covered by an active rule are skipped.
+
+    :param user: User object.
+    :param kind: Either 'expense' or 'income'.
+    :param min_occurrences: Minimum number of entries of a group.
+    :return: List of unsaved RecurringRule proposals starting with the first occurrence after the latest entry.
+    """
+    rows = LEDGER_MODELS[kind].objects.filter(user=user).order_by("date").values_list("date", "amount", "category_id", "description")
+    history = pd.DataFrame(list(rows), columns=["date", "amount", "category", "description"])
+    if history.empty:
+        return []
+    history["day"] = history["date"].map(date.toordinal)
+    history["gap"] = history.groupby(["category", "amount"])["day"].diff()
+    groups = history.groupby(["category", "amount"]).agg(
+        count=("day", "size"), start_date=("date", "first"), last_date=("date", "last"),
+        gap=("gap", "median"), min_gap=("gap", "min"), max_gap=("gap", "max"),
+        description=("description", lambda descriptions: descriptions.mode().iloc[0]),
+    ).reset_index()
+    groups = groups[groups["count"] >= min_occurrences]
+    existing = set(RecurringRule.objects.filter(user=user, kind=kind, active=True).values_list("category_id", "amount"))
+    categories = Category.objects.in_bulk(groups["category"].tolist())
+    proposals = []
+    for group in groups.itertuples(index=False):
+        cadence = next((cadence for cadence, (low, high) in CADENCE_GAPS.items() if low <= group.min_gap and group.max_gap <= high), None)
+        if cadence is None or (group.category, Decimal(group.amount)) in existing:
+            continue
+        index = max(int((group.last_date - group.start_date).days // group.gap) - 1, 0)
+        while get_occurrence(group.start_date, cadence, index) <= group.last_date:
+            index += 1
+        next_run = get_occurrence(group.start_date, cadence, index)
+        proposals.append(RecurringRule(
+            user=user, kind=kind, amount=group.amount, category=categories[group.category], description=group.description,
+            cadence=cadence, start_date=next_run, next_run=next_run,
+        ))
+    return proposals
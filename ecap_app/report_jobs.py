@@ -0,0 +1,106 @@
+import traceback
+from datetime import date, timedelta
+from typing import Optional, Tuple
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import ReportJob
+from .utils import create_report_for_user
+
+
+IN_FLIGHT = ("pending", "running")
+REPORT_JOB_LEASE = getattr(settings, "REPORT_JOB_LEASE", 10 * 60)
+REPORT_JOB_MAX_ATTEMPTS = getattr(settings, "REPORT_JOB_MAX_ATTEMPTS", 3)
+
+
+def release_expired_report_jobs() -> Tuple[int, int]:
+    """
+    Recover the jobs of workers that died while running them. A running job whose lease of REPORT_JOB_LEASE seconds
+    expired is queued again, or failed once it was claimed REPORT_JOB_MAX_ATTEMPTS times, so a job crashing every
+    worker cannot block the queue. Otherwise the in-flight constraint would keep handing the dead job out forever.
+
+    :return: Number of requeued jobs and number of failed jobs.
+    """
+    now = timezone.now()
+    expired = ReportJob.objects.filter(status="running", started_at__lt=now - timedelta(seconds=REPORT_JOB_LEASE))
+    failed = expired.filter(attempts__gte=REPORT_JOB_MAX_ATTEMPTS).update(
+        status="failed", error=f"The job did not finish within {REPORT_JOB_LEASE} seconds in {REPORT_JOB_MAX_ATTEMPTS} attempts.", finished_at=now
+    )
+    return expired.update(status="pending", started_at=None), failed
+
+
+def enqueue_report_job(user: User, start_date: date, end_date: date) -> ReportJob:
+    """
+    Queue the generation of a report, reusing the job of an identical request that is still pending or running.
+
+    :param user: Owner of the report.
+    :param start_date: First day of the report.
+    :param end_date: Last day of the report.
+    :return: The new or the in-flight ReportJob.
+    """
+    release_expired_report_jobs()
+    in_flight = ReportJob.objects.filter(user=user, start_date=start_date, end_date=end_date, status__in=IN_FLIGHT)
+    job = in_flight.first()
+    if job is not None:
+        return job
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(user=user, start_date=start_date, end_date=end_date)
+    except IntegrityError:
+        # An identical request queued its job in the meantime.
+        return in_flight.get()
+
+def claim_report_job() -> Optional[ReportJob]:
+    """
+    Mark the oldest pending job as running. Jobs are claimed with a conditional update,
+    so several workers can poll the same queue without running a job twice. Jobs whose lease
+    expired are released first, see release_expired_report_jobs.
+
+    :return: The claimed job, None if the queue is empty.
+    """
+    release_expired_report_jobs()
+    while True:
+        job_id = ReportJob.objects.filter(status="pending").order_by("id").values_list("id", flat=True).first()
+        if job_id is None:
+            return None
+        if ReportJob.objects.filter(id=job_id, status="pending").update(status="running", started_at=timezone.now(), attempts=F("attempts") + 1):
+            return ReportJob.objects.get(id=job_id)
+
+def run_report_job(job: ReportJob) -> ReportJob:
+    """
+    Generate the report of a claimed job and record the outcome on the job.
+
+    The outcome is only recorded if the job was not released in the meantime because its lease expired,
+    so a worker that was merely slow cannot overwrite the state of a job another worker claimed since.
+
+    :param job: Job in the running state.
+    :return: The finished job.
+    """
+    try:
+        job.report = create_report_for_user(job.user, job.start_date, job.end_date)
+        job.status = "done"
+    except Exception:
+        job.status, job.error = "failed", traceback.format_exc()
+    job.finished_at = timezone.now()
+    ReportJob.objects.filter(id=job.id, status="running", started_at=job.started_at).update(
+        report=job.report, status=job.status, error=job.error, finished_at=job.finished_at
+    )
+    return job
+
+def run_pending_report_jobs(max_jobs: Optional[int] = None) -> int:
+    """
+    Run queued jobs until the queue is empty.
+
+    :param max_jobs: Maximum number of jobs to run, None for no limit.
+    :return: Number of jobs run.
+    """
+    count = 0
+    while max_jobs is None or count < max_jobs:
+        job = claim_report_job()
+        if job is None:
+            break
+        run_report_job(job)
+        count += 1
+    return count
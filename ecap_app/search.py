@@ -0,0 +1,372 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from .models import Chat, Expense, Income, Message
+from .categories import resolve_category_names
+from .data_versions import bump_versions, get_version
+
+
+SEARCH_TABLE = "ecap_search"
+SEARCH_BACKEND = getattr(settings, "SEARCH_BACKEND", "auto")
+SEARCH_KINDS = {"expense": 1, "income": 2, "message": 3}
+KIND_NAMES = {code: kind for kind, code in SEARCH_KINDS.items()}
+# FTS5 rows are keyed by rowid, which encodes both the kind and the ID of the indexed object.
+ROWID_STRIDE = 4
+TOKEN = re.compile(r"\w+")
+BM25_K1 = 1.2
+BM25_B = 0.75
+SEARCH_VERSION = "search"
+
+local_indexes: Dict[int, Tuple[int, "InvertedIndex"]] = {}
+local_indexes_lock = threading.Lock()
+fts5_available: Optional[bool] = None
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a text into lowercase word tokens, like the unicode61 tokenizer of FTS5.
+
+    :param text: Text to tokenize.
+    :return: List of tokens.
+    """
+    return TOKEN.findall((text or "").lower())
+
+def get_rowid(kind: str, object_id: int) -> int:
+    """
+    Encode the kind and ID of an indexed object as the rowid of its FTS5 row.
+    """
+    return object_id * ROWID_STRIDE + SEARCH_KINDS[kind]
+
+def split_rowid(rowid: int) -> Tuple[str, int]:
+    """
+    Decode the kind and ID of an indexed object from the rowid of its FTS5 row.
+    """
+    return KIND_NAMES[rowid % ROWID_STRIDE], rowid // ROWID_STRIDE
+
+def is_fts5_available() -> bool:
+    """
+    Check whether the database has the FTS5 search table, which the search migration only creates
+    on SQLite builds that include the FTS5 extension. The outcome is remembered for the lifetime
+    of the process, so the table list is read once instead of on every search.
+    """
+    global fts5_available
+    if fts5_available is None:
+        fts5_available = connection.vendor == "sqlite" and SEARCH_TABLE in connection.introspection.table_names()
+    return fts5_available
+
+def get_search_backend() -> str:
+    """
+    Return the search backend in use, either 'fts5' or 'python'.
+
+    The SEARCH_BACKEND setting selects a backend explicitly, and 'auto' picks FTS5 when it is available.
+    """
+    if SEARCH_BACKEND == "auto":
+        return "fts5" if is_fts5_available() else "python"
+    return SEARCH_BACKEND
+
+def get_message_owners(chat_id: int) -> List[int]:
+    """
+    Return the IDs of the participants of a chat, who are the owners of its messages.
+
+    :param chat_id: ID of the chat.
+    :return: List of user IDs, empty if the chat no longer exists.
+    """
+    return list(Chat.objects.filter(id=chat_id).values_list("user1_id", "user2_id").first() or ())
+
+def get_user_documents(user_id: int) -> Iterable[Tuple[str, int, str]]:
+    """
+    Read the searchable texts of a user: the descriptions of their expenses and incomes and the messages of their chats.
+
+    :param user_id: ID of the user.
+    :return: Iterator over (kind, object ID, text) tuples.
+    """
+    for kind, model in (("expense", Expense), ("income", Income)):
+        for object_id, text in model.objects.filter(user_id=user_id).values_list("id", "description").iterator(chunk_size=10000):
+            yield kind, object_id, text
+    messages = Message.objects.filter(Q(chat__user1_id=user_id) | Q(chat__user2_id=user_id)).values_list("id", "content")
+    for object_id, text in messages.iterator(chunk_size=10000):
+        yield "message", object_id, text
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index ranking documents with BM25, used when FTS5 is not available.
+    Documents are keyed by (kind, object ID) tuples.
+    """
+    def __init__(self):
+        self.postings: Dict[str, Dict[tuple, int]] = defaultdict(dict)
+        self.lengths: Dict[tuple, int] = {}
+        self.tokens: Dict[tuple, Tuple[str, ...]] = {}
+        self.total_length = 0
+
+    def add(self, key: tuple, text: str) -> None:
+        self.remove(key)
+        tokens = tokenize(text)
+        frequencies = Counter(tokens)
+        for token, frequency in frequencies.items():
+            self.postings[token][key] = frequency
+        self.tokens[key] = tuple(frequencies)
+        self.lengths[key] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, key: tuple) -> None:
+        if key not in self.lengths:
+            return
+        self.total_length -= self.lengths.pop(key)
+        for token in self.tokens.pop(key):
+            del self.postings[token][key]
+            if not self.postings[token]:
+                del self.postings[token]
+
+    def search(self, query: str, kinds: Optional[Sequence[str]] = None) -> List[Tuple[tuple, float]]:
+        """
+        Find the documents containing every term of a query, the last term also matching as a prefix.
+
+        :param query: Search query.
+        :param kinds: Kinds of documents to search, None for all kinds.
+        :return: List of (key, score) tuples, best match first.
+        """
+        terms = tokenize(query)
+        if not terms or not self.lengths:
+            return []
+        average_length = self.total_length / len(self.lengths) or 1
+        scores, matches = defaultdict(float), None
+        for position, term in enumerate(terms):
+            tokens = [term] if position < len(terms) - 1 else [token for token in self.postings if token.startswith(term)]
+            term_matches = set()
+            for token in tokens:
+                documents = self.postings.get(token, {})
+                idf = math.log(1 + (len(self.lengths) - len(documents) + 0.5) / (len(documents) + 0.5))
+                for key, frequency in documents.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[key] / average_length)
+                    scores[key] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    term_matches.add(key)
+            matches = term_matches if matches is None else matches & term_matches
+        if kinds is not None:
+            matches = {key for key in matches if key[0] in kinds}
+        return sorted(((key, scores[key]) for key in matches), key=lambda match: (-match[1], match[0]))
+
+
+def get_search_version(user_id: int) -> int:
+    """
+    Return the version of a user's searchable texts, stored in the database so that every process reads the same value.
+
+    :param user_id: ID of the user.
+    :return: Search version.
+    """
+    return get_version(user_id, SEARCH_VERSION)
+
+def bump_search_version(user_id: int) -> int:
+    """
+    Mark the in-memory indexes of a user held by other processes as stale.
+
+    :param user_id: ID of the user whose searchable texts changed.
+    :return: New search version.
+    """
+    bump_versions(SEARCH_VERSION, [user_id])
+    return get_search_version(user_id)
+
+def get_local_index(user_id: int) -> InvertedIndex:
+    """
+    Return the in-memory index of a user, building it from the database if this process has none
+    or if another process changed the user's texts since it was built.
+
+    :param user_id: ID of the user.
+    :return: Inverted index over the user's texts.
+    """
+    version = get_search_version(user_id)
+    with local_indexes_lock:
+        entry = local_indexes.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    index = InvertedIndex()
+    for kind, object_id, text in get_user_documents(user_id):
+        index.add((kind, object_id), text)
+    with local_indexes_lock:
+        local_indexes[user_id] = (version, index)
+    return index
+
+def build_match_query(query: str, user_id: int, kinds: Optional[Sequence[str]] = None) -> Optional[str]:
+    """
+    Build the FTS5 MATCH expression of a search. Every term and kind is quoted so user input cannot
+    inject FTS5 syntax, and the last term also matches as a prefix.
+
+    :param query: Search query.
+    :param user_id: ID of the searching user.
+    :param kinds: Kinds of documents to search, None for all kinds.
+    :return: MATCH expression, None if the query has no terms.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return None
+    body = " ".join(f'"{term}"' for term in terms) + "*"
+    expression = f"owners:u{user_id} AND body:({body})"
+    if kinds is not None:
+        expression += " AND kind:(" + " OR ".join(f'"{kind}"' for kind in kinds) + ")"
+    return expression
+
+def search_fts5(user_id: int, query: str, kinds: Optional[Sequence[str]], offset: int, limit: int) -> List[Tuple[tuple, float]]:
+    """
+    Run a ranked search on the FTS5 table.
+
+    :return: List of ((kind, object ID), score) tuples, best match first.
+    """
+    expression = build_match_query(query, user_id, kinds)
+    if expression is None:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, bm25({SEARCH_TABLE}, 1.0, 0.0, 0.0) AS score FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s ORDER BY score, rowid LIMIT %s OFFSET %s",
+            [expression, limit, offset]
+        )
+        return [(split_rowid(rowid), -score) for rowid, score in cursor.fetchall()]
+
+def index_documents(documents: Iterable[Tuple[str, int, Sequence[int], str]], replace: bool = True) -> None:
+    """
+    Add or replace documents in the search index.
+
+    :param documents: Iterable of (kind, object ID, owner user IDs, text) tuples.
+    :param replace: Whether the documents may already be indexed, False for newly created objects.
+    """
+    documents = list(documents)
+    if get_search_backend() == "fts5":
+        with connection.cursor() as cursor:
+            if replace:
+                cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(get_rowid(kind, object_id),) for kind, object_id, _, _ in documents])
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE}(rowid, body, owners, kind) VALUES (%s, %s, %s, %s)",
+                [(get_rowid(kind, object_id), text, " ".join(f"u{owner}" for owner in owners), kind) for kind, object_id, owners, text in documents]
+            )
+        return
+    owners_documents = defaultdict(list)
+    for kind, object_id, owners, text in documents:
+        for owner in owners:
+            owners_documents[owner].append(((kind, object_id), text))
+    remove_local_documents([(kind, object_id) for kind, object_id, _, _ in documents])
+    for owner, owner_documents in owners_documents.items():
+        update_local_index(owner, lambda index: [index.add(key, text) for key, text in owner_documents])
+
+def remove_documents(keys: Iterable[Tuple[str, int]], owners: Iterable[int] = ()) -> None:
+    """
+    Remove documents from the search index.
+
+    :param keys: Iterable of (kind, object ID) tuples.
+    :param owners: IDs of the users owning the documents, whose indexes in other processes become stale.
+    """
+    keys = list(keys)
+    if get_search_backend() == "fts5":
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(get_rowid(kind, object_id),) for kind, object_id in keys])
+        return
+    remove_local_documents(keys)
+    for owner in owners:
+        update_local_index(owner, lambda index: None)
+
+def remove_local_documents(keys: List[Tuple[str, int]]) -> None:
+    """
+    Remove documents from every in-memory index of this process.
+    """
+    with local_indexes_lock:
+        for _, index in local_indexes.values():
+            for key in keys:
+                index.remove(key)
+
+def update_local_index(user_id: int, update) -> None:
+    """
+    Apply a change to the in-memory index of a user, if this process has an up-to-date one,
+    and bump the user's search version so other processes rebuild theirs.
+
+    :param user_id: ID of the user.
+    :param update: Function receiving the InvertedIndex to update.
+    """
+    previous = get_search_version(user_id)
+    version = bump_search_version(user_id)
+    with local_indexes_lock:
+        entry = local_indexes.get(user_id)
+        if entry is None or entry[0] != previous:
+            local_indexes.pop(user_id, None)
+            return
+        update(entry[1])
+        local_indexes[user_id] = (version, entry[1])
+
+def index_ledger_rows(kind: str, rows: Iterable) -> None:
+    """
+    Index Expense or Income objects written with bulk_create, which bypasses the search signals.
+
+    :param kind: Either 'expense' or 'income'.
+    :param rows: Saved Expense or Income objects.
+    """
+    index_documents(((kind, row.pk, (row.user_id,), row.description) for row in rows), replace=False)
+
+def search(user_id: int, query: str, kinds: Optional[Sequence[str]] = None, offset: int = 0, limit: int = 50) -> Tuple[List[dict], bool]:
+    """
+    Search a user's expense and income descriptions and chat messages, best match first.
+
+    :param user_id: ID of the searching user.
+    :param query: Search query, every term must match and the last term also matches as a prefix.
+    :param kinds: Kinds of documents to search ('expense', 'income', 'message'), None for all kinds.
+    :param offset: Number of results to skip.
+    :param limit: Maximum number of results.
+    :return: Tuple of the result dictionaries and whether more results follow.
+    """
+    if get_search_backend() == "fts5":
+        matches = search_fts5(user_id, query, kinds, offset, limit + 1)
+    else:
+        matches = get_local_index(user_id).search(query, kinds)[offset:offset + limit + 1]
+    return load_search_results(user_id, matches[:limit]), len(matches) > limit
+
+def load_search_results(user_id: int, matches: List[Tuple[tuple, float]]) -> List[dict]:
+    """
+    Load the objects of ranked search matches with one query per kind.
+    Objects the user no longer owns, which a stale index may still return, are left out.
+
+    :param user_id: ID of the searching user.
+    :param matches: List of ((kind, object ID), score) tuples.
+    :return: List of result dictionaries in the order of the matches.
+    """
+    ids = defaultdict(list)
+    for (kind, object_id), _ in matches:
+        ids[kind].append(object_id)
+    objects = {}
+    for kind, model in (("expense", Expense), ("income", Income)):
+        rows = model.objects.filter(user_id=user_id, id__in=ids[kind]).values("id", "date", "amount", "category", "description")
+        for row in resolve_category_names(list(rows)):
+            objects[kind, row["id"]] = {**row, "text": row["description"]}
+    if ids["message"]:
+        messages = Message.objects.filter(Q(chat__user1_id=user_id) | Q(chat__user2_id=user_id), id__in=ids["message"]).values("id", "chat_id", "sender__username", "content", "timestamp")
+        for row in messages:
+            objects["message", row["id"]] = {**row, "text": row["content"]}
+    return [{"kind": key[0], "score": round(score, 4), **objects[key]} for key, score in matches if key in objects]
+
+def rebuild_search_index() -> int:
+    """
+    Rebuild the FTS5 table from the Expense, Income and Message tables with set-based SQL,
+    or drop the in-memory indexes of this process and every user's index version when FTS5 is not available.
+
+    :return: Number of indexed documents, 0 for the in-memory backend, whose indexes are rebuilt lazily.
+    """
+    if get_search_backend() != "fts5":
+        with local_indexes_lock:
+            local_indexes.clear()
+        bump_versions(SEARCH_VERSION)
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        for kind, model in (("expense", Expense), ("income", Income)):
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE}(rowid, body, owners, kind) "
+                f"SELECT id * {ROWID_STRIDE} + {SEARCH_KINDS[kind]}, description, 'u' || user_id, '{kind}' FROM {model._meta.db_table}"
+            )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, body, owners, kind) "
+            f"SELECT m.id * {ROWID_STRIDE} + {SEARCH_KINDS['message']}, m.content, 'u' || c.user1_id || ' u' || c.user2_id, 'message' "
+            f"FROM {Message._meta.db_table} m JOIN {Chat._meta.db_table} c ON c.id = m.chat_id"
+        )
+        cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
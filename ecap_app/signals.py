@@ -0,0 +1,111 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Expense, Friend, Income, Message, SavingGoal
+from .chat_broker import publish_chat_message
+from .ledger import LEDGER_KINDS, update_ledger_rollups
+from .forecast_cache import invalidate_forecasts
+from .friend_graph import invalidate_friend_graph
+from .rankings import mark_rankings_stale
+from .search import get_message_owners, index_documents, remove_documents
+
+
+@receiver(pre_save, sender=Expense)
+@receiver(pre_save, sender=Income)
+def remember_previous_ledger_row(sender, instance, raw=False, **kwargs):
+    """
+    Store the database state of a modified Expense or Income row on the instance,
+    so that the rollups it previously belonged to can be updated after saving.
+    """
+    instance._ledger_previous = None
+    if instance.pk and not raw:
+        instance._ledger_previous = sender.objects.filter(pk=instance.pk).values("user_id", "date", "category_id", "amount").first()
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+def update_daily_ledger_on_save(sender, instance, raw=False, **kwargs):
+    """
+    Move a created or modified Expense or Income row into its daily ledger bucket and amount statistics,
+    invalidate the cached forecasts of its owner and mark their rankings stale.
+    """
+    if raw:
+        return
+    kind = LEDGER_KINDS[sender]
+    previous = getattr(instance, "_ledger_previous", None)
+    if previous:
+        update_ledger_rollups(previous["user_id"], previous["date"], previous["category_id"], kind, previous["amount"], removed=True)
+        if previous["user_id"] != instance.user_id:
+            invalidate_forecasts([previous["user_id"]])
+            mark_rankings_stale([previous["user_id"]])
+    update_ledger_rollups(instance.user_id, instance.date, instance.category_id, kind, instance.amount)
+    invalidate_forecasts([instance.user_id])
+    mark_rankings_stale([instance.user_id])
+    instance._ledger_previous = None
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+def update_daily_ledger_on_delete(sender, instance, **kwargs):
+    """
+    Remove a deleted Expense or Income row from its daily ledger bucket and amount statistics,
+    invalidate the cached forecasts of its owner and mark their rankings stale.
+    """
+    update_ledger_rollups(instance.user_id, instance.date, instance.category_id, LEDGER_KINDS[sender], instance.amount, removed=True)
+    invalidate_forecasts([instance.user_id])
+    mark_rankings_stale([instance.user_id])
+
+@receiver(post_save, sender=SavingGoal)
+@receiver(post_delete, sender=SavingGoal)
+def mark_rankings_stale_on_saving_goal_change(sender, instance, raw=False, **kwargs):
+    """
+    Mark the rankings of the owner of a created, modified or deleted saving goal stale.
+    """
+    if not raw:
+        mark_rankings_stale([instance.user_id])
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def invalidate_friend_graph_on_change(sender, instance, **kwargs):
+    """
+    Drop the cached friend adjacencies of both users of a sent, accepted, rejected or deleted friend request.
+    """
+    invalidate_friend_graph([instance.user_id, instance.friend_id])
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+def index_ledger_row_on_save(sender, instance, raw=False, **kwargs):
+    """
+    Index the description of a created or modified Expense or Income row for search.
+    """
+    if not raw:
+        index_documents([(LEDGER_KINDS[sender], instance.pk, (instance.user_id,), instance.description)])
+
+@receiver(post_save, sender=Message)
+def index_message_on_save(sender, instance, raw=False, **kwargs):
+    """
+    Index a created or modified chat message for search, owned by both participants of its chat.
+    """
+    if not raw:
+        index_documents([("message", instance.pk, get_message_owners(instance.chat_id), instance.content)])
+
+@receiver(post_save, sender=Message)
+def publish_message_on_create(sender, instance, created, raw=False, **kwargs):
+    """
+    Push a new chat message to the WebSocket connections of its chat once it is committed.
+    """
+    if created and not raw:
+        transaction.on_commit(lambda: publish_chat_message(instance))
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+def unindex_ledger_row_on_delete(sender, instance, **kwargs):
+    """
+    Remove a deleted Expense or Income row from the search index.
+    """
+    remove_documents([(LEDGER_KINDS[sender], instance.pk)], (instance.user_id,))
+
+@receiver(post_delete, sender=Message)
+def unindex_message_on_delete(sender, instance, **kwargs):
+    """
+    Remove a deleted chat message from the search index.
+    """
+    remove_documents([("message", instance.pk)], get_message_owners(instance.chat_id))
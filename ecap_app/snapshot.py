@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Optional, Tuple
+from django.contrib.auth.models import User
+from .categories import get_category_names
+
+
+SNAPSHOT_DTYPE = np.dtype([
+    ("date", np.int64),
+    ("cents", np.int64),
+    ("category", np.int64),
+])
+
+
+def load_ledger_snapshot(user: User, model) -> np.ndarray:
+    """
+    Read all Expense or Income rows of a user in a single query into a columnar structured array.
+
+    Dates are stored as ordinals, amounts as integer cents and categories as their IDs, so that every statistic
+    can be derived with vectorized NumPy operations without losing Decimal precision.
+
+    :param user: User object.
+    :param model: Expense or Income model class.
+    :return: Structured array with 'date', 'cents' and 'category' columns, ordered by id.
+    """
+    rows = model.objects.filter(user=user).order_by("id").values_list("date", "amount", "category_id")
+    return np.array(
+        [(day.toordinal(), int(amount * 100), category_id) for day, amount, category_id in rows],
+        dtype=SNAPSHOT_DTYPE
+    )
+
+def cents_to_decimal(cents: int) -> Decimal:
+    """
+    Convert an amount in cents to a Decimal with two decimal places.
+
+    :param cents: Amount in cents.
+    :return: Decimal amount.
+    """
+    return Decimal(int(cents)).scaleb(-2)
+
+def ordinal_to_string(ordinal: int) -> str:
+    """
+    Format a date ordinal as a 'YYYY-MM-DD' string.
+
+    :param ordinal: Date ordinal.
+    :return: Formatted date.
+    """
+    return date.fromordinal(int(ordinal)).strftime("%Y-%m-%d")
+
+def get_snapshot_total(snapshot: np.ndarray) -> Decimal:
+    """
+    Calculate the total amount of a snapshot.
+
+    :param snapshot: Ledger snapshot.
+    :return: Total amount.
+    """
+    return cents_to_decimal(snapshot["cents"].sum())
+
+def get_snapshot_aggregates(snapshot: np.ndarray, today: str) -> dict:
+    """
+    Calculate the minimum, maximum and average amount of a snapshot together with the date of the
+    minimal, maximal and closest-to-average row, matching the output of get_user_expense_aggregates.
+
+    :param snapshot: Ledger snapshot.
+    :param today: Date reported when the snapshot is empty.
+    :return: Dictionary with 'min', 'max' and 'avg' keys holding (amount, date) tuples.
+    """
+    if not len(snapshot):
+        return {"min": (0, today), "max": (0, today), "avg": (0, today)}
+    cents = snapshot["cents"]
+    average = cents_to_decimal(cents.sum()) / len(cents)
+    rows = {
+        "min": np.argmin(cents),
+        "max": np.argmax(cents),
+        "avg": np.argmin(np.abs(cents - float(average) * 100)),
+    }
+    amounts = {"min": cents_to_decimal(cents.min()), "max": cents_to_decimal(cents.max()), "avg": average}
+    return {name: (round(amounts[name], 3), ordinal_to_string(snapshot["date"][row])) for name, row in rows.items()}
+
+def get_snapshot_std(snapshot: np.ndarray) -> float:
+    """
+    Calculate the standard deviation of the amounts of a snapshot.
+
+    :param snapshot: Ledger snapshot.
+    :return: Standard deviation, 0 if the snapshot is empty.
+    """
+    if not len(snapshot):
+        return 0
+    return float(np.std(snapshot["cents"] / 100))
+
+def get_snapshot_categories(snapshot: np.ndarray) -> dict:
+    """
+    Calculate the total amount and share of each category of a snapshot, matching the output of get_categories.
+
+    :param snapshot: Ledger snapshot.
+    :return: Dictionary with 'amount' and 'percentage' keys mapping categories to values.
+    """
+    category_ids, codes = np.unique(snapshot["category"], return_inverse=True)
+    amounts = np.bincount(codes, weights=snapshot["cents"], minlength=len(category_ids)) / 100
+    total = amounts.sum()
+    names = get_category_names(category_ids.tolist())
+    categories = sorted(zip((names[category_id] for category_id in category_ids.tolist()), amounts))
+    return {
+        "amount": {category: float(amount) for category, amount in categories},
+        "percentage": {category: float(amount / total) for category, amount in categories},
+    }
+
+def get_snapshot_date_data(snapshot: np.ndarray) -> pd.DataFrame:
+    """
+    Build the date ordered DataFrame used for charts and regression from a snapshot.
+
+    :param snapshot: Ledger snapshot.
+    :return: DataFrame with 'date', 'amount' and 'date_ordinal' columns sorted by date.
+    """
+    snapshot = snapshot[np.argsort(snapshot["date"], kind="stable")]
+    return pd.DataFrame({
+        "date": [date.fromordinal(int(ordinal)) for ordinal in snapshot["date"]],
+        "amount": snapshot["cents"] / 100,
+        "date_ordinal": snapshot["date"],
+    })
+
+def get_projection_slope(amounts: List[float]) -> float:
+    """
+    Read the slope of a linear projection, the difference between two consecutive projected days.
+
+    :param amounts: Projected daily amounts.
+    :return: Slope, 0 for projections shorter than two days.
+    """
+    return float(amounts[1] - amounts[0]) if len(amounts) > 1 else 0.0
+
+def build_snapshot_data(snapshot: np.ndarray, projection: Tuple[List[str], List[float]], categories: Optional[dict] = None) -> dict:
+    """
+    Derive every statistic displayed by the data_input_form template from a single snapshot.
+
+    The slope card and the projected chart both come from the same linear projection, as returned by
+    extrapolate_user_trend, so no trend is fitted on the snapshot.
+
+    :param snapshot: Ledger snapshot.
+    :param projection: Tuple of the projected dates and amounts.
+    :param categories: Category breakdown to display, None to derive it from the snapshot.
+    :return: Dictionary with the statistics, chart data and categories.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    aggregates = get_snapshot_aggregates(snapshot, today)
+    date_data = get_snapshot_date_data(snapshot)
+    projected_dates, projected_amounts = projection
+    return {
+        "min": aggregates["min"],
+        "max": aggregates["max"],
+        "avg": aggregates["avg"],
+        "total": get_snapshot_total(snapshot),
+        "std": round(get_snapshot_std(snapshot), 3),
+        "linear_regression_slope": round(get_projection_slope(projected_amounts), 3),
+        "today": today,
+        "chart_data": {"date": [day.strftime("%Y-%m-%d") for day in date_data["date"]], "amount": date_data["amount"].tolist()},
+        "projected_chart_data": {"date": list(projected_dates), "amount": [float(amount) for amount in projected_amounts]},
+        "categories": get_snapshot_categories(snapshot) if categories is None else categories,
+    }
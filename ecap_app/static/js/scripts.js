@@ -68,14 +68,20 @@ function getMonthName(month) {
     return months[month];
 }
 
-function displayUserReports(){
-    getDataFromUrl("get_user_report/").then(
-        reports => {
-            if (reports) {
+const REPORT_LIST_FIELDS = "id,start_date,end_date,total_incomes,total_expenses";
+let reportsCursor = null;
+
+function displayUserReports(cursor = null){
+    let url = "get_user_report/?fields=" + REPORT_LIST_FIELDS;
+    if (cursor)
+        url += "&cursor=" + cursor;
+    getDataFromUrl(url).then(
+        page => {
+            if (page) {
                 const reportTable = document.getElementById('reportTable');
-                if (reportTable.hasChildNodes())
+                if (!cursor && reportTable.hasChildNodes())
                     reportTable.innerHTML = '';
-                reports.reverse().forEach(report => {
+                page.reports.forEach(report => {
                     const startDateFormatted = formatDate(report.start_date);
                     const endDateFormatted = formatDate(report.end_date);
                     const row = document.createElement('tr');
@@ -106,14 +112,32 @@ function displayUserReports(){
                     row.appendChild(printCell);
                     reportTable.appendChild(row);
                 })
+                reportsCursor = page.next_cursor || null;
+                document.getElementById('loadMoreReports').style.display = reportsCursor ? '' : 'none';
             }
         } 
     )
 }
 
 displayUserReports();
-
-function createUserReport(startDate, endDate){return getDataFromUrl("create_user_report/" + startDate + "/" + endDate);}
+document.getElementById('loadMoreReports').addEventListener('click', () => displayUserReports(reportsCursor));
+
+const REPORT_POLL_INTERVAL = 1000;
+const REPORT_POLL_LIMIT = 120;
+
+async function createUserReport(startDate, endDate){
+    let response = await getDataFromUrl("create_user_report/" + startDate + "/" + endDate);
+    let polls = 0;
+    while (response && (response.job.status === "pending" || response.job.status === "running")) {
+        if (++polls > REPORT_POLL_LIMIT)
+            throw new Error("Report generation timed out");
+        await new Promise(resolve => setTimeout(resolve, REPORT_POLL_INTERVAL));
+        response = await getDataFromUrl("report_job/" + response.job.id + "/");
+    }
+    if (!response || response.job.status !== "done")
+        throw new Error("Report generation failed");
+    return response.job.report;
+}
 
 document.getElementById('selectAll').addEventListener('change', function() {
     var checkboxes = document.querySelectorAll('input[name="selected_items"]');
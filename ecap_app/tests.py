@@ -1,3 +1,822 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from .benchmarks import legacy_friend_comparison, seed_friends
+from .chat_broker import CacheBroker, MemoryBroker
+from .chat_history import decode_message_cursor, encode_message_cursor, get_newer_messages, get_older_messages
+from .categories import get_category_ids, get_category_key, normalize_category_name
+from .batch_forecasting import forecast_user_chunk, get_stored_forecast, store_forecasts
+from .forecasters import DailyLinearForecaster, LinearForecaster
+from .exports import get_export_columns, iter_export_rows
+from .imports import ImportedTransaction, StatementError, import_transactions, parse_csv, parse_ofx
+from .comparison import get_friend_comparison
+from .forms import ExpenseForm
+from .forecasting import get_user_trend, predict_trend
+from .forecast_cache import bump_data_versions, cached_ledger_value, get_data_version, get_forecast_cache, invalidate_forecasts, local_forecasts
+from .ledger import get_amount_aggregates, get_cached_category_breakdown, get_ledger_totals, rebuild_ledger_rollups
+from .models import AmountStatistics, Category, Chat, DailyLedger, DataVersion, Expense, Forecast, Friend, Income, Message, Profile, Ranking, RecurringRule, ReportJob, TrendStatistics
+from .pagination import paginate_by_keyset
+from .rankings import compute_ranking_scores, mark_rankings_stale, refresh_rankings
+from .recurring import materialize_due_rules
+from .search import build_match_query, bump_search_version, get_search_version, search
+from .report_jobs import REPORT_JOB_LEASE, REPORT_JOB_MAX_ATTEMPTS, claim_report_job, enqueue_report_job
+from .transactions import decode_cursor, encode_cursor, get_transaction_page
+from .websocket import CLOSE_FORBIDDEN, CLOSE_NOT_FOUND, websocket_application
+from .utils import calculate_total_user_balance, get_categories, get_user_expense_aggregates, calculate_user_balance_from_date, create_report_for_user, get_user_daily_amounts, get_user_expense_snapshot_data, iter_report_line_items, serialize_report
+from .online_stats import welford_add, welford_remove
+from .query_plans import QUERY_PLAN_CASES, explain_case, find_full_scans, seed_query_plan_user
 
-# Create your tests here.
+
+@skipUnless(connection.vendor == "sqlite", "Query plans are only checked on SQLite.")
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN the queries issued by the ledger helpers and fail if any reads a ledger table with a full scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_query_plan_user(rows=200)
+
+    def test_no_full_scans(self):
+        for name, case in QUERY_PLAN_CASES.items():
+            with self.subTest(case=name):
+                for result in explain_case(name, case, self.user):
+                    self.assertEqual(result["full_scans"], [], f"{result['sql']}\n" + "\n".join(result["plan"]))
+
+    def test_find_full_scans_resolves_aliases(self):
+        sql = 'SELECT 1 FROM "ecap_app_report" WHERE EXISTS (SELECT 1 FROM "ecap_app_expense" U0 WHERE U0."amount" > 0)'
+        self.assertEqual(find_full_scans(sql, ["SCAN U0", "SCAN ecap_app_report"]), ["SCAN U0"])
+        self.assertEqual(find_full_scans(sql, ["SEARCH U0 USING INDEX expense_user_date_idx (user_id=?)"]), [])
+
+
+class LedgerTotalsTests(TestCase):
+
+    def test_users_without_rows_get_separate_totals(self):
+        first, second = User.objects.create(username="first"), User.objects.create(username="second")
+        totals = get_ledger_totals([first.id, second.id], year=(date(2024, 1, 1), date(2024, 12, 31)))
+        totals[first.id]["all"]["income"] = Decimal(5)
+        self.assertEqual(totals[second.id]["all"]["income"], 0)
+        self.assertIsNot(totals[first.id]["year"], totals[second.id]["year"])
+
+
+class WelfordTests(TestCase):
+
+    def assertAccumulator(self, accumulator, values):
+        count, mean, m2 = accumulator
+        self.assertEqual(count, len(values))
+        self.assertAlmostEqual(mean, sum(values) / len(values) if values else 0.0)
+        self.assertAlmostEqual(m2, sum((value - mean) ** 2 for value in values))
+
+    def test_add_remove_round_trip(self):
+        values = [12.5, 3.0, 7.25, 100.0, 3.0, 42.0]
+        accumulator = (0, 0.0, 0.0)
+        for index, value in enumerate(values):
+            accumulator = welford_add(*accumulator, value)
+            self.assertAccumulator(accumulator, values[:index + 1])
+        for index, value in enumerate(values):
+            accumulator = welford_remove(*accumulator, value)
+            self.assertAccumulator(accumulator, values[index + 1:])
+        self.assertEqual(accumulator, (0, 0.0, 0.0))
+
+    def test_signal_updates_match_rebuild(self):
+        user = User.objects.create(username="welford")
+        food, rent = (Category.objects.create(user=user, name=name, key=name) for name in ("food", "rent"))
+        day = date(2024, 3, 1)
+        expenses = [Expense.objects.create(user=user, date=day, amount=Decimal(amount), category=food) for amount in ("10.00", "25.50", "4.25", "60.00")]
+        Expense.objects.create(user=user, date=date(2024, 3, 2), amount=Decimal("700.00"), category=rent)
+        expenses[1].amount = Decimal("80.00")
+        expenses[1].save()
+        expenses[3].delete()
+        expenses[2].delete()
+        fields = ("category_id", "kind", "count", "total", "mean", "m2", "minimum", "maximum")
+        trend_fields = ("kind", "n", "sum_x", "sum_y", "sum_xy", "sum_xx")
+        incremental = (
+            list(AmountStatistics.objects.filter(user=user).order_by("category_id").values_list(*fields)),
+            list(DailyLedger.objects.filter(user=user).order_by("day", "category_id").values_list("day", "category_id", "expense_count", "expense_sum", "expense_m2")),
+            list(TrendStatistics.objects.filter(user=user).values_list(*trend_fields)),
+        )
+        rebuild_ledger_rollups([user.id])
+        rebuilt = (
+            list(AmountStatistics.objects.filter(user=user).order_by("category_id").values_list(*fields)),
+            list(DailyLedger.objects.filter(user=user).order_by("day", "category_id").values_list("day", "category_id", "expense_count", "expense_sum", "expense_m2")),
+            list(TrendStatistics.objects.filter(user=user).values_list(*trend_fields)),
+        )
+        for incremental_rows, rebuilt_rows in zip(incremental, rebuilt):
+            self.assertEqual(len(incremental_rows), len(rebuilt_rows))
+            for incremental_row, rebuilt_row in zip(incremental_rows, rebuilt_rows):
+                for incremental_value, rebuilt_value in zip(incremental_row, rebuilt_row):
+                    if isinstance(rebuilt_value, float):
+                        self.assertAlmostEqual(incremental_value, rebuilt_value)
+                    else:
+                        self.assertEqual(incremental_value, rebuilt_value)
+        self.assertEqual(incremental[0][0][2:], (2, Decimal("90.00"), 45.0, 2450.0, Decimal("10.00"), Decimal("80.00")))
+
+
+class DataVersionTests(TestCase):
+
+    def test_forecasts_are_invalidated_on_commit(self):
+        user = User.objects.create(username="versioned")
+        Forecast.objects.create(user=user, kind="expense", start_date=date(2024, 1, 1), amounts=[1.0])
+        version = get_data_version(user.id)
+        self.assertEqual(cached_ledger_value(user.id, "test", lambda: "before"), "before")
+        with self.captureOnCommitCallbacks() as callbacks:
+            invalidate_forecasts([user.id])
+            self.assertEqual(get_data_version(user.id), version)
+            self.assertTrue(Forecast.objects.filter(user=user).exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_data_version(user.id), version + 1)
+        self.assertFalse(Forecast.objects.filter(user=user).exists())
+        self.assertEqual(cached_ledger_value(user.id, "test", lambda: "after"), "after")
+
+    def test_stored_forecasts_follow_data_version(self):
+        user = User.objects.create(username="precomputed")
+        category = Category.objects.create(user=user, name="food", key="food")
+        for day, amount in ((1, "10.00"), (2, "20.00"), (3, "30.00")):
+            Expense.objects.create(user=user, date=date(2024, 1, day), amount=Decimal(amount), category=category)
+        forecasts = forecast_user_chunk("expense", [user.id], 3)
+        self.assertEqual(store_forecasts("expense", [user.id], forecasts), 1)
+        dates, amounts = get_stored_forecast(user, "expense", 3)
+        self.assertEqual(dates, ["2024-01-03", "2024-01-04", "2024-01-05"])
+        self.assertEqual([round(amount, 6) for amount in amounts], [30.0, 40.0, 50.0])
+        bump_data_versions([user.id])
+        self.assertIsNone(get_stored_forecast(user, "expense", 3))
+        self.assertEqual(store_forecasts("expense", [user.id], forecasts), 0)
+
+    def test_chunks_with_resolved_versions_only_read(self):
+        user = User.objects.create(username="worker-read")
+        category = Category.objects.create(user=user, name="food", key="food")
+        for day in (1, 2):
+            Expense.objects.create(user=user, date=date(2024, 1, day), amount=Decimal("10.00"), category=category)
+        DataVersion.objects.filter(user=user).delete()
+        with self.assertNumQueries(1):
+            forecasts = forecast_user_chunk("expense", [user.id], 3, versions={user.id: 7})
+        self.assertEqual(forecasts[0][3], 7)
+        self.assertFalse(DataVersion.objects.filter(user=user).exists())
+
+    def test_expense_page_reads_the_stored_forecast(self):
+        user = User.objects.create(username="snapshot-forecast")
+        category = Category.objects.create(user=user, name="food", key="food")
+        for day in (1, 2, 3):
+            Expense.objects.create(user=user, date=date(2024, 1, day), amount=Decimal("10.00"), category=category)
+        amounts = [1.0 + 2 * day for day in range(10)]
+        Forecast.objects.create(user=user, kind="expense", start_date=date(2024, 1, 3), amounts=amounts, data_version=get_data_version(user.id))
+        data = get_user_expense_snapshot_data(user)
+        self.assertEqual(data["projected_chart_data"]["amount"], amounts)
+        self.assertEqual(data["projected_chart_data"]["date"][0], "2024-01-03")
+        self.assertEqual(data["linear_regression_slope"], 2.0)
+
+
+class ForecasterTests(TestCase):
+
+    def test_daily_linear_forecaster_fits_daily_totals(self):
+        start = date(2024, 1, 1).toordinal()
+        days = [start, start + 1, start + 1, start + 2, start + 2, start + 2]
+        amounts = [10.0] * len(days)
+        predicted = DailyLinearForecaster().fit(days, amounts, ["food"] * len(days)).predict([start + 3, start + 4])
+        self.assertEqual([round(float(amount), 6) for amount in predicted], [40.0, 50.0])
+
+    def test_linear_forecaster_matches_the_served_trend(self):
+        user = User.objects.create(username="trended")
+        category = Category.objects.create(user=user, name="Food", key="food")
+        start = date(2024, 1, 1)
+        rows = [(0, "10.00"), (0, "30.00"), (3, "12.50"), (7, "40.00"), (9, "5.25")]
+        for offset, amount in rows:
+            Expense.objects.create(user=user, date=start + timedelta(days=offset), amount=Decimal(amount), category=category)
+        days = [(start + timedelta(days=offset)).toordinal() for offset, _ in rows]
+        forecaster = LinearForecaster().fit(days, [float(amount) for _, amount in rows], ["food"] * len(rows))
+        trend = get_user_trend(user, "expense")
+        self.assertAlmostEqual(forecaster.trend.slope, trend.slope, places=6)
+        self.assertAlmostEqual(forecaster.predict([days[-1] + 1])[0], predict_trend(trend, [days[-1] + 1])[0], places=4)
+
+
+class RecurringRuleTests(TestCase):
+
+    def test_materialized_rows_are_rolled_up_with_their_batch(self):
+        users = [User.objects.create(username=f"recurring{i}") for i in range(3)]
+        for user in users:
+            category = Category.objects.create(user=user, name="rent", key="rent")
+            RecurringRule.objects.create(user=user, kind="expense", amount=Decimal("500.00"), category=category, start_date=date(2024, 1, 31), next_run=date(2024, 1, 31))
+        self.assertEqual(materialize_due_rules(until=date(2024, 4, 30), batch_size=2), (3, 12))
+        for user in users:
+            statistics = AmountStatistics.objects.get(user=user, kind="expense")
+            self.assertEqual((statistics.count, statistics.total), (4, Decimal("2000.00")))
+            days = list(DailyLedger.objects.filter(user=user).order_by("day").values_list("day", flat=True))
+            self.assertEqual(days, [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)])
+
+
+class ReportSnapshotTests(TestCase):
+
+    def test_line_items_are_the_rows_the_report_was_created_from(self):
+        user = User.objects.create(username="reporter")
+        category = Category.objects.create(user=user, name="Food", key="food")
+        expenses = [Expense.objects.create(user=user, date=date(2024, 1, day), amount=Decimal(day * 10), category=category) for day in (3, 1, 2)]
+        income = Income.objects.create(user=user, date=date(2024, 1, 5), amount=Decimal(100), category=category)
+        report = create_report_for_user(user, date(2024, 1, 1), date(2024, 1, 31))
+        Expense.objects.create(user=user, date=date(2024, 1, 4), amount=Decimal(99), category=category)
+        items = [(item["kind"], item["id"]) for item in iter_report_line_items(report, chunk_size=2)]
+        self.assertEqual(items, [("expense", expenses[1].id), ("expense", expenses[2].id), ("expense", expenses[0].id), ("income", income.id)])
+        self.assertEqual(serialize_report(report, user.username, ["expenses"])["expenses"][0], {"date": "2024-01-01", "amount": "10.00"})
+
+
+class ReportJobTests(TestCase):
+
+    def test_expired_jobs_are_requeued_then_failed(self):
+        user = User.objects.create(username="queued")
+        job = enqueue_report_job(user, date(2024, 1, 1), date(2024, 1, 31))
+        expired = timezone.now() - timedelta(seconds=REPORT_JOB_LEASE + 1)
+        for attempt in range(1, REPORT_JOB_MAX_ATTEMPTS + 1):
+            claimed = claim_report_job()
+            self.assertEqual((claimed.id, claimed.status, claimed.attempts), (job.id, "running", attempt))
+            self.assertIsNone(claim_report_job())
+            ReportJob.objects.filter(id=job.id).update(started_at=expired)
+        self.assertIsNone(claim_report_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertNotEqual(enqueue_report_job(user, date(2024, 1, 1), date(2024, 1, 31)).id, job.id)
+
+
+OFX_SGML = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240105120000[-5:EST]
+<TRNAMT>-12.50
+<NAME>Coffee shop
+<MEMO>Latte
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20240131
+<TRNAMT>2,500.00
+<NAME>Salary
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+OFX_XML = """<?xml version="1.0"?>
+<OFX><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20240105</DTPOSTED><TRNAMT>-12.50</TRNAMT><NAME>Coffee shop</NAME><MEMO>Latte</MEMO></STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20240131</DTPOSTED><TRNAMT>2500.00</TRNAMT><NAME>Salary</NAME></STMTTRN>
+</BANKTRANLIST></OFX>
+"""
+
+
+class StatementImportTests(TestCase):
+
+    def test_parse_csv_uses_the_sign_or_the_kind_column(self):
+        lines = ["date,amount,category,description,kind", "2024-01-05,-12.50,food ,Coffee,", "2024-01-31,\"2,500.00\",,Salary,", "2024-02-01,40,Food,Refund,expense"]
+        self.assertEqual(list(parse_csv(lines)), [
+            ImportedTransaction("expense", date(2024, 1, 5), Decimal("12.50"), "food", "Coffee"),
+            ImportedTransaction("income", date(2024, 1, 31), Decimal("2500.00"), "Imported", "Salary"),
+            ImportedTransaction("expense", date(2024, 2, 1), Decimal("40.00"), "Food", "Refund"),
+        ])
+
+    def test_parse_csv_with_custom_columns(self):
+        lines = ["Booked;Value;Text", "05.01.2024;12,5;Coffee", "06.01.2024;-1.234,56;Rent"]
+        columns = {"date": "Booked", "amount": "Value", "description": "Text"}
+        transactions = list(parse_csv(lines, columns, kind="expense", date_format="%d.%m.%Y", delimiter=";"))
+        self.assertEqual(transactions, [
+            ImportedTransaction("expense", date(2024, 1, 5), Decimal("12.50"), "Imported", "Coffee"),
+            ImportedTransaction("expense", date(2024, 1, 6), Decimal("1234.56"), "Imported", "Rent"),
+        ])
+
+    def test_parse_csv_decimal_separator(self):
+        self.assertEqual(list(parse_csv(["date;amount", "2024-01-05;1,234.50"], delimiter=";", decimal_separator="."))[0].amount, Decimal("1234.50"))
+        self.assertEqual(list(parse_csv(["date,amount", "2024-01-05,\"12,5\""], decimal_separator=","))[0].amount, Decimal("12.50"))
+        with self.assertRaisesMessage(StatementError, "Invalid decimal separator"):
+            list(parse_csv(["date,amount"], decimal_separator=" "))
+
+    def test_parse_csv_errors(self):
+        with self.assertRaisesMessage(StatementError, "Missing columns: amount"):
+            list(parse_csv(["date,value", "2024-01-01,1"]))
+        with self.assertRaisesMessage(StatementError, "Line 3: Invalid amount: 'abc'"):
+            list(parse_csv(["date,amount", "2024-01-01,1", "2024-01-02,abc"]))
+        with self.assertRaisesMessage(StatementError, "Line 2: Invalid kind: 'transfer'"):
+            list(parse_csv(["date,amount,kind", "2024-01-01,1,transfer"]))
+
+    def test_parse_ofx_dialects(self):
+        expected = [
+            ImportedTransaction("expense", date(2024, 1, 5), Decimal("12.50"), "Imported", "Coffee shop Latte"),
+            ImportedTransaction("income", date(2024, 1, 31), Decimal("2500.00"), "Imported", "Salary"),
+        ]
+        self.assertEqual(list(parse_ofx(OFX_SGML.splitlines())), expected)
+        self.assertEqual(list(parse_ofx(OFX_XML.splitlines())), expected)
+        with self.assertRaises(StatementError):
+            list(parse_ofx(["<STMTTRN>", "<NAME>No amount", "</STMTTRN>"]))
+
+    def test_identical_rows_are_kept_and_reimport_is_idempotent(self):
+        user = User.objects.create(username="importer")
+        lines = ["date,amount,description", "2024-01-05,-3.20,Coffee", "2024-01-05,-3.20,Coffee", "2024-01-06,-3.20,Coffee"]
+        self.assertEqual(import_transactions(user, parse_csv(lines)), {"expense": 3, "income": 0, "duplicates": 0})
+        self.assertEqual(import_transactions(user, parse_csv(lines)), {"expense": 0, "income": 0, "duplicates": 3})
+        self.assertEqual(import_transactions(user, parse_csv(lines + ["2024-01-05,-3.20,Coffee"])), {"expense": 1, "income": 0, "duplicates": 3})
+        self.assertEqual(Expense.objects.filter(user=user, date=date(2024, 1, 5)).count(), 3)
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="paginated")
+        category = Category.objects.create(user=cls.user, name="Food", key="food")
+        days = [1, 1, 1, 2, 3, 3, 5]
+        cls.expenses = [Expense.objects.create(user=cls.user, date=date(2024, 1, day), amount=Decimal(10 + i % 3), category=category) for i, day in enumerate(days)]
+
+    def collect_pages(self, field, descending, limit=2):
+        rows = Expense.objects.filter(user=self.user).values("id", "date", "amount")
+        ids, cursor = [], None
+        while True:
+            items, cursor = paginate_by_keyset(rows, field, cursor, limit, descending)
+            ids += [item["id"] for item in items]
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_row_once_in_order(self):
+        for field in ("date", "amount"):
+            for descending in (True, False):
+                with self.subTest(field=field, descending=descending):
+                    ordered = sorted(self.expenses, key=lambda expense: (getattr(expense, field), expense.id), reverse=descending)
+                    self.assertEqual(self.collect_pages(field, descending), [expense.id for expense in ordered])
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(encode_cursor((date(2024, 1, 5), 123)), "2024-01-05~123")
+        self.assertEqual(decode_cursor("2024-01-05~123", "date"), (date(2024, 1, 5), 123))
+        self.assertEqual(decode_cursor(encode_cursor((Decimal("12.50"), 7)), "amount"), (Decimal("12.50"), 7))
+        self.assertIsNone(encode_cursor(None))
+        for cursor, field in (("2024-01-05", "date"), ("2024-13-01~1", "date"), ("abc~1", "amount"), ("12.50~x", "amount")):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor, field)
+
+    def test_transaction_pages_follow_encoded_cursors(self):
+        ids, cursor = [], None
+        while True:
+            page = get_transaction_page(self.user, "expense", {}, "-amount", cursor, limit=3)
+            ids += [row["id"] for row in page["transactions"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(ids, [expense.id for expense in sorted(self.expenses, key=lambda expense: (expense.amount, expense.id), reverse=True)])
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="searcher")
+        cls.other = User.objects.create(username="other-searcher")
+        for user in (cls.user, cls.other):
+            category = Category.objects.create(user=user, name="Food", key="food")
+            Expense.objects.create(user=user, date=date(2024, 1, 1), amount=Decimal("3.50"), category=category, description="Coffee beans")
+
+    def test_match_query_quotes_terms_and_kinds(self):
+        self.assertEqual(
+            build_match_query('coffee "x" OR owners:u2 NEAR', 1),
+            'owners:u1 AND body:("coffee" "x" "or" "owners" "u2" "near"*)'
+        )
+        self.assertEqual(build_match_query("tea", 1, ["expense", "income"]), 'owners:u1 AND body:("tea"*) AND kind:("expense" OR "income")')
+        self.assertIsNone(build_match_query('"*" ( )', 1))
+
+    def test_search_returns_own_rows_only(self):
+        results, more = search(self.user.id, "coff")
+        self.assertEqual([result["kind"] for result in results], ["expense"])
+        self.assertFalse(more)
+        self.assertEqual(Expense.objects.get(id=results[0]["id"]).user, self.user)
+
+    def test_search_version_is_shared_through_the_database(self):
+        version = get_search_version(self.user.id)
+        self.assertEqual(bump_search_version(self.user.id), version + 1)
+        self.assertEqual(get_search_version(self.user.id), version + 1)
+
+
+class ComparisonTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="comparer")
+        seed_friends(cls.user, 3, 40)
+
+    def assertSameComparison(self, user):
+        batched, legacy = get_friend_comparison(user), legacy_friend_comparison(user)
+        self.assertEqual(batched["user_data"], legacy["user_data"])
+        # The legacy query lists friends in no particular order.
+        self.assertEqual(
+            {friend["username"]: friend for friend in batched["friends"]},
+            {friend["username"]: friend for friend in legacy["friends"]}
+        )
+
+    def test_batched_comparison_matches_per_friend_queries(self):
+        self.assertEqual(len(get_friend_comparison(self.user)["friends"]), 3)
+        self.assertSameComparison(self.user)
+
+    def test_user_without_rows_or_goals(self):
+        loner = User.objects.create(username="loner")
+        Profile.objects.create(user=loner, bio="")
+        self.assertSameComparison(loner)
+
+
+class RankingRefreshTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="ranked")
+        category = Category.objects.create(user=cls.user, name="Salary", key="salary")
+        Income.objects.create(user=cls.user, date=date(2024, 1, 1), amount=Decimal(100), category=category)
+
+    def test_refresh_clears_stale_rankings(self):
+        mark_rankings_stale([self.user.id])
+        self.assertEqual(refresh_rankings()[0], 1)
+        self.assertFalse(Ranking.objects.filter(user=self.user, stale=True).exists())
+        self.assertEqual(Ranking.objects.get(user=self.user, metric="savings_rate").score, 100.0)
+
+    def test_rankings_marked_during_refresh_stay_stale(self):
+        mark_rankings_stale([self.user.id])
+
+        def compute_and_mark(user_ids):
+            scores = compute_ranking_scores(user_ids)
+            mark_rankings_stale(user_ids)
+            return scores
+
+        with mock.patch("ecap_app.rankings.compute_ranking_scores", side_effect=compute_and_mark):
+            refresh_rankings()
+        self.assertEqual(Ranking.objects.filter(user=self.user, stale=True).count(), len(Ranking.METRICS))
+        self.assertEqual(refresh_rankings()[0], 1)
+        self.assertFalse(Ranking.objects.filter(user=self.user, stale=True).exists())
+
+
+class FriendRequestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = User.objects.create(username="sender")
+        cls.receiver = User.objects.create(username="receiver")
+
+    def send_request(self, from_user, to_user):
+        self.client.force_login(from_user)
+        self.client.post(reverse("send_friend_request"), {"user_id": to_user.id})
+
+    def test_request_is_sent_once(self):
+        self.send_request(self.sender, self.receiver)
+        self.send_request(self.receiver, self.sender)
+        self.assertEqual(list(Friend.objects.values_list("user", "friend", "status")), [(self.sender.id, self.receiver.id, "pending")])
+
+    def test_rejected_request_cannot_be_sent_again(self):
+        Friend.objects.create(user=self.receiver, friend=self.sender, status="rejected")
+        self.send_request(self.sender, self.receiver)
+        self.assertEqual(Friend.objects.count(), 1)
+
+
+class MessageCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = User.objects.create(username="writer")
+        cls.user2 = User.objects.create(username="reader")
+        cls.chat = Chat.objects.create(user1=cls.user1, user2=cls.user2)
+        cls.messages = [Message.objects.create(chat=cls.chat, sender=cls.user1, content=f"message {i}") for i in range(7)]
+        # Several messages share a timestamp, so pages must break ties on the ID.
+        start = datetime(2024, 6, 10, 14, 0, tzinfo=dt_timezone.utc)
+        for i, message in enumerate(cls.messages):
+            Message.objects.filter(id=message.id).update(timestamp=start + timedelta(microseconds=i // 3))
+
+    def test_cursor_round_trip(self):
+        timestamp = datetime(2024, 6, 10, 14, 0, 0, 123456, tzinfo=dt_timezone.utc)
+        self.assertEqual(encode_message_cursor(timestamp, 42), "1718028000123456~42")
+        self.assertEqual(decode_message_cursor("1718028000123456~42"), (timestamp, 42))
+        for cursor in ("1718028000123456", "~42", "1718028000123456~", "-1~42", "17180.28~42", "abc~42"):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_message_cursor(cursor)
+
+    def test_older_pages_cover_every_message_once(self):
+        contents, cursor = [], None
+        while True:
+            page = get_older_messages(self.chat, cursor, limit=2)
+            contents = [message["content"] for message in page["messages"]] + contents
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(contents, [f"message {i}" for i in range(7)])
+
+    def test_newer_messages_follow_a_cursor(self):
+        cursor = get_older_messages(self.chat, limit=7)["messages"][2]["cursor"]
+        page = get_newer_messages(self.chat, cursor, limit=3)
+        self.assertEqual([message["content"] for message in page["messages"]], ["message 3", "message 4", "message 5"])
+        self.assertTrue(page["has_more"])
+        page = get_newer_messages(self.chat, page["next_cursor"])
+        self.assertEqual([message["content"] for message in page["messages"]], ["message 6"])
+        self.assertFalse(page["has_more"])
+
+
+class CategoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="categorizer")
+        cls.food = Category.objects.create(user=cls.user, name="Food", key="food")
+
+    def test_names_differing_in_case_or_whitespace_share_a_key(self):
+        self.assertEqual(normalize_category_name("  Eating \t out \n"), "Eating out")
+        self.assertEqual(normalize_category_name(None), "")
+        self.assertEqual(normalize_category_name("x" * 150), "x" * 100)
+        self.assertEqual({get_category_key(name) for name in ("Eating out", " eating  OUT", "EATING\tout ")}, {"eating out"})
+
+    def test_bulk_resolution_creates_missing_categories_once(self):
+        ids = get_category_ids(self.user.id, ["FOOD ", "Rent", "rent"])
+        self.assertEqual(ids["FOOD "], self.food.id)
+        self.assertEqual(ids["Rent"], ids["rent"])
+        self.assertEqual(Category.objects.get(id=ids["Rent"]).key, "rent")
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 2)
+
+    def expense_form(self, category, **kwargs):
+        data = {"date": "2024-01-05", "amount": "12.50", "category": category, "description": ""}
+        return ExpenseForm(data, user=self.user, **kwargs)
+
+    def test_form_resolves_existing_category(self):
+        form = self.expense_form("  fOOd ")
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["category"], self.food)
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 1)
+
+    def test_form_creates_new_category_with_normalized_name(self):
+        form = self.expense_form(" Eating   out ")
+        self.assertTrue(form.is_valid(), form.errors)
+        category = form.cleaned_data["category"]
+        self.assertEqual((category.user_id, category.name, category.key), (self.user.id, "Eating out", "eating out"))
+
+    def test_form_rejects_blank_category_and_edits_show_the_name(self):
+        form = self.expense_form("   ")
+        self.assertFalse(form.is_valid())
+        self.assertIn("category", form.errors)
+        expense = Expense.objects.create(user=self.user, date=date(2024, 1, 5), amount=Decimal("3.00"), category=self.food)
+        self.assertEqual(ExpenseForm(instance=expense).initial["category"], "Food")
+
+    def test_categories_are_per_user(self):
+        other = User.objects.create(username="other-categorizer")
+        self.assertNotEqual(get_category_ids(other.id, ["Food"])["Food"], self.food.id)
+
+
+class ChatWebSocketTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create(username="member")
+        cls.partner = User.objects.create(username="partner")
+        cls.outsider = User.objects.create(username="outsider")
+        cls.chat = Chat.objects.create(user1=cls.member, user2=cls.partner)
+
+    def setUp(self):
+        self.cookies = {}
+        for user in (self.member, self.outsider):
+            client = Client()
+            client.force_login(user)
+            self.cookies[user.username] = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    async def connect(self, events, username=None, origin="http://testserver", path=None):
+        headers = [(b"origin", origin.encode())] if origin else []
+        if username:
+            headers.append((b"cookie", self.cookies[username].encode()))
+        scope = {"type": "websocket", "path": path or f"/ws/chat/{self.chat.id}/", "headers": headers}
+        incoming, sent = [{"type": "websocket.connect"}, *events], []
+
+        async def receive():
+            return incoming.pop(0) if incoming else {"type": "websocket.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await websocket_application(scope, receive, send)
+        return sent
+
+    async def test_handshake_is_rejected_for_foreign_origins(self):
+        sent = await self.connect([], "member", origin="https://attacker.example")
+        self.assertEqual(sent, [{"type": "websocket.close", "code": CLOSE_FORBIDDEN}])
+
+    async def test_handshake_is_rejected_for_anonymous_users(self):
+        self.assertEqual(await self.connect([]), [{"type": "websocket.close", "code": CLOSE_FORBIDDEN}])
+
+    async def test_handshake_is_rejected_for_non_members(self):
+        self.assertEqual(await self.connect([], "outsider"), [{"type": "websocket.close", "code": CLOSE_FORBIDDEN}])
+
+    async def test_unknown_paths_are_closed(self):
+        self.assertEqual(await self.connect([], "member", path="/ws/other/"), [{"type": "websocket.close", "code": CLOSE_NOT_FOUND}])
+
+    async def test_members_can_send_messages(self):
+        events = [{"type": "websocket.receive", "text": json.dumps({"content": " hello "})}, {"type": "websocket.receive", "text": "not json"}]
+        sent = await self.connect(events, "member")
+        self.assertEqual(sent[0], {"type": "websocket.accept"})
+        self.assertEqual(json.loads(sent[1]["text"]), {"type": "error", "error": "Invalid message."})
+        contents = await sync_to_async(list)(Message.objects.filter(chat=self.chat, sender=self.member).values_list("content", flat=True))
+        self.assertEqual(contents, ["hello"])
+
+
+class ChatBrokerTests(TestCase):
+
+    async def assertFanOut(self, broker):
+        first, second, other = broker.subscribe("chat-1"), broker.subscribe("chat-1"), broker.subscribe("chat-2")
+        await asyncio.sleep(0.05)
+        broker.publish("chat-1", {"id": 1})
+        broker.publish("chat-1", {"id": 2})
+        for subscription in (first, second):
+            received = [await asyncio.wait_for(subscription.get(), 1) for _ in range(2)]
+            self.assertEqual(received, [{"id": 1}, {"id": 2}])
+        self.assertTrue(other.queue.empty())
+        for subscription in (first, second, other):
+            broker.unsubscribe(subscription)
+        self.assertEqual(dict(broker.groups), {})
+
+    async def test_memory_broker_delivers_to_every_subscription_of_a_group(self):
+        await self.assertFanOut(MemoryBroker())
+
+    async def test_cache_broker_delivers_to_every_subscription_of_a_group(self):
+        await self.assertFanOut(CacheBroker(poll_interval=0.01))
+
+
+class DailyLedgerTests(TestCase):
+
+    def ledger_rows(self, user):
+        return list(DailyLedger.objects.filter(user=user).order_by("day", "category_id").values_list(
+            "day", "category_id", "income_count", "income_sum", "expense_count", "expense_sum"
+        ))
+
+    def test_signals_keep_daily_buckets_in_sync(self):
+        user = User.objects.create(username="daily")
+        food, salary = Category.objects.create(user=user, name="Food", key="food"), Category.objects.create(user=user, name="Salary", key="salary")
+        first, second = date(2024, 5, 1), date(2024, 5, 2)
+        coffee = Expense.objects.create(user=user, date=first, amount=Decimal("3.50"), category=food)
+        Expense.objects.create(user=user, date=first, amount=Decimal("6.50"), category=food)
+        paid = Income.objects.create(user=user, date=first, amount=Decimal("100.00"), category=salary)
+        bonus = Income.objects.create(user=user, date=second, amount=Decimal("50.00"), category=salary)
+        coffee.date, coffee.amount = second, Decimal("4.00")
+        coffee.save()
+        bonus.delete()
+        self.assertEqual(self.ledger_rows(user), [
+            (first, food.id, 0, Decimal("0.00"), 1, Decimal("6.50")),
+            (first, salary.id, 1, Decimal("100.00"), 0, Decimal("0.00")),
+            (second, food.id, 0, Decimal("0.00"), 1, Decimal("4.00")),
+        ])
+        self.assertEqual(calculate_total_user_balance(user), Decimal("89.50"))
+        self.assertEqual(calculate_user_balance_from_date(user, "2024-05-02"), Decimal("-4.00"))
+        self.assertEqual(get_user_daily_amounts(user, "expense")["amount"].tolist(), [Decimal("6.50"), Decimal("4.00")])
+        incremental = self.ledger_rows(user)
+        paid.delete()
+        Income.objects.create(user=user, date=first, amount=Decimal("100.00"), category=salary)
+        call_command("rebuild_daily_ledger", user_ids=[user.id], stdout=io.StringIO())
+        self.assertEqual(self.ledger_rows(user), incremental)
+
+
+class AmountAggregateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(username=f"aggregated-{i}") for i in range(2)]
+        cls.expenses = {}
+        for i, user in enumerate(cls.users):
+            category = Category.objects.create(user=user, name="Food", key="food")
+            amounts = [("2024-02-01", "5.00"), ("2024-02-03", "20.00"), ("2024-02-05", "11.00"), ("2024-02-07", "5.00"), ("2024-02-09", "40.00")]
+            cls.expenses[user.id] = [
+                Expense.objects.create(user=user, date=date.fromisoformat(day), amount=Decimal(amount) * (i + 1), category=category)
+                for day, amount in amounts
+            ]
+
+    def test_aggregates_and_dates_of_several_users_in_two_queries(self):
+        with self.assertNumQueries(2):
+            aggregates = get_amount_aggregates(Expense, [user.id for user in self.users])
+        for i, user in enumerate(self.users):
+            with self.subTest(user=user.username):
+                scale = i + 1
+                result = aggregates[user.id]
+                self.assertEqual(result["min"], (Decimal("5.00") * scale, date(2024, 2, 1)))
+                self.assertEqual(result["max"], (Decimal("40.00") * scale, date(2024, 2, 9)))
+                self.assertEqual(result["avg"][0], Decimal("16.2") * scale)
+                self.assertEqual(result["avg"][1], date(2024, 2, 3))
+                self.assertEqual(result["count"], 5)
+
+    def test_window_and_users_without_rows(self):
+        nobody = User.objects.create(username="nobody")
+        aggregates = get_amount_aggregates(Expense, [self.users[0].id, nobody.id], date(2024, 2, 2), date(2024, 2, 6))
+        self.assertNotIn(nobody.id, aggregates)
+        self.assertEqual(aggregates[self.users[0].id]["min"], (Decimal("11.00"), date(2024, 2, 5)))
+        self.assertEqual(aggregates[self.users[0].id]["count"], 2)
+        formatted = get_user_expense_aggregates(nobody)
+        self.assertEqual((formatted["min"][0], formatted["count"]), (0, 0))
+        self.assertEqual(get_user_expense_aggregates(self.users[0])["max"], (Decimal("40.00"), "2024-02-09"))
+
+
+class ReportApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="report-reader")
+        cls.other = User.objects.create(username="report-other")
+        category = Category.objects.create(user=cls.user, name="Food", key="food")
+        Expense.objects.create(user=cls.user, date=date(2024, 1, 10), amount=Decimal("12.00"), category=category)
+        cls.reports = [create_report_for_user(cls.user, date(2024, month, 1), date(2024, month, 28)) for month in range(1, 6)]
+        cls.foreign = create_report_for_user(cls.other, date(2024, 1, 1), date(2024, 1, 28))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pages_follow_the_cursor_newest_first(self):
+        ids, cursor = [], None
+        while True:
+            response = self.client.get(reverse("get_user_report"), {"limit": 2, "fields": "id", **({"cursor": cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page["reports"]), 2)
+            ids += [report["id"] for report in page["reports"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(ids, [report.id for report in reversed(self.reports)])
+
+    def test_fields_select_the_serialized_keys(self):
+        report = self.client.get(reverse("get_user_report"), {"fields": "id,start_date,total_expenses", "limit": 1}).json()["reports"][0]
+        self.assertEqual(set(report), {"id", "start_date", "total_expenses"})
+        self.assertEqual(self.client.get(reverse("get_user_report"), {"fields": "id,password"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("get_user_report"), {"cursor": "-1"}).status_code, 400)
+
+    def test_line_items_are_streamed_to_the_owner_only(self):
+        response = self.client.get(reverse("get_report_line_items", args=[self.reports[0].id]))
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(line["kind"], line["amount"]) for line in lines], [("expense", "12.00")])
+        self.assertEqual(self.client.get(reverse("get_report_line_items", args=[self.foreign.id])).status_code, 403)
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="exporter")
+        cls.other = User.objects.create(username="export-other")
+        category = Category.objects.create(user=cls.user, name="Food", key="food")
+        cls.expenses = [Expense.objects.create(user=cls.user, date=date(2024, 1, day), amount=Decimal(f"{day}.50"), category=category, description=f"Lunch {day}") for day in range(1, 6)]
+        Expense.objects.create(user=cls.other, date=date(2024, 1, 1), amount=Decimal("99.00"), category=Category.objects.create(user=cls.other, name="Rent", key="rent"))
+
+    def test_rows_are_read_in_chunks_in_id_order(self):
+        rows = list(iter_export_rows("expense", [self.user.id], include_user=True, chunk_size=2))
+        self.assertEqual([row[1] for row in rows], [expense.id for expense in self.expenses])
+        self.assertEqual(rows[0], (self.user.id, self.expenses[0].id, date(2024, 1, 1), Decimal("1.50"), "Food", "Lunch 1"))
+        self.assertEqual(len(list(iter_export_rows("expense", include_user=True))), 6)
+
+    def test_view_streams_the_users_csv(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("export_data", args=["expense"]))
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="expenses.csv"', response["Content-Disposition"])
+        lines = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(lines[0], list(get_export_columns("expense")))
+        self.assertEqual([line[2] for line in lines[1:]], [str(expense.amount) for expense in self.expenses])
+        self.assertEqual(self.client.get(reverse("export_data", args=["friend"])).status_code, 400)
+        self.assertEqual(self.client.get(reverse("export_data", args=["expense"]), {"format": "xlsx"}).status_code, 400)
+
+    def test_command_exports_the_selected_users(self):
+        output = io.StringIO()
+        with mock.patch("sys.stdout", output):
+            call_command("export_ledger", "expense", "--user", str(self.other.id), stderr=io.StringIO())
+        lines = list(csv.reader(output.getvalue().splitlines()))
+        self.assertEqual(lines, [list(get_export_columns("expense", include_user=True)), [str(self.other.id), str(Expense.objects.get(user=self.other).id), "2024-01-01", "99.00", "Rent", ""]])
+
+
+class CategoryBreakdownTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="breakdown")
+        cls.food = Category.objects.create(user=cls.user, name="Food", key="food")
+        cls.rent = Category.objects.create(user=cls.user, name="Rent", key="rent")
+        for amount in ("10.25", "19.75"):
+            Expense.objects.create(user=cls.user, date=date(2024, 1, 5), amount=Decimal(amount), category=cls.food)
+        Expense.objects.create(user=cls.user, date=date(2024, 1, 6), amount=Decimal("90.00"), category=cls.rent)
+
+    def setUp(self):
+        # Cached values are keyed by the data version, which restarts with every test database transaction.
+        local_forecasts.clear()
+        get_forecast_cache().clear()
+
+    def test_breakdown_matches_the_raw_rows(self):
+        breakdown = get_cached_category_breakdown(self.user.id, "expense")
+        self.assertEqual(breakdown, get_categories(Expense.objects.filter(user=self.user)))
+        self.assertEqual(breakdown, {"amount": {"Food": 30.0, "Rent": 90.0}, "percentage": {"Food": 0.25, "Rent": 0.75}})
+        self.assertEqual(get_cached_category_breakdown(self.user.id, "income"), {"amount": {}, "percentage": {}})
+
+    def test_breakdown_follows_committed_writes(self):
+        get_cached_category_breakdown(self.user.id, "expense")
+        with self.captureOnCommitCallbacks(execute=True):
+            expense = Expense.objects.create(user=self.user, date=date(2024, 1, 7), amount=Decimal("30.00"), category=self.food)
+        self.assertEqual(AmountStatistics.objects.get(user=self.user, kind="expense", category=self.food).total, Decimal("60.00"))
+        self.assertEqual(get_cached_category_breakdown(self.user.id, "expense")["percentage"], {"Food": 0.4, "Rent": 0.6})
+        with self.captureOnCommitCallbacks(execute=True):
+            expense.delete()
+        self.assertEqual(get_cached_category_breakdown(self.user.id, "expense")["amount"], {"Food": 30.0, "Rent": 90.0})
@@ -0,0 +1,92 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Any, Optional, Tuple
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from .categories import get_category_key, resolve_category_names
+from .ledger import LEDGER_MODELS
+from .pagination import paginate_by_id, paginate_by_keyset
+
+
+TRANSACTION_FIELDS = ("id", "date", "amount", "category", "description")
+TRANSACTION_SORTS = ("-date", "date", "-amount", "amount", "-id", "id")
+CURSOR_SEPARATOR = "~"
+CURSOR_PARSERS = {"date": date.fromisoformat, "amount": Decimal}
+
+
+def filter_transactions(queryset: QuerySet, filters: dict) -> QuerySet:
+    """
+    Narrow an Expense or Income queryset down by the filters of the transaction table.
+
+    :param queryset: Queryset of a single user's expenses or incomes.
+    :param filters: Dictionary with optional 'date_from', 'date_to', 'category', 'amount_min', 'amount_max'
+        and 'q' (description search) values, None or empty for no filter. Categories match regardless of case and whitespace.
+    :return: Filtered queryset.
+    """
+    lookups = {
+        "date__gte": filters.get("date_from"),
+        "date__lte": filters.get("date_to"),
+        "category__key": get_category_key(filters.get("category") or ""),
+        "amount__gte": filters.get("amount_min"),
+        "amount__lte": filters.get("amount_max"),
+        "description__icontains": filters.get("q"),
+    }
+    return queryset.filter(**{lookup: value for lookup, value in lookups.items() if value not in (None, "")})
+
+def encode_cursor(cursor: Optional[Tuple[Any, int]]) -> Optional[str]:
+    """
+    Encode a keyset cursor as a string such as '2024-01-05~123'.
+
+    :param cursor: Tuple of the sort field value and the primary key, or None.
+    :return: Encoded cursor, None if there is no cursor.
+    """
+    if cursor is None:
+        return None
+    value, pk = cursor
+    return f"{value.isoformat() if isinstance(value, date) else value}{CURSOR_SEPARATOR}{pk}"
+
+def decode_cursor(cursor: str, field: str) -> Tuple[Any, int]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    :param cursor: Encoded cursor.
+    :param field: Sort field the cursor was produced for.
+    :return: Tuple of the sort field value and the primary key.
+    :raises ValueError: If the cursor is malformed.
+    """
+    value, separator, pk = cursor.rpartition(CURSOR_SEPARATOR)
+    if not separator:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    try:
+        return CURSOR_PARSERS[field](value), int(pk)
+    except InvalidOperation:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+def get_transaction_page(user: User, kind: str, filters: dict, sort: str = "-date", cursor: Optional[str] = None, limit: int = 50) -> dict:
+    """
+    Fetch one page of a user's expenses or incomes for the transaction table.
+
+    Pages are read with keyset pagination on the sort field and the ID, which the (user, date) and
+    (user, amount) indexes serve as range scans, so the cost of a page does not grow with the user's history.
+    The category names of a page are looked up with one extra query.
+
+    :param user: User object.
+    :param kind: Either 'expense' or 'income'.
+    :param filters: Filters accepted by filter_transactions.
+    :param sort: One of TRANSACTION_SORTS, a leading '-' sorts in descending order.
+    :param cursor: Cursor returned with the previous page, None for the first page.
+    :param limit: Page size.
+    :return: Dictionary with the page rows under 'transactions' and the cursor of the next page under 'next_cursor'.
+    :raises ValueError: If the sort or the cursor is invalid.
+    """
+    if sort not in TRANSACTION_SORTS:
+        raise ValueError(f"Invalid sort: {sort!r}")
+    field, descending = sort.lstrip("-"), sort.startswith("-")
+    rows = filter_transactions(LEDGER_MODELS[kind].objects.filter(user=user), filters).values(*TRANSACTION_FIELDS)
+    if field == "id":
+        if cursor and not cursor.isdigit():
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        items, next_cursor = paginate_by_id(rows, int(cursor) if cursor else None, limit, descending)
+        return {"transactions": resolve_category_names(items), "next_cursor": None if next_cursor is None else str(next_cursor)}
+    items, next_cursor = paginate_by_keyset(rows, field, decode_cursor(cursor, field) if cursor else None, limit, descending)
+    return {"transactions": resolve_category_names(items), "next_cursor": encode_cursor(next_cursor)}
@@ -21,21 +21,33 @@ urlpatterns = [
     path("get_user_total_balance/", views.get_user_total_balance, name="get_user_total_balance"),
     path("get_user_expected_expenses/", views.get_user_expected_expenses, name="get_user_expected_expenses"),
     path("get_user_expected_incomes/", views.get_user_expected_incomes, name="get_user_expected_incomes"),
+    path("forecast_cache_stats/", views.forecast_cache_stats, name="forecast_cache_stats"),
     path("get_user_savings/", views.get_user_savings, name="get_user_savings"),
     path("get_user_report/", views.get_user_report, name="get_user_report"),
     path("create_user_report/<str:start_date>/<str:end_date>/", views.create_user_report, name="create_user_report"),
+    path("report_job/<int:job_id>/", views.report_job_status, name="report_job_status"),
+    path("export/<str:dataset>/", views.export_data, name="export_data"),
+    path("import/", views.import_transactions_view, name="import_transactions"),
+    path("transactions/<str:kind>/", views.transactions, name="transactions"),
+    path("search/", views.search_view, name="search"),
     path("report/<str:report_id>/", views.print_report, name="print_report"),
+    path("report/<str:report_id>/line_items/", views.get_report_line_items, name="get_report_line_items"),
     path("process_message/", views.process_message, name="process_message"),
     path("chat_list/", views.chat_list, name="chat_list"),
     path("expense_category/", views.expense_category_percentage, name="expense_category_percentage"),
     path("income_category/", views.income_category_percentage, name="income_category_percentage"),
     path("saving_goal/", views.saving_goal, name="saving_goal"),
+    path("recurring_rules/", views.recurring_rules, name="recurring_rules"),
+    path("recurring_rules/suggestions/", views.recurring_rule_suggestions, name="recurring_rule_suggestions"),
     path("messages/<str:conversation_id>/", views.messages, name="messages"),
+    path("messages/<int:conversation_id>/older/", views.older_messages, name="older_messages"),
+    path("messages/<int:conversation_id>/newer/", views.newer_messages, name="newer_messages"),
     path("messages/", views.general_messages, name="general_messages"),
     path("send_message/", views.send_message, name="send_message"),
     path("income/", views.income, name="income"),
     path("expense/", views.expense, name="expense"),
     path("comparison/", views.compare, name="comparison"),
+    path("rankings/", views.rankings, name="rankings"),
     path("saving_goals/", views.saving_goal_view, name="saving_goal_view"),
     path("delete_selected_expenses/", views.delete_selected_expenses, name="delete_selected_expenses"),
     path("delete_selected_incomes/", views.delete_selected_incomes, name="delete_selected_incomes"),
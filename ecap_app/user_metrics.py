@@ -0,0 +1,44 @@
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+from django.db.models import Avg, ExpressionWrapper, F, FloatField, Sum
+from django.db.models.functions import TruncMonth
+from .models import DailyLedger, SavingGoal
+
+
+def get_monthly_averages(user_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    Calculate the average monthly income and expense of several users with a single GROUP BY (user, month) query
+    on the daily ledger. Like calculate_average_monthly_amount, a month only counts towards the average of a kind
+    if it has rows of that kind.
+
+    :param user_ids: IDs of the users.
+    :return: Mapping of user ID to a dictionary with 'income' and 'expense' averages, 0 without any rows.
+    """
+    sums = {user_id: {kind: [Decimal(0), 0] for kind in ("income", "expense")} for user_id in user_ids}
+    months = DailyLedger.objects.filter(user_id__in=list(sums)).order_by().annotate(month=TruncMonth("day")).values("user_id", "month").annotate(
+        income=Sum("income_sum"), expense=Sum("expense_sum"), income_count=Sum("income_count"), expense_count=Sum("expense_count")
+    )
+    for row in months:
+        for kind, accumulator in sums[row["user_id"]].items():
+            if row[f"{kind}_count"]:
+                accumulator[0] += row[kind]
+                accumulator[1] += 1
+    return {
+        user_id: {kind: total / count if count else 0 for kind, (total, count) in kinds.items()}
+        for user_id, kinds in sums.items()
+    }
+
+def get_saving_goal_progress(user_ids: Iterable[int], default: Optional[float] = 0) -> Dict[int, Optional[float]]:
+    """
+    Calculate the average progress of the saving goals of several users with a single GROUP BY query.
+
+    :param user_ids: IDs of the users.
+    :param default: Progress reported for users without saving goals.
+    :return: Mapping of user ID to the average percentage of the target amounts reached, rounded to two decimal places.
+    """
+    progress = {user_id: default for user_id in user_ids}
+    percentage = ExpressionWrapper(100 * F("current_amount") / F("target_amount"), output_field=FloatField())
+    rows = SavingGoal.objects.filter(user_id__in=list(progress)).order_by().values("user_id").annotate(progress=Avg(percentage))
+    for row in rows:
+        progress[row["user_id"]] = round(row["progress"], 2)
+    return progress
@@ -1,14 +1,28 @@
 import numpy as np 
 import pandas as pd
 from datetime import datetime, timedelta
-from sklearn.linear_model import LinearRegression
-from .models import Expense, Income, Report, SavingGoal, Friend, Profile
+from decimal import Decimal
+from .models import Expense, Income, Report, SavingGoal, Friend, Profile, DailyLedger
+from .categories import get_category_names
+from .chat_history import get_older_messages
+from .snapshot import build_snapshot_data, load_ledger_snapshot
+from .comparison import get_comparison_data
+from .friend_graph import get_friend_ids, get_users
+from .ledger import ALL_ROWS, CENT, LEDGER_KINDS, build_category_breakdown, get_cached_category_breakdown, get_report_snapshot, get_user_ledger_totals, get_user_amount_aggregates, get_user_amount_statistics
+from .forecasting import LinearTrend, fit_linear_trend, predict_trend, get_user_trend, train_model, predict_future_data, get_model_slope
+from .forecast_cache import cached_forecast
+from .batch_forecasting import get_stored_forecast
+from .forecasters import DEFAULT_FORECASTER, FORECASTERS
 from django.contrib.auth.models import User
 from django.db.models import Max, Min, Avg, Sum, Q
 from django.db.models.functions import TruncMonth
 from django.http import HttpRequest
 from django.shortcuts import get_object_or_404
-from typing import List, Callable, Tuple
+from typing import List, Callable, Iterable, Iterator, Tuple
+
+
+REPORT_FIELDS = ("user", "id", "start_date", "end_date", "total_expenses", "total_incomes", "expenses", "incomes", "expense_categories", "income_categories")
+SNAPSHOT_REPORT_FIELDS = {"expenses", "incomes", "expense_categories", "income_categories"}
 
 
 def calculate_expenses(quantity: np.array, price: np.array) -> float:
@@ -34,24 +48,23 @@ def parse_and_calculate_expenses(expenses: List[Expense]) -> float:
     price = np.array([1 for _ in expenses])#np.array([expense.product.price for expense in expenses])
     return calculate_expenses(quantity, price)
 
-def calculate_total_user_expenses(user: User) -> float:
+def calculate_total_user_expenses(user: User) -> Decimal:
     """
     Calculate the total expenses for a user.
 
     :param user: User object.
     :return: Total expenses amount.
     """
-    return parse_and_calculate_expenses(Expense.objects.filter(user=user))
+    return get_user_ledger_totals(user)[ALL_ROWS]["expense"]
 
-def calculate_total_user_income(user: User) -> float:
+def calculate_total_user_income(user: User) -> Decimal:
     """
     Calculate the total income for a user.
 
     :param user: User object.
     :return: Total income amount.
     """
-    incomes = Income.objects.filter(user=user)
-    return sum(income.amount for income in incomes)
+    return get_user_ledger_totals(user)[ALL_ROWS]["income"]
 
 def calculate_balance(expenses_fn:Callable, incomes_fn:Callable, *args, **kwargs) -> float:
     """
@@ -65,16 +78,16 @@ def calculate_balance(expenses_fn:Callable, incomes_fn:Callable, *args, **kwargs
     incomes = float(incomes_fn(*args, **kwargs))
     return incomes - expenses
 
-def calculate_total_user_balance(user:User) -> float:
+def calculate_total_user_balance(user:User) -> Decimal:
     """
     Calculate the total balance for a user.
 
     :param user: User object.
     :return: Total balance amount.
     """
-    return calculate_balance(calculate_total_user_expenses, calculate_total_user_income, user)
+    return get_user_ledger_totals(user)[ALL_ROWS]["balance"]
 
-def calculate_user_expense_from_date(user: User, date: str) -> float:
+def calculate_user_expense_from_date(user: User, date: str) -> Decimal:
     """
     Calculate the total expenses for a user from a specific date.
 
@@ -82,9 +95,9 @@ def calculate_user_expense_from_date(user: User, date: str) -> float:
     :param date: Start date for expense calculation.
     :return: Total expenses amount from the specified date.
     """
-    return parse_and_calculate_expenses(Expense.objects.filter(user=user, date__gte=date))
+    return get_user_ledger_totals(user, from_date=(date, None))["from_date"]["expense"]
 
-def calculate_user_income_from_date(user: User, date: str) -> float:
+def calculate_user_income_from_date(user: User, date: str) -> Decimal:
     """
     Calculate the total income for a user from a specific date.
 
@@ -92,9 +105,9 @@ def calculate_user_income_from_date(user: User, date: str) -> float:
     :param date: Start date for income calculation.
     :return: Total income amount from the specified date.
     """
-    return sum(income.amount for income in Income.objects.filter(user=user, date__gte=date))
+    return get_user_ledger_totals(user, from_date=(date, None))["from_date"]["income"]
 
-def calculate_user_expense_to_date(user: User, date: str) -> float:
+def calculate_user_expense_to_date(user: User, date: str) -> Decimal:
     """
     Calculate the total expenses for a user up to a specific date.
 
@@ -102,9 +115,9 @@ def calculate_user_expense_to_date(user: User, date: str) -> float:
     :param date: End date for expense calculation.
     :return: Total expenses amount up to the specified date.
     """
-    return parse_and_calculate_expenses(Expense.objects.filter(user=user, date__lte=date))
+    return get_user_ledger_totals(user, to_date=(None, date))["to_date"]["expense"]
 
-def calculate_user_income_to_date(user: User, date: str) -> float:
+def calculate_user_income_to_date(user: User, date: str) -> Decimal:
     """
     Calculate the total income for a user up to a specific date.
 
@@ -112,9 +125,9 @@ def calculate_user_income_to_date(user: User, date: str) -> float:
     :param date: End date for income calculation.
     :return: Total income amount up to the specified date.
     """
-    return sum(income.amount for income in Income.objects.filter(user=user, date__lte=date))
+    return get_user_ledger_totals(user, to_date=(None, date))["to_date"]["income"]
 
-def calculate_user_balance_from_date(user: User, date: str) -> float:
+def calculate_user_balance_from_date(user: User, date: str) -> Decimal:
     """
     Calculate the balance for a user from a specific date.
 
@@ -122,13 +135,9 @@ def calculate_user_balance_from_date(user: User, date: str) -> float:
     :param date: Start date for balance calculation.
     :return: Calculated balance from the specified date.
     """
-    return calculate_balance(calculate_user_expense_from_date, 
-                             calculate_user_income_from_date, 
-                             user=user, 
-                             date=date
-    )
+    return get_user_ledger_totals(user, from_date=(date, None))["from_date"]["balance"]
 
-def calculate_user_balance_to_date(user: User, date: str) -> float:
+def calculate_user_balance_to_date(user: User, date: str) -> Decimal:
     """
     Calculate the balance for a user up to a specific date.
 
@@ -136,11 +145,7 @@ def calculate_user_balance_to_date(user: User, date: str) -> float:
     :param date: End date for balance calculation.
     :return: Calculated balance up to the specified date.
     """
-    return calculate_balance(calculate_user_expense_to_date, 
-                             calculate_user_income_to_date, 
-                             user=user, 
-                             date=date
-    )
+    return get_user_ledger_totals(user, to_date=(None, date))["to_date"]["balance"]
 
 def preprocess_date_data(date_data: pd.DataFrame) -> pd.DataFrame:
     """
@@ -153,37 +158,6 @@ def preprocess_date_data(date_data: pd.DataFrame) -> pd.DataFrame:
     date_data["date_ordinal"] = date_data["date"].apply(lambda x: x.toordinal())
     return date_data 
 
-def train_model(data: pd.DataFrame) -> LinearRegression:
-    """
-    Train a linear regression model on the given data.
-
-    :param data: DataFrame containing date ordinals and amounts.
-    :return: Trained LinearRegression model.
-    """
-    X = data["date_ordinal"].values.reshape(-1,1)
-    y = data["amount"].values
-    if len(X) > 1:
-        model = LinearRegression()
-        model.fit(X,y)
-        return model
-    return None
-
-def predict_future_data(model: LinearRegression, start_date: datetime.date, days_to_predict: int) -> Tuple[np.ndarray, np.ndarray]:
-    """
-    Predict future data points using the trained model.
-
-    :param model: Trained LinearRegression model.
-    :param start_date: Start date for predictions.
-    :param days_to_predict: Number of future days to predict.
-    :return: Tuple containing future dates and predicted values.
-    """
-    future_dates = [start_date + timedelta(days=i) for i in range(days_to_predict)]
-    future_dates_strings = [future_date.strftime('%Y-%m-%d') for future_date in future_dates]
-    future_dates_ordinal = np.array([date.toordinal() for date in future_dates]).reshape(-1, 1)
-    if model:
-        return future_dates_strings, model.predict(future_dates_ordinal)
-    return future_dates_strings, [0]*len(future_dates_strings)
-
 def extrapolate_data_from_date(data: pd.DataFrame, start_date: datetime.date, days_to_predict: int = 10) -> Tuple[np.ndarray, np.ndarray]:
     """
     Extrapolate future data points based on historical data.
@@ -256,6 +230,22 @@ def get_user_incomes_by_date(user:User) -> pd.DataFrame:
     except KeyError:
         return pd.DataFrame([], columns=["date", "amount"])
 
+def get_user_daily_amounts(user: User, kind: str) -> pd.DataFrame:
+    """
+    Retrieve the daily totals of a user's expenses or incomes from the daily ledger rollup.
+
+    Parameters:
+    user (User): The user whose daily totals are to be retrieved.
+    kind (str): Either 'expense' or 'income'.
+
+    Returns:
+    pd.DataFrame: A DataFrame with columns 'date' and 'amount', one row per day with at least one entry.
+    """
+    daily_amounts = DailyLedger.objects.filter(user=user, **{f"{kind}_count__gt": 0}).order_by("day").values("day").annotate(amount=Sum(f"{kind}_sum"))
+    daily_amounts = pd.DataFrame(list(daily_amounts), columns=["day", "amount"]).rename(columns={"day": "date"})
+    daily_amounts["amount"] = daily_amounts["amount"].apply(lambda amount: amount.quantize(CENT))
+    return daily_amounts
+
 def extrapolate_user_expenses_from_date(user: User, start_date: datetime.date, days_to_predict: int = 10):
     """
     Extrapolate future expenses for a user.
@@ -280,27 +270,72 @@ def extrapolate_user_income_from_date(user: User, start_date: datetime.date, day
     incomes = get_user_incomes_by_date(user)
     return extrapolate_data_from_date(incomes, start_date, days_to_predict)
 
-def extrapolate_user_expenses(user: User, days_to_predict: int = 10):
+def extrapolate_user_trend(user: User, kind: str, days_to_predict: int = 10, model: str = DEFAULT_FORECASTER):
+    """
+    Extrapolate future expenses or incomes for a user, starting at the date of the user's latest entry.
+
+    The default linear model is read from the stored trend statistics, or from the forecasts precomputed
+    by the precompute_forecasts command when available. Other models are fitted on the user's ledger.
+    Projections are cached until the user's expenses or incomes change.
+
+    :param user: User object.
+    :param kind: Either 'expense' or 'income'.
+    :param days_to_predict: Number of future days to predict.
+    :param model: Name of the forecasting model, one of FORECASTERS.
+    :return: Tuple containing future dates and predicted amounts.
+    """
+    def compute():
+        if model != DEFAULT_FORECASTER:
+            return fit_user_forecaster(user, kind, days_to_predict, model)
+        stored = get_stored_forecast(user, kind, days_to_predict)
+        if stored is not None:
+            return stored
+        last_day = DailyLedger.objects.filter(user=user, **{f"{kind}_count__gt": 0}).aggregate(last_day=Max("day"))["last_day"]
+        if last_day is None:
+            return [], []
+        dates, amounts = predict_future_data(get_user_trend(user, kind), last_day, days_to_predict)
+        return list(dates), [float(amount) for amount in amounts]
+    return cached_forecast(user.id, kind, days_to_predict, compute, model)
+
+def fit_user_forecaster(user: User, kind: str, days_to_predict: int, model: str):
+    """
+    Fit a forecasting model on a user's expenses or incomes and project it from the date of the latest entry.
+
+    :param user: User object.
+    :param kind: Either 'expense' or 'income'.
+    :param days_to_predict: Number of future days to predict.
+    :param model: Name of the forecasting model, one of FORECASTERS.
+    :return: Tuple containing future dates and predicted amounts.
+    """
+    snapshot = load_ledger_snapshot(user, Expense if kind == "expense" else Income)
+    if not len(snapshot):
+        return [], []
+    forecaster = FORECASTERS[model]().fit(snapshot["date"], snapshot["cents"] / 100, snapshot["category"])
+    days = snapshot["date"].max() + np.arange(days_to_predict)
+    dates = [datetime.fromordinal(int(day)).strftime('%Y-%m-%d') for day in days]
+    return dates, [round(float(amount), 2) for amount in forecaster.predict(days)]
+
+def extrapolate_user_expenses(user: User, days_to_predict: int = 10, model: str = DEFAULT_FORECASTER):
     """
     Extrapolate future expenses for a user.
 
     :param user: User object.
     :param days_to_predict: Number of future days to predict.
+    :param model: Name of the forecasting model.
     :return: Tuple containing future dates and predicted expenses.
     """
-    expenses = get_user_expenses_by_date(user)
-    return extrapolate_data(expenses, days_to_predict)
+    return extrapolate_user_trend(user, "expense", days_to_predict, model)
 
-def extrapolate_user_income(user: User, days_to_predict: int = 10):
+def extrapolate_user_income(user: User, days_to_predict: int = 10, model: str = DEFAULT_FORECASTER):
     """
     Extrapolate future income for a user.
 
     :param user: User object.
     :param days_to_predict: Number of future days to predict.
+    :param model: Name of the forecasting model.
     :return: Tuple containing future dates and predicted income.
     """
-    incomes = get_user_incomes_by_date(user)
-    return extrapolate_data(incomes, days_to_predict)
+    return extrapolate_user_trend(user, "income", days_to_predict, model)
 
 def get_monthly_expense_report(user:User) -> pd.DataFrame:
     """
@@ -309,13 +344,12 @@ def get_monthly_expense_report(user:User) -> pd.DataFrame:
     :param user: User object.
     :return: DataFrame with monthly expense totals.
     """
-    expenses = Expense.objects.filter(user=user).values("date", "amount")
-    df = pd.DataFrame(expenses)
-    if df.empty:
-        return df
-    df["date"] = pd.to_datetime(df["date"])
-    df["month"] = df["date"].dt.to_period("M")
-    monthly_report = df.groupby("month")["amount"].sum().reset_index()
+    expenses = DailyLedger.objects.filter(user=user, expense_count__gt=0).annotate(month=TruncMonth("day")).values("month").annotate(amount=Sum("expense_sum")).order_by("month")
+    monthly_report = pd.DataFrame(list(expenses))
+    if monthly_report.empty:
+        return monthly_report
+    monthly_report["month"] = pd.to_datetime(monthly_report["month"]).dt.to_period("M")
+    monthly_report["amount"] = monthly_report["amount"].apply(lambda amount: amount.quantize(CENT))
     return monthly_report
 
 def calculate_user_balance_over_time(user:User) -> pd.DataFrame:
@@ -325,22 +359,19 @@ def calculate_user_balance_over_time(user:User) -> pd.DataFrame:
     :param user: User object.
     :return: DataFrame with dates and corresponding balance.
     """
-    incomes = pd.DataFrame(list(Income.objects.filter(user=user).values("date", "amount")))
-    expenses = pd.DataFrame(list(Expense.objects.filter(user=user).values("date", "amount")))
-    if incomes.empty or expenses.empty:
-        return pd.DataFrame(columns=["date", "balance"])
-    incomes["date"] = pd.to_datetime(incomes["date"])
-    expenses["date"] = pd.to_datetime(expenses["date"])
-    incomes_by_date = incomes.groupby("date")["amount"].sum().reset_index()
-    expense_by_date = expenses.groupby("date")["amount"].sum().reset_index()
-    balance_data = pd.DataFrame(
-        pd.date_range(  start=min(incomes_by_date["date"].min(), expense_by_date["date"].min()),
-                        end=max(incomes_by_date["date"].max(), expense_by_date["date"].max())
-        ), 
-                        columns=["date"]
+    daily_ledger = DailyLedger.objects.filter(user=user).order_by("day").values("day").annotate(
+        income=Sum("income_sum"), 
+        expense=Sum("expense_sum"), 
+        income_count=Sum("income_count"), 
+        expense_count=Sum("expense_count")
     )
-    balance_data = balance_data.merge(incomes_by_date, on="date", how="left").rename(columns={"amount": "income"})
-    balance_data = balance_data.merge(expense_by_date, on="date", how="left").rename(columns={"amount": "expense"})
+    daily_ledger = pd.DataFrame(list(daily_ledger), columns=["day", "income", "expense", "income_count", "expense_count"])
+    if not daily_ledger["income_count"].any() or not daily_ledger["expense_count"].any():
+        return pd.DataFrame(columns=["date", "balance"])
+    daily_ledger["date"] = pd.to_datetime(daily_ledger["day"])
+    daily_ledger[["income", "expense"]] = daily_ledger[["income", "expense"]].astype(float)
+    balance_data = pd.DataFrame(pd.date_range(start=daily_ledger["date"].min(), end=daily_ledger["date"].max()), columns=["date"])
+    balance_data = balance_data.merge(daily_ledger[["date", "income", "expense"]], on="date", how="left")
     balance_data["income"] = balance_data["income"].fillna(0)
     balance_data["expense"] = balance_data["expense"].fillna(0)
     balance_data["cumulative_income"] = balance_data["income"].cumsum()
@@ -353,8 +384,9 @@ def create_report_for_user(user: User, start_date: datetime.date, end_date: date
     Create a financial report for a user within a specified date range.
 
     This function generates a report for the given user, covering the specified
-    date range from start_date to end_date. It automatically associates the relevant
-    expenses and incomes within this period and calculates the total amounts.
+    date range from start_date to end_date. It stores an immutable snapshot of the totals
+    and the per-category and per-day breakdowns of this period, read from the daily ledger
+    in a single query, with the IDs of the rows they summarize, and saves the report in a single insert.
 
     Args:
         user (User): The user for whom the report is to be created.
@@ -362,33 +394,104 @@ def create_report_for_user(user: User, start_date: datetime.date, end_date: date
         end_date (date): The end date of the reporting period.
 
     Returns:
-        Report: The created report instance containing the relevant expenses and incomes.
+        Report: The created report instance containing the snapshot and totals.
     """
     report = Report(user=user, start_date=start_date, end_date=end_date)
-    report.save()
-    report.populate_expenses_and_incomes()
+    report.snapshot = get_report_snapshot(user.id, start_date, end_date)
+    report.calculate_totals()
     report.save()
     return report
 
+def serialize_report(report: Report, username: str, fields: Iterable[str] = REPORT_FIELDS) -> dict:
+    """
+    Convert a report into the JSON structure returned by the report endpoints.
+
+    The expense and income lists hold the per-day totals of the report snapshot. The snapshot is
+    only accessed when one of SNAPSHOT_REPORT_FIELDS is requested, so it can be deferred otherwise.
+
+    Args:
+        report (Report): The report to serialize.
+        username (str): Username of the report owner.
+        fields (Iterable[str]): Names of the fields to include, a subset of REPORT_FIELDS.
+
+    Returns:
+        dict: Dictionary with the requested fields of the report.
+    """
+    values = {
+        "user": lambda: username,
+        "id": lambda: report.id,
+        "start_date": lambda: report.start_date,
+        "end_date": lambda: report.end_date,
+        "total_expenses": lambda: report.total_expenses,
+        "total_incomes": lambda: report.total_incomes,
+        "expenses": lambda: [{"date": day, "amount": amount} for day, amount in report.snapshot["expense"]["days"].items()],
+        "incomes": lambda: [{"date": day, "amount": amount} for day, amount in report.snapshot["income"]["days"].items()],
+        "expense_categories": lambda: report.snapshot["expense"]["categories"],
+        "income_categories": lambda: report.snapshot["income"]["categories"],
+    }
+    return {field: values[field]() for field in fields}
+
+def iter_report_line_items(report: Report, chunk_size: int = 1000) -> Iterator[dict]:
+    """
+    Iterate over the incomes and expenses a report was created from, ordered by date, reading them by the
+    row IDs stored in its snapshot in chunks. Rows created within the date range of the report afterwards
+    are not listed, and rows deleted since are left out. The fields of a line item are read from its
+    current row, so they reflect later edits, unlike the totals of the snapshot.
+
+    Args:
+        report (Report): The report whose line items are listed.
+        chunk_size (int): Number of rows fetched from the database at a time.
+
+    Yields:
+        dict: Line item with its kind, ID, date, amount, category and description.
+    """
+    for model, kind in LEDGER_KINDS.items():
+        ids = report.snapshot[kind]["ids"]
+        for start in range(0, len(ids), chunk_size):
+            rows = model.objects.filter(id__in=ids[start:start + chunk_size]).order_by("date", "id")
+            for values in rows.values_list("id", "date", "amount", "category__name", "description"):
+                yield {"kind": kind, **dict(zip(("id", "date", "amount", "category", "description"), values))}
+
 def get_categories(transfers) -> dict:
-    try: #TODO: REMOVE .product.price as it is no longer a possible attribute of any model
-        extract_data = lambda transfer: (transfer.category, transfer.amount * transfer.product.price)
-        transfers = pd.DataFrame([extract_data(transfer) for transfer in transfers], columns=["category", "amount"])
-    except AttributeError:
-        extract_data = lambda transfer: (transfer.category, float(transfer.amount))
-        transfers = transfers = pd.DataFrame([extract_data(transfer) for transfer in transfers], columns=["category", "amount"])
-    transfers_by_category = transfers.groupby(by="category").sum()
-    total_transfer = transfers["amount"].sum()
-    transfers_by_category["percentage"] = transfers_by_category / total_transfer
-    return transfers_by_category.to_dict()
-
-def get_user_expense_categories(user:User) -> dict:
-    expenses = Expense.objects.filter(user=user)
-    return get_categories(expenses)
+    """
+    Calculate the total amount and share of each category of an Expense or Income queryset with a single GROUP BY query
+    on the category IDs, whose names are looked up afterwards.
+
+    Parameters:
+    transfers (QuerySet): The expenses or incomes to break down.
+
+    Returns:
+    dict: A dictionary with 'amount' and 'percentage' keys mapping categories, in alphabetical order, to values.
+    """
+    totals = list(transfers.order_by().values("category_id").annotate(total=Sum("amount")).values_list("category_id", "total"))
+    names = get_category_names(category_id for category_id, _ in totals)
+    return build_category_breakdown(sorted((names[category_id], total) for category_id, total in totals))
+
+def get_user_expense_categories(user: User) -> dict:
+    """
+    Return the total amount and share of each category of the user's expenses, read from the
+    per-category statistics and cached until the user's data changes.
+
+    Parameters:
+    user (User): The user whose expenses are broken down.
+
+    Returns:
+    dict: A dictionary with 'amount' and 'percentage' keys mapping categories to values.
+    """
+    return get_cached_category_breakdown(user.id, "expense")
 
 def get_user_income_categories(user: User) -> dict:
-    incomes = Income.objects.filter(user=user)
-    return get_categories(incomes)
+    """
+    Return the total amount and share of each category of the user's incomes, read from the
+    per-category statistics and cached until the user's data changes.
+
+    Parameters:
+    user (User): The user whose incomes are broken down.
+
+    Returns:
+    dict: A dictionary with 'amount' and 'percentage' keys mapping categories to values.
+    """
+    return get_cached_category_breakdown(user.id, "income")
 
 def get_saving_goal(user: User) -> dict: 
     SavingGoal.objects.exists()
@@ -409,57 +512,59 @@ def get_aggregate_function_output(filtered_objects, *aggregate_function, attrb="
     """
     return [filtered_objects.aggregate(agg_value=a_fn(attrb))["agg_value"] for a_fn in aggregate_function]
 
-def get_user_income_aggregates(user: User) -> dict: 
+def format_amount_aggregates(aggregates: dict) -> dict:
     """
-    Retrieve minimum, maximum, and average income amounts for a given user.
+    Format the output of get_user_amount_aggregates for display.
 
     Args:
-    - user (User): The user for whom income data is queried.
+    - aggregates (dict): Amount statistics of a user, or None if the user has no data.
 
     Returns:
-    - dict: A dictionary with keys 'min', 'max', and 'avg' representing minimum, maximum,
-      and average income amounts respectively. If no income data exists for the user,
-      returns {'min': 0, 'max': 0, 'avg': 0}.
+    - dict: A dictionary with 'min', 'max' and 'avg' keys holding (amount rounded to 3 places, 'YYYY-MM-DD' date)
+      tuples, and 'std' and 'count' keys. Missing data is reported as 0 on today's date.
     """
-    aggregates = [Min, Max, Avg]
-    filtered_objects = Income.objects.filter(user=user)
     today = datetime.now().strftime("%Y-%m-%d")
-    if filtered_objects.exists():
-        incomes_aggregates = get_aggregate_function_output(filtered_objects, *aggregates)
-        dates = [Income.objects.filter(user=user, amount=amount).values("date").first() for amount in incomes_aggregates]
-        dates = [date["date"].strftime("%Y-%m-%d") if date else today for date in dates]
-        return {
-            "min": (round(incomes_aggregates[0],3), dates[0]), 
-            "max": (round(incomes_aggregates[1],3), dates[1]), 
-            "avg": (round(incomes_aggregates[2],3), dates[2])
-        }
-    return {"min": (0, today), "max": (0, today), "avg": (0, today)}
+    if not aggregates:
+        return {"min": (0, today), "max": (0, today), "avg": (0, today), "std": 0, "count": 0}
+    return {
+        "min": (round(aggregates["min"][0], 3), aggregates["min"][1].strftime("%Y-%m-%d")),
+        "max": (round(aggregates["max"][0], 3), aggregates["max"][1].strftime("%Y-%m-%d")),
+        "avg": (round(aggregates["avg"][0], 3), aggregates["avg"][1].strftime("%Y-%m-%d")),
+        "std": round(aggregates["std"], 3),
+        "count": aggregates["count"],
+    }
+
+def get_user_income_aggregates(user: User, start_date: datetime.date = None, end_date: datetime.date = None) -> dict: 
+    """
+    Retrieve minimum, maximum, average and standard deviation of income amounts for a given user.
 
-def get_user_expense_aggregates(user: User) -> dict: 
+    Args:
+    - user (User): The user for whom income data is queried.
+    - start_date (date): Optional inclusive start of the queried period.
+    - end_date (date): Optional inclusive end of the queried period.
+
+    Returns:
+    - dict: A dictionary with keys 'min', 'max' and 'avg' holding (amount, date) tuples of the minimal,
+      maximal and closest-to-average income, and 'std' and 'count' keys. If no income data exists for
+      the user, returns zero amounts dated today.
     """
-    Retrieve minimum, maximum, and average expense amounts for a given user.
+    return format_amount_aggregates(get_user_amount_aggregates(Income, user, start_date, end_date))
+
+def get_user_expense_aggregates(user: User, start_date: datetime.date = None, end_date: datetime.date = None) -> dict: 
+    """
+    Retrieve minimum, maximum, average and standard deviation of expense amounts for a given user.
 
     Args:
     - user (User): The user for whom expense data is queried.
+    - start_date (date): Optional inclusive start of the queried period.
+    - end_date (date): Optional inclusive end of the queried period.
 
     Returns:
-    - dict: A dictionary with keys 'min', 'max', and 'avg' representing minimum, maximum,
-      and average expense amounts respectively. If no expense data exists for the user,
-      returns {'min': 0, 'max': 0, 'avg': 0}.
+    - dict: A dictionary with keys 'min', 'max' and 'avg' holding (amount, date) tuples of the minimal,
+      maximal and closest-to-average expense, and 'std' and 'count' keys. If no expense data exists for
+      the user, returns zero amounts dated today.
     """
-    aggregates = [Min, Max, Avg]
-    filtered_objects = Expense.objects.filter(user=user)
-    today = datetime.now().strftime("%Y-%m-%d")
-    if filtered_objects.exists():
-        expense_aggregates = get_aggregate_function_output(filtered_objects, *aggregates)
-        dates = [Expense.objects.filter(user=user, amount=amount).values("date").first() for amount in expense_aggregates]
-        dates = [date["date"].strftime("%Y-%m-%d") if date else datetime.now().strftime("%Y-%m-%d") for date in dates]
-        return {
-            "min":(round(expense_aggregates[0],3), dates[0]), 
-            "max":(round(expense_aggregates[1],3), dates[1]), 
-            "avg":(round(expense_aggregates[2],3), dates[2]),
-        }
-    return {"min": (0, today), "max": (0, today), "avg": (0, today)}
+    return format_amount_aggregates(get_user_amount_aggregates(Expense, user, start_date, end_date))
 
 def std(data: np.array) -> np.ndarray:
     """
@@ -477,18 +582,18 @@ def get_user_object_std(user: User, Object):
     """
     Calculate the standard deviation of the 'amount' attribute for a user's objects.
 
+    The value is merged from the user's per-category Welford accumulators, which are kept
+    up to date on every write, so no Expense or Income rows are read.
+
     Parameters:
     user (User): The user whose objects are being queried.
-    Object: The model class of the objects being queried.
+    Object: The model class of the objects being queried (Expense or Income).
 
     Returns:
     float: The standard deviation of the 'amount' attribute for the user's objects.
            Returns 0 if the user has no objects.
     """
-    amounts = [obj.amount for obj in Object.objects.filter(user=user)]
-    if amounts: 
-        return std(amounts)
-    return 0
+    return get_user_amount_statistics(user, LEDGER_KINDS[Object])["std"]
 
 def get_user_income_std(user: User) -> float:
     """
@@ -516,25 +621,12 @@ def get_user_expense_std(user: User) -> float:
     """
     return get_user_object_std(user, Expense)
 
-def get_model_slope(model: LinearRegression) -> float:
-    """
-    Get the slope (coefficient) of a linear regression model.
-
-    Parameters:
-    model (LinearRegression): The linear regression model.
-
-    Returns:
-    float: The slope (coefficient) of the linear regression model.
-           Returns 0 if the model is None.
-    """
-    if model: 
-        return model.coef_[0]
-    return 0
-
 def get_expense_slope(user: User) -> float:
     """
     Calculate the slope of the linear regression model for the user's expenses over time.
 
+    The trend is solved from the incrementally maintained sufficient statistics, without reading any expense rows.
+
     Parameters:
     user (User): The user whose expense data is being analyzed.
 
@@ -542,14 +634,14 @@ def get_expense_slope(user: User) -> float:
     float: The slope of the linear regression model for the user's expenses.
            This represents the trend of the user's expenses over time.
     """
-    data = preprocess_date_data(get_user_expenses_by_date(user))
-    model = train_model(data)
-    return get_model_slope(model)
+    return get_model_slope(get_user_trend(user, "expense"))
 
 def get_income_slope(user: User) -> float:
     """
     Calculate the slope of the linear regression model for the user's incomes over time.
 
+    The trend is solved from the incrementally maintained sufficient statistics, without reading any income rows.
+
     Parameters:
     user (User): The user whose income data is being analyzed.
 
@@ -557,17 +649,38 @@ def get_income_slope(user: User) -> float:
     float: The slope of the linear regression model for the user's incomes.
            This represents the trend of the user's incomes over time.
     """
-    data = preprocess_date_data(get_user_incomes_by_date(user))
-    model = train_model(data)
-    return get_model_slope(model)
+    return get_model_slope(get_user_trend(user, "income"))
 
 
+def get_user_expense_snapshot_data(user: User) -> dict:
+    """
+    Build the expense page statistics of a user from a single query on the expenses.
+    The slope and the projected chart come from the cached or precomputed forecast.
+
+    :param user: User object.
+    :return: Dictionary with the statistics, chart data and categories.
+    """
+    projection = extrapolate_user_trend(user, "expense")
+    return {"is_expense": True, **build_snapshot_data(load_ledger_snapshot(user, Expense), projection, get_cached_category_breakdown(user.id, "expense"))}
+
+def get_user_income_snapshot_data(user: User) -> dict:
+    """
+    Build the income page statistics of a user from a single query on the incomes.
+    The slope and the projected chart come from the cached or precomputed forecast.
+
+    :param user: User object.
+    :return: Dictionary with the statistics, chart data and categories.
+    """
+    projection = extrapolate_user_trend(user, "income")
+    return {"is_expense": False, **build_snapshot_data(load_ledger_snapshot(user, Income), projection, get_cached_category_breakdown(user.id, "income"))}
+
 def get_expense_context(request: HttpRequest) -> dict:
     """
     Generate the context data for the expense view.
 
-    This function aggregates user expense data, processes it for chart display,
-    and prepares the context needed for rendering the expense page.
+    This function reads the user's expenses once into a ledger snapshot and derives
+    every statistic and chart series needed for rendering the expense page from it.
+    The transaction table is loaded page by page from the `transactions` view.
 
     Parameters:
     request (HttpRequest): The HTTP request object containing user information.
@@ -575,41 +688,16 @@ def get_expense_context(request: HttpRequest) -> dict:
     Returns:
     dict: A dictionary containing the context data for the expense view.
     """
-    aggregates = get_user_expense_aggregates(request.user)
-    dates, amount = extrapolate_user_expenses(request.user)
-    user_expenses = get_user_expenses_by_date(request.user).to_dict()
-    chart_data = {"date": [date.strftime("%Y-%m-%d") for date in user_expenses["date"].values()], "amount": [float(amount) for amount in user_expenses["amount"].values()]}
-    projected_chart_data = {"date": list(dates), "amount": list(amount)}
-    categories = get_user_expense_categories(request.user)
-    data = {
-        "is_expense": True,
-        "min": aggregates["min"],
-        "max": aggregates["max"],
-        "avg": aggregates["avg"],
-        "total": calculate_total_user_expenses(request.user), 
-        "std": round(get_user_expense_std(request.user),3),
-        "linear_regression_slope": round(get_expense_slope(request.user),3),
-        "today": datetime.now().strftime("%Y-%m-%d"),
-        "chart_data": chart_data,
-        "projected_chart_data": projected_chart_data, 
-        "categories": categories,
-        "data": [{
-            "id": e.id, 
-            "date": e.date.strftime("%Y-%m-%d"), 
-            "amount": float(e.amount), 
-            "category": e.category, 
-            "description": e.description} 
-            for e in Expense.objects.filter(user=request.user)
-        ]
-    }
+    data = get_user_expense_snapshot_data(request.user)
     return {"datatitle": "Expense", "data": data, "active_menu": "expense"}
 
 def get_income_context(request: HttpRequest) -> dict:
     """
     Generate the context data for the income view.
 
-    This function aggregates user income data, processes it for chart display,
-    and prepares the context needed for rendering the income page.
+    This function reads the user's incomes once into a ledger snapshot and derives
+    every statistic and chart series needed for rendering the income page from it.
+    The transaction table is loaded page by page from the `transactions` view.
 
     Parameters:
     request (HttpRequest): The HTTP request object containing user information.
@@ -617,33 +705,7 @@ def get_income_context(request: HttpRequest) -> dict:
     Returns:
     dict: A dictionary containing the context data for the income view.
     """
-    aggregates = get_user_income_aggregates(request.user)
-    dates, amount = extrapolate_user_income(request.user)
-    user_expenses = get_user_incomes_by_date(request.user).to_dict()
-    chart_data = {"date": [date.strftime("%Y-%m-%d") for date in user_expenses["date"].values()], "amount": [float(amount) for amount in user_expenses["amount"].values()]}
-    projected_chart_data = {"date": list(dates), "amount": list(amount)}
-    categories = get_user_income_categories(request.user)
-    data = {
-        "is_expense": False,
-        "min": aggregates["min"],
-        "max": aggregates["max"],
-        "avg": aggregates["avg"],
-        "total": calculate_total_user_income(request.user), 
-        "std": round(get_user_income_std(request.user),3),
-        "linear_regression_slope": round(get_income_slope(request.user),3),
-        "today": datetime.now().strftime("%Y-%m-%d"),
-        "chart_data": chart_data,
-        "projected_chart_data": projected_chart_data, 
-        "categories": categories,
-        "data": [{
-            "id": i.id, 
-            "date": i.date.strftime("%Y-%m-%d"), 
-            "amount": float(i.amount), 
-            "category": i.category, 
-            "description": i.description} 
-            for i in Income.objects.filter(user=request.user)
-        ]
-    }
+    data = get_user_income_snapshot_data(request.user)
     return {"datatitle": "Income", "data": data, "active_menu": "income"}
 
 def get_saving_goal_context(request: HttpRequest) -> dict:
@@ -675,17 +737,19 @@ def get_saving_goal_context(request: HttpRequest) -> dict:
     "active_menu": "saving_goals"
     }
     
-def calculate_average_monthly_amount(user_filtered_object) -> np.float64:
+def calculate_average_monthly_amount(user_filtered_object, date_field: str = "date", amount_field: str = "amount") -> np.float64:
     """
     Calculates the average monthly amount for a given queryset.
 
     Args:
         user_filtered_object (QuerySet): A Django queryset filtered by user with a date field and an amount field.
+        date_field (str): Name of the date field the rows are grouped by.
+        amount_field (str): Name of the amount field that is summed.
 
     Returns:
         np.float64: The average monthly amount calculated from the queryset.
     """
-    monthly_filtered_objects = user_filtered_object.annotate(month=TruncMonth("date")).values("month").annotate(total_income=Sum("amount")).order_by("month")
+    monthly_filtered_objects = user_filtered_object.annotate(month=TruncMonth(date_field)).values("month").annotate(total_income=Sum(amount_field)).order_by("month")
     total = sum(entry['total_income'] for entry in monthly_filtered_objects)
     number_of_months = len(monthly_filtered_objects)
     average_monthly_amount = total / number_of_months if number_of_months > 0 else 0
@@ -701,7 +765,7 @@ def calculate_monthly_income(user:User) -> np.float64:
     Returns:
         np.float64: The average monthly income for the user.
     """
-    return calculate_average_monthly_amount(Income.objects.filter(user=user))
+    return calculate_average_monthly_amount(DailyLedger.objects.filter(user=user, income_count__gt=0), "day", "income_sum")
 
 def calculate_monthly_expense(user:User) -> np.float64:
     """
@@ -713,7 +777,7 @@ def calculate_monthly_expense(user:User) -> np.float64:
     Returns:
         np.float64: The average monthly expense for the user.
     """
-    return calculate_average_monthly_amount(Expense.objects.filter(user=user))
+    return calculate_average_monthly_amount(DailyLedger.objects.filter(user=user, expense_count__gt=0), "day", "expense_sum")
 
 def calculate_monthly_balance(user:User) -> np.float64: 
     """
@@ -750,7 +814,8 @@ def calculate_saving_goal_progress(user: User) -> float:
 
 def gather_comparison_data(user: User) -> dict:
     """
-    Gathers comparison data for a specific user.
+    Gathers comparison data for a specific user. To compare several users, call `get_comparison_data`
+    with all of them instead, which needs the same number of queries.
 
     Args:
         user (User): The user object for whom the comparison data is to be gathered.
@@ -764,16 +829,9 @@ def gather_comparison_data(user: User) -> dict:
             - "monthly_expense": Average monthly expenses of the user.
             - "saving_goal_progress": Progress towards the user's saving goals as a percentage.
             - "picture_url": URL of the user's profile picture, or a default image if no picture is set.
+            - "username": The username of the user.
     """
-    return {
-        "total_income":calculate_total_user_income(user),
-        "total_expense":calculate_total_user_expenses(user),
-        "total_balance":calculate_total_user_balance(user),
-        "monthly_income":calculate_monthly_income(user), 
-        "monthly_expense":calculate_monthly_expense(user),
-        "saving_goal_progress": calculate_saving_goal_progress(user),
-        "picture_url": user.profile.profile_picture.url if user.profile.profile_picture else "/static/img/default_user.jpg"
-    }
+    return get_comparison_data([user.id])[user.id]
 
 def gather_friend_data(friend: Friend) -> dict:
     """
@@ -788,10 +846,7 @@ def gather_friend_data(friend: Friend) -> dict:
             - "username": The username of the friend.
             - "picture_url": URL of the friend's profile picture, or a default image if no picture is set.
     """
-    friend_data = gather_comparison_data(friend)
-    friend_data["username"] = friend.username
-    friend_data["picture_url"] = friend.profile.profile_picture.url if friend.profile.profile_picture else "/static/img/default_user.jpg"
-    return friend_data
+    return gather_comparison_data(friend)
 
 
 def get_index_context(request: HttpRequest) -> dict:
@@ -815,6 +870,7 @@ def get_profile_view_context(user_id) -> dict:
     This function gathers the necessary data to render a user profile page. It fetches the `User` object, 
     the associated `Profile` object, and the list of accepted friends for the specified user. It constructs 
     a context dictionary containing the user, their profile, and their friends.
+    The friend IDs come from the cached friend graph and the friends are loaded with their profiles in a single query.
 
     Parameters:
     - user_id (int): The ID of the user whose profile context is being retrieved.
@@ -825,19 +881,42 @@ def get_profile_view_context(user_id) -> dict:
         - "profile": The `Profile` object associated with the `User`.
         - "friends": A list of `User` objects representing the accepted friends of the user.
     """
-    user = get_object_or_404(User, id=user_id)
-    profile = Profile.objects.get(user=user)
-    friend_relations = Friend.objects.filter((Q(user=user) | Q(friend=user)), status="accepted")
-    friends = [
-        friend_relation.friend if friend_relation.user == user else friend_relation.user
-        for friend_relation in friend_relations
-    ]
+    user = get_object_or_404(User.objects.select_related("profile"), id=user_id)
+    profile = user.profile
+    friends = get_users(get_friend_ids(user.id))
     context = {
         "user": user,
         "profile": profile, 
         "friends": friends
     }
     return context
+
+def get_messages_context(user: User, chat, chats) -> dict:
+    """
+    Retrieve the context for the messages view of a chat.
+
+    Only the latest page of the chat's messages is rendered. Older messages are loaded on demand with
+    the 'older_messages' endpoint from `older_cursor`, and messages missed while the chat's WebSocket
+    was disconnected with the 'newer_messages' endpoint from `latest_cursor`.
+
+    Parameters:
+    - user (User): The authenticated user.
+    - chat (Chat): The displayed chat, or None if the user has no chats.
+    - chats (QuerySet): The chats of the user, from `get_user_chats`.
+
+    Returns:
+    - dict: A dictionary containing the chat, its latest messages, the pagination cursors, the other user of the chat and the user's other chats.
+    """
+    page = get_older_messages(chat) if chat else {"messages": [], "next_cursor": None}
+    return {
+        "chat": chat,
+        "messages": page["messages"],
+        "older_cursor": page["next_cursor"],
+        "latest_cursor": page["messages"][-1]["cursor"] if page["messages"] else None,
+        "other_user": (chat.user1 if chat.user1_id != user.id else chat.user2) if chat else None,
+        "other_chats": chats.exclude(id=chat.id) if chat else chats,
+        "active_menu": "general_messages"
+    }
     
 
 def get_settings_view_context(request) -> dict:
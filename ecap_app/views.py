@@ -1,16 +1,34 @@
 import json
+import tempfile
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import login, authenticate, update_session_auth_hash
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import IntegrityError
 from django.db.models import Q
 from django.templatetags.static import static
 from datetime import datetime
 from .models import *
 from .utils import *
-from .forms import SignUpForm, ExpenseForm, IncomeForm, SavingGoalForm, UserUpdateForm, ProfileUpdateForm
+from .categories import resolve_category_names
+from .chat_broker import serialize_message
+from .chat_history import MESSAGE_PAGE_SIZE, get_newer_messages, get_older_messages, get_user_chats
+from .comparison import get_accepted_friend_ids, get_friend_comparison
+from .friend_graph import get_friend_suggestions, get_incoming_requests
+from .rankings import get_user_rankings
+from .forecast_cache import get_forecast_cache_stats
+from .forecasters import DEFAULT_FORECASTER, FORECASTERS
+from .forms import SignUpForm, ExpenseForm, IncomeForm, SavingGoalForm, RecurringRuleForm, StatementImportForm, TransactionQueryForm, UserUpdateForm, ProfileUpdateForm
+from .recurring import detect_recurring_rules
+from .pagination import get_page_limit, get_page_params, paginate_by_id
+from .report_jobs import enqueue_report_job
+from .exports import EXPORT_DATASETS, EXPORT_FORMATS, get_export_columns, is_parquet_available, iter_csv, iter_export_rows, write_parquet
+from .imports import StatementError, import_statement
+from .transactions import get_transaction_page
+from .search import SEARCH_KINDS, search
 #from transformers import pipeline
 
 
@@ -116,7 +134,7 @@ def get_user_expenses(request):
     """
     user = request.user
     try:
-        user_expenses = get_user_expenses_by_date(user).to_dict()
+        user_expenses = get_user_daily_amounts(user, "expense").to_dict()
         return JsonResponse({"date": user_expenses["date"], "amount": user_expenses["amount"]})
     except KeyError:
         return JsonResponse({"error": "No expenses data found for the user."}, status=200)
@@ -126,7 +144,7 @@ def get_user_incomes(request):
     """
     Retrieves and returns the user's income data as JSON response.
 
-    Fetches income data for the authenticated user using `get_user_incomes_by_date`
+    Fetches daily income totals for the authenticated user using `get_user_daily_amounts`
     function and converts it to a dictionary. If successful, returns a JsonResponse
     containing dates and corresponding amounts. If no data is found, returns a JsonResponse
     with an error message and status code 200.
@@ -139,7 +157,7 @@ def get_user_incomes(request):
     """
     user = request.user
     try:
-        user_incomes = get_user_incomes_by_date(user).to_dict()
+        user_incomes = get_user_daily_amounts(user, "income").to_dict()
         return JsonResponse({"date": user_incomes["date"], "amount": user_incomes["amount"]})
     except KeyError:
         return JsonResponse({"error": "No incomes data found for the user."}, status=200)
@@ -204,6 +222,8 @@ def get_user_expected_expenses(request):
     and returns dates and corresponding amounts as a JsonResponse. If no expenses are found, returns
     a JsonResponse with an error message and status code 200.
 
+    The forecasting model can be chosen with the `model` query parameter (default: linear).
+
     Parameters:
     request (HttpRequest): The HTTP request object containing metadata about the request.
 
@@ -211,8 +231,11 @@ def get_user_expected_expenses(request):
     JsonResponse: JSON response containing expected expenses of the user for the next 10 days or an error message.
     """
     user = request.user
+    model = request.GET.get("model", DEFAULT_FORECASTER)
+    if model not in FORECASTERS:
+        return JsonResponse({"error": f"Unknown forecasting model, choose one of: {', '.join(FORECASTERS)}"}, status=400)
     try:
-        dates, amount = extrapolate_user_expenses(user, 10)
+        dates, amount = extrapolate_user_expenses(user, 10, model)
         return JsonResponse({"date": list(dates), "amount": list(amount)})
     except KeyError:
         return JsonResponse({"error": "No user expenses"}, status=200)
@@ -226,6 +249,8 @@ def get_user_expected_incomes(request):
     and returns dates and corresponding amounts as a JsonResponse. If no incomes are found, returns
     a JsonResponse with an error message and status code 200.
 
+    The forecasting model can be chosen with the `model` query parameter (default: linear).
+
     Parameters:
     request (HttpRequest): The HTTP request object containing metadata about the request.
 
@@ -233,11 +258,27 @@ def get_user_expected_incomes(request):
     JsonResponse: JSON response containing expected incomes of the user for the next 10 days or an error message.
     """
     user = request.user
+    model = request.GET.get("model", DEFAULT_FORECASTER)
+    if model not in FORECASTERS:
+        return JsonResponse({"error": f"Unknown forecasting model, choose one of: {', '.join(FORECASTERS)}"}, status=400)
     try:
-        dates, amount = extrapolate_user_income(user, 10)
+        dates, amount = extrapolate_user_income(user, 10, model)
         return JsonResponse({"date": list(dates), "amount": list(amount)})
     except KeyError:
         return JsonResponse({"error": "No user incomes"}, status=200)
+
+@staff_member_required
+def forecast_cache_stats(request):
+    """
+    Returns the hit and miss counters of the forecast cache as JSON response.
+
+    Parameters:
+    request (HttpRequest): The HTTP request object containing metadata about the request.
+
+    Returns:
+    JsonResponse: JSON response containing the forecast cache hits, misses, hit rate and local entry count.
+    """
+    return JsonResponse(get_forecast_cache_stats())
 
 @login_required
 def get_user_savings(request):
@@ -260,40 +301,64 @@ def get_user_savings(request):
 @login_required
 def get_user_report(request):
     """
-    Retrieves and returns the reports of the authenticated user as JSON response.
+    Retrieves and returns one page of the reports of the authenticated user as JSON response.
 
-    Fetches reports from `Report` model filtered by the authenticated user and constructs
-    a list of report data containing username, report ID, start and end dates, total expenses,
-    total incomes, and lists of expenses and incomes as JSON response. Reports are sorted by ID.
+    Reports are listed newest first and paginated with a keyset on the report ID: the `cursor` query
+    parameter takes the `next_cursor` of the previous page and `limit` sets the page size. The optional
+    `fields` query parameter selects a comma separated subset of the report fields; the report snapshot
+    is not loaded when none of its breakdowns is requested.
 
     Parameters:
     request (HttpRequest): The HTTP request object containing metadata about the request.
 
     Returns:
-    JsonResponse: JSON response containing reports of the user with detailed report data.
+    JsonResponse: JSON response containing the page of reports and the cursor of the next page, or an error message.
     """
     user = request.user
+    fields = request.GET.get("fields")
+    fields = fields.split(",") if fields else REPORT_FIELDS
+    unknown = [field for field in fields if field not in REPORT_FIELDS]
+    if unknown:
+        return JsonResponse({"error": f"Unknown report fields: {', '.join(unknown)}"}, status=400)
+    try:
+        cursor, limit = get_page_params(request)
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
     reports = Report.objects.filter(user=user)
-    report_data = [{
-        "user": report.user.username,
-        "id": report.id,
-        "start_date": report.start_date,
-        "end_date": report.end_date,
-        "total_expenses": report.total_expenses,
-        "total_incomes": report.total_incomes,
-        "expenses": list(report.expenses.values("date", "amount")),
-        "incomes": list(report.incomes.values("date", "amount")),
-    } for report in reports] 
-    return JsonResponse(sorted(report_data, key=lambda x: x["id"]), safe=False)
+    if not SNAPSHOT_REPORT_FIELDS.intersection(fields):
+        reports = reports.defer("snapshot")
+    reports, next_cursor = paginate_by_id(reports, cursor, limit)
+    return JsonResponse({"reports": [serialize_report(report, user.username, fields) for report in reports], "next_cursor": next_cursor})
+
+@login_required
+def get_report_line_items(request, report_id):
+    """
+    Streams the incomes and expenses a report was created from as newline delimited JSON.
+
+    Rows are read from the database in chunks and written to the response as they arrive, so the
+    memory used does not grow with the number of line items.
+
+    Parameters:
+    request (HttpRequest): The HTTP request object containing metadata about the request.
+    report_id (int): ID of the report.
+
+    Returns:
+    StreamingHttpResponse: One JSON object per line item, or HTTP 403 Forbidden if user is not authorized.
+    """
+    report = get_object_or_404(Report, pk=report_id)
+    if report.user_id != request.user.id:
+        return HttpResponse(status=403)
+    lines = (json.dumps(item, cls=DjangoJSONEncoder) + "\n" for item in iter_report_line_items(report))
+    return StreamingHttpResponse(lines, content_type="application/x-ndjson")
 
 @login_required
 def create_user_report(request, start_date, end_date):
     """
-    Creates and returns a new report for the authenticated user for the specified date range as JSON response.
+    Queues the creation of a new report for the authenticated user for the specified date range.
 
-    Creates a new report using `create_report_for_user` function for the authenticated user with the provided
-    start and end dates. Constructs report data containing username, report ID, start and end dates, total expenses,
-    total incomes, and lists of expenses and incomes. Returns the newly created report data as a JsonResponse with status 200.
+    The report is generated in the background by the `run_report_worker` command. An identical request
+    made while its job is still pending or running returns the same job instead of queuing another one.
+    Poll `report_job_status` with the returned job ID for the result.
 
     Parameters:
     request (HttpRequest): The HTTP request object containing metadata about the request.
@@ -301,22 +366,35 @@ def create_user_report(request, start_date, end_date):
     end_date (str): End date of the report in "YYYY-MM-DD" format.
 
     Returns:
-    JsonResponse: JSON response containing newly created report data.
-    """
-    start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
-    end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
-    report = create_report_for_user(request.user, start_date, end_date)
-    report_data = {
-        "user": report.user.username,
-        "id": report.id,
-        "start_date": report.start_date,
-        "end_date": report.end_date,
-        "total_expenses": report.total_expenses,
-        "total_incomes": report.total_incomes,
-        "expenses": list(report.expenses.values("date", "amount")),
-        "incomes": list(report.incomes.values("date", "amount")),
-    }
-    return JsonResponse({"report": report_data}, status=200)
+    JsonResponse: JSON response containing the job ID and status with status 202, or an error message.
+    """
+    try:
+        start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        return JsonResponse({"error": "Dates must be in YYYY-MM-DD format."}, status=400)
+    job = enqueue_report_job(request.user, start_date, end_date)
+    return JsonResponse({"job": {"id": job.id, "status": job.status}}, status=202)
+
+@login_required
+def report_job_status(request, job_id):
+    """
+    Returns the status of a report generation job of the authenticated user, and the report once it is done.
+
+    Parameters:
+    request (HttpRequest): The HTTP request object containing metadata about the request.
+    job_id (int): ID of the job returned by `create_user_report`.
+
+    Returns:
+    JsonResponse: JSON response containing the job status, the report when done or the error when failed.
+    """
+    job = get_object_or_404(ReportJob.objects.select_related("report"), pk=job_id, user=request.user)
+    data = {"id": job.id, "status": job.status, "start_date": job.start_date, "end_date": job.end_date}
+    if job.status == "done" and job.report is not None:
+        data["report"] = serialize_report(job.report, request.user.username)
+    elif job.status == "failed":
+        data["error"] = "Report generation failed."
+    return JsonResponse({"job": data})
     
 @login_required
 def print_report(request, report_id):
@@ -343,6 +421,69 @@ def print_report(request, report_id):
         return render(request, "report_template.html", context=context)
     return HttpResponse(status=403)
 
+@login_required
+def export_data(request, dataset):
+    """
+    Exports all expenses, incomes or reports of the authenticated user as a file download.
+
+    CSV exports are streamed while rows are read from the database in chunks. Parquet exports, selected
+    with `?format=parquet`, are written chunk by chunk to a temporary file that is then streamed, and
+    require the optional pyarrow dependency. Memory use stays flat regardless of the number of rows.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        dataset (str): One of 'expense', 'income' or 'report'.
+
+    Returns:
+        StreamingHttpResponse | FileResponse: The exported file, or a JSON error response.
+    """
+    export_format = request.GET.get("format", "csv")
+    if dataset not in EXPORT_DATASETS or export_format not in EXPORT_FORMATS:
+        return JsonResponse({"error": f"Choose a dataset from {', '.join(EXPORT_DATASETS)} and a format from {', '.join(EXPORT_FORMATS)}."}, status=400)
+    columns = get_export_columns(dataset)
+    rows = iter_export_rows(dataset, [request.user.id])
+    filename = f"{dataset}s.{export_format}"
+    if export_format == "csv":
+        response = StreamingHttpResponse(iter_csv(columns, rows), content_type="text/csv")
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+    if not is_parquet_available():
+        return JsonResponse({"error": "Parquet export is not available on this server."}, status=501)
+    export_file = tempfile.TemporaryFile()
+    write_parquet(columns, rows, export_file)
+    export_file.seek(0)
+    return FileResponse(export_file, as_attachment=True, filename=filename, content_type="application/vnd.apache.parquet")
+
+@login_required
+def import_transactions_view(request):
+    """
+    Imports expenses and incomes from an uploaded CSV or OFX bank statement via POST.
+
+    The statement is parsed while it is read, rows matching an existing transaction by date, amount
+    and description are skipped, and the rest are inserted in batches within one transaction.
+    CSV statements need 'date' and 'amount' columns and may have 'category', 'description' and 'kind' columns.
+
+    Args:
+        request (HttpRequest): The HTTP request object containing the statement file.
+
+    Returns:
+        JsonResponse: A JSON response containing the number of imported and skipped rows, or the errors.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method."}, status=405)
+    form = StatementImportForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    options = {"kind": form.cleaned_data["kind"] or None}
+    if form.cleaned_data["format"] == "csv":
+        options["date_format"] = form.cleaned_data["date_format"] or None
+        options["decimal_separator"] = form.cleaned_data["decimal_separator"] or None
+    try:
+        stats = import_statement(request.user, form.cleaned_data["statement"], form.cleaned_data["format"], **options)
+    except (StatementError, UnicodeDecodeError) as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return JsonResponse(stats, status=201)
+
 @login_required
 def process_message(request):
     """
@@ -434,10 +575,59 @@ def saving_goal(request):
     except AttributeError:
         return JsonResponse({"error": "No saving goal found"}, status=200)
 
+@login_required
+def recurring_rules(request):
+    """
+    Lists the recurring rules of the current authenticated user, or creates a new one via POST.
+
+    New rules are first materialized by the materialize_recurring_rules command on their start date.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: A JSON response containing the user's recurring rules, the created rule or the form errors.
+    """
+    if request.method == "POST":
+        form = RecurringRuleForm(request.POST, user=request.user)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        rule = form.save(commit=False)
+        rule.user = request.user
+        rule.next_run = rule.start_date
+        rule.save()
+        return JsonResponse({"id": rule.id, "next_run": rule.next_run}, status=201)
+    rules = RecurringRule.objects.filter(user=request.user).order_by("next_run").values(
+        "id", "kind", "amount", "category", "description", "cadence", "start_date", "end_date", "next_run", "active"
+    )
+    return JsonResponse({"rules": resolve_category_names(list(rules))})
+
+@login_required
+def recurring_rule_suggestions(request):
+    """
+    Proposes recurring rules detected in the expense and income history of the current authenticated user.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: A JSON response containing the proposed rules, ready to be submitted to `recurring_rules`.
+    """
+    suggestions = [
+        {
+            "kind": rule.kind, "amount": rule.amount, "category": rule.category.name, "description": rule.description,
+            "cadence": rule.cadence, "start_date": rule.start_date,
+        }
+        for kind in ("expense", "income")
+        for rule in detect_recurring_rules(request.user, kind)
+    ]
+    return JsonResponse({"suggestions": suggestions})
+
 @login_required
 def messages(request, conversation_id):
     """
     Retrieves messages for a specific conversation and renders them in the 'messages.html' template.
+    Only the latest page of messages is rendered, older ones are loaded with `older_messages`.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -446,22 +636,9 @@ def messages(request, conversation_id):
     Returns:
         HttpResponse: A rendered HTTP response displaying messages for the conversation.
     """
-    user = request.user
-    messages, other_chats = [], []
-    other_user = None
-    chats = Chat.objects.filter((Q(user1=user) | Q(user2=user)))
-    if chats:
-        chat = chats.filter(Q(id=conversation_id)).first()
-        other_chats = chats.exclude(id=conversation_id)
-        messages = chat.messages.order_by("timestamp")
-        other_user = chat.user1 if chat.user1 != user else chat.user2
-    return render(request, "messages.html", context={
-        "chat": chat, 
-        "messages":messages, 
-        "other_user":other_user,
-        "other_chats":other_chats,
-        "active_menu": "general_messages"
-    })
+    chats = get_user_chats(request.user)
+    chat = get_object_or_404(chats, id=conversation_id)
+    return render(request, "messages.html", context=get_messages_context(request.user, chat, chats))
 
 @login_required
 def general_messages(request):
@@ -478,10 +655,8 @@ def general_messages(request):
         HttpResponse: A rendered HTTP response displaying messages for the user's first chat.
     """
     user = request.user
-    messages, other_chats = [], []
-    other_user = None
     chat = None
-    chats = Chat.objects.filter((Q(user1=user) | Q(user2=user)))
+    chats = get_user_chats(user)
     users = User.objects.exclude(id=user.id)
 
     if request.method == "POST":
@@ -494,17 +669,49 @@ def general_messages(request):
 
     if chats.exists(): #added .exists()
         chat = chats.first()
-        other_chats = chats.exclude(id=chat.id)
-        messages = chat.messages.order_by("timestamp")
-        other_user = chat.user1 if chat.user1 != user else chat.user2
-    return render(request, "messages.html", context={
-        "chat": chat, 
-        "messages": messages, 
-        "other_user": other_user,
-        "other_chats": other_chats,
-        "users": users,
-        "active_menu": "general_messages"
-    })
+    context = get_messages_context(user, chat, chats)
+    context["users"] = users
+    return render(request, "messages.html", context=context)
+
+@login_required
+def older_messages(request, conversation_id):
+    """
+    Returns the page of messages of a chat preceding the `cursor` query parameter, or the latest page without it.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        conversation_id (int): The ID of the chat.
+
+    Returns:
+        JsonResponse: A JSON response containing the messages in chronological order and the cursor of the previous page,
+        or HTTP 404 Not Found if the user is not part of the chat.
+    """
+    chat = get_object_or_404(get_user_chats(request.user), id=conversation_id)
+    try:
+        page = get_older_messages(chat, request.GET.get("cursor") or None, get_page_limit(request, MESSAGE_PAGE_SIZE))
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return JsonResponse(page)
+
+@login_required
+def newer_messages(request, conversation_id):
+    """
+    Returns the messages of a chat following the `cursor` query parameter, for clients catching up on missed messages.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        conversation_id (int): The ID of the chat.
+
+    Returns:
+        JsonResponse: A JSON response containing the messages in chronological order, the cursor of the newest one
+        and whether more messages follow, or HTTP 404 Not Found if the user is not part of the chat.
+    """
+    chat = get_object_or_404(get_user_chats(request.user), id=conversation_id)
+    try:
+        page = get_newer_messages(chat, request.GET.get("cursor") or None, get_page_limit(request, MESSAGE_PAGE_SIZE))
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return JsonResponse(page)
 
 @login_required
 def send_message(request):
@@ -512,7 +719,8 @@ def send_message(request):
     Handles sending messages to a specific chat identified by the chat_id parameter via a POST request.
 
     Retrieves the chat using the chat_id, checks if the authenticated user is a participant in the chat.
-    Creates a new message object and saves it to the database.
+    Creates a new message object and saves it to the database. The message is also pushed to the chat's
+    WebSocket connections, this view is the fallback of clients without one.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -531,11 +739,7 @@ def send_message(request):
             sender=request.user,
             content=content
         )
-        return JsonResponse({
-            "sender": message.sender.username,
-            "content": message.content,
-            "timestamp": message.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        })
+        return JsonResponse(serialize_message(message))
 
     return JsonResponse({"error": "Invalid request method."}, status=405)
 
@@ -554,7 +758,7 @@ def income(request):
         HttpResponse: Renders the 'data_input_form.html' template with the income data input form.
     """
     if request.method == "POST":
-        form = IncomeForm(request.POST)
+        form = IncomeForm(request.POST, user=request.user)
         if form.is_valid():
             income = form.save(commit=False)
             income.user = request.user 
@@ -581,7 +785,7 @@ def expense(request):
         HttpResponse: Renders the 'data_input_form.html' template with the expense data input form.
     """
     if request.method == "POST":
-        form = ExpenseForm(request.POST)
+        form = ExpenseForm(request.POST, user=request.user)
         if form.is_valid():
             expense = form.save(commit=False)
             expense.user = request.user 
@@ -594,6 +798,61 @@ def expense(request):
     return render(request, "data_input_form.html", context=context)
 
 
+@login_required
+def transactions(request, kind):
+    """
+    Returns one page of the expenses or incomes of the authenticated user for the transaction table.
+
+    Rows can be filtered with `date_from`, `date_to`, `category`, `amount_min`, `amount_max` and `q`
+    (description search), and sorted with `sort` (`date`, `amount` or `id`, prefixed with '-' for descending order).
+    Pages are requested with `limit` and the `cursor` returned with the previous page.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        kind (str): Either 'expense' or 'income'.
+
+    Returns:
+        JsonResponse: A JSON response containing the page rows and the cursor of the next page, or the errors.
+    """
+    if kind not in ("expense", "income"):
+        return JsonResponse({"error": "Unknown transaction kind."}, status=404)
+    form = TransactionQueryForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    query = form.cleaned_data
+    try:
+        page = get_transaction_page(request.user, kind, query, query["sort"] or "-date", query["cursor"] or None, query["limit"] or 50)
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return JsonResponse(page)
+
+@login_required
+def search_view(request):
+    """
+    Searches the expense and income descriptions and the chat messages of the authenticated user.
+
+    Results are ranked by relevance. Every term of `q` must match and the last one also matches as a prefix.
+    `kind` (repeatable) restricts the search to 'expense', 'income' or 'message' results.
+    Pages are requested with `limit` and the `cursor` returned with the previous page.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: A JSON response containing the ranked results and the cursor of the next page, or an error.
+    """
+    query = request.GET.get("q", "").strip()
+    kinds = request.GET.getlist("kind") or None
+    if not query or (kinds and any(kind not in SEARCH_KINDS for kind in kinds)):
+        return JsonResponse({"error": f"Provide a query and choose kinds from {', '.join(SEARCH_KINDS)}."}, status=400)
+    try:
+        offset, limit = get_page_params(request, default_limit=20, max_limit=100)
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    offset = offset or 0
+    results, has_more = search(request.user.id, query, kinds, offset, limit)
+    return JsonResponse({"results": results, "next_cursor": offset + limit if has_more else None})
+
 @login_required
 def delete_selected_expenses(request):
     """
@@ -760,25 +1019,37 @@ def compare(request):
     Returns:
         HttpResponse: The rendered comparison page with the user and friends' data.
     """
-    user = request.user 
-    user_data = gather_comparison_data(user)
-    friend_relations = Friend.objects.filter((Q(user=user) | Q(friend=user)), status="accepted")#user.friends.all()
-    friends = [
-        friend_relation.friend if friend_relation.user == user else friend_relation.user
-        for friend_relation in friend_relations
-    ]
-    friends_data = [gather_friend_data(friend) for friend in friends]
+    friend_ids = get_accepted_friend_ids(request.user.id)
+    comparison = get_friend_comparison(request.user, friend_ids)
     other_users = User.objects.exclude(id=request.user.id)
-    friend_requests = Friend.objects.filter(friend=request.user, status="pending")
+    friend_requests = get_incoming_requests(request.user.id)
     context = {
-        "user_data": user_data, 
-        "friends": friends_data, 
+        "user_data": comparison["user_data"], 
+        "friends": comparison["friends"], 
+        "rankings": get_user_rankings(request.user, friend_ids),
         "friend_requests": friend_requests,
+        "friend_suggestions": get_friend_suggestions(request.user.id),
         "other_users": other_users,
         "active_menu": "comparison"
     }
     return render(request, "compare.html", context=context)
 
+@login_required
+def rankings(request):
+    """
+    Returns the precomputed rankings of the current authenticated user on savings rate, monthly balance
+    and saving goal progress, among all users and among their friends.
+
+    Rankings are refreshed by the refresh_rankings command, a ranking is None until the user's first refresh.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: A JSON response containing the score, global top percentage and rank among friends of every metric.
+    """
+    return JsonResponse({"rankings": get_user_rankings(request.user)})
+
 @login_required
 def send_friend_request(request):
     """
@@ -796,6 +1067,7 @@ def send_friend_request(request):
         from_user = get_object_or_404(User, id=request.user.id)
         if to_user == from_user:
             return redirect("comparison")
+        # Checked on the table rather than the cached friend graph, which leaves out rejected requests and may lag behind writes.
         friend_relationship_exists = Friend.objects.filter(
             Q(user=from_user, friend=to_user) | Q(user=to_user, friend=from_user)
         ).exists()
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import re
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db.models import Q
+from django.http import parse_cookie
+from django.http.request import split_domain_port, validate_host
+from .chat_broker import Subscription, get_chat_broker, get_chat_group
+from .models import Chat, Message
+
+
+CHAT_PATH = re.compile(r"^/ws/chat/(?P<chat_id>\d+)/$")
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+
+
+def get_header(scope: dict, name: bytes) -> str:
+    """
+    Read a request header of an ASGI connection.
+
+    :param scope: ASGI connection scope.
+    :param name: Lower case header name.
+    :return: Header value, empty if missing.
+    """
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin1")
+    return ""
+
+def is_allowed_origin(scope: dict) -> bool:
+    """
+    Check that a WebSocket handshake comes from a page of an allowed host. Browsers send cookies with
+    cross-site WebSocket handshakes and CSRF protection does not apply to them, so without this check
+    any site could open a chat connection on behalf of a logged in user.
+
+    :param scope: ASGI connection scope.
+    :return: True if the Origin header is missing, as sent by non-browser clients, or names an allowed host.
+    """
+    origin = get_header(scope, b"origin")
+    if not origin:
+        return True
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = [".localhost", "127.0.0.1", "[::1]"]
+    domain, _ = split_domain_port(urlsplit(origin).netloc)
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+def get_scope_user(scope: dict):
+    """
+    Authenticate the user of an ASGI connection from its session cookie.
+
+    :param scope: ASGI connection scope.
+    :return: User object, or AnonymousUser.
+    """
+    session_key = parse_cookie(get_header(scope, b"cookie")).get(settings.SESSION_COOKIE_NAME)
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    return get_user(SimpleNamespace(session=session))
+
+def is_chat_member(user, chat_id: int) -> bool:
+    """
+    Check that a user takes part in a chat.
+
+    :param user: User object.
+    :param chat_id: ID of the chat.
+    :return: True if the user is one of the chat's two users.
+    """
+    return Chat.objects.filter(Q(user1=user) | Q(user2=user), id=chat_id).exists()
+
+def create_message(user, chat_id: int, content: str) -> Message:
+    """
+    Store a message sent over a WebSocket. Like messages sent with send_message, it is pushed to
+    the chat's connections by the post_save signal once committed.
+
+    :param user: Sender.
+    :param chat_id: ID of the chat.
+    :param content: Message text.
+    :return: Created message.
+    """
+    return Message.objects.create(chat_id=chat_id, sender=user, content=content)
+
+async def push_messages(subscription: Subscription, send) -> None:
+    """
+    Forward the messages published to a chat's group to a connection until it is cancelled.
+
+    :param subscription: Subscription of the connection.
+    :param send: ASGI send callable of the connection.
+    """
+    while True:
+        message = await subscription.get()
+        await send({"type": "websocket.send", "text": json.dumps(message)})
+
+async def chat_websocket(scope: dict, receive, send, chat_id: int) -> None:
+    """
+    Serve a chat connection. Messages sent by the client as {"content": "..."} are stored, and every message
+    of the chat, whether sent over a WebSocket or with send_message, is pushed to all connections of the chat
+    as soon as it is committed, so open chats never need to be reloaded.
+
+    :param scope: ASGI connection scope.
+    :param receive: ASGI receive callable.
+    :param send: ASGI send callable.
+    :param chat_id: ID of the chat.
+    """
+    if (await receive())["type"] != "websocket.connect":
+        return
+    user = await sync_to_async(get_scope_user)(scope)
+    if not is_allowed_origin(scope) or not user.is_authenticated or not await sync_to_async(is_chat_member)(user, chat_id):
+        await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+        return
+    broker = get_chat_broker()
+    subscription = broker.subscribe(get_chat_group(chat_id))
+    await send({"type": "websocket.accept"})
+    pusher = asyncio.create_task(push_messages(subscription, send))
+    try:
+        while True:
+            event = await receive()
+            if event["type"] == "websocket.disconnect":
+                break
+            try:
+                content = str(json.loads(event.get("text") or "")["content"]).strip()
+            except (ValueError, TypeError, KeyError):
+                await send({"type": "websocket.send", "text": json.dumps({"type": "error", "error": "Invalid message."})})
+                continue
+            if content:
+                await sync_to_async(create_message)(user, chat_id, content)
+    finally:
+        broker.unsubscribe(subscription)
+        pusher.cancel()
+
+async def websocket_application(scope: dict, receive, send) -> None:
+    """
+    ASGI application routing WebSocket connections by path. Mounted next to the Django application in ecap.asgi.
+
+    :param scope: ASGI connection scope.
+    :param receive: ASGI receive callable.
+    :param send: ASGI send callable.
+    """
+    match = CHAT_PATH.match(scope["path"])
+    if match is None:
+        await receive()
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+    await chat_websocket(scope, receive, send, int(match.group("chat_id")))